@@ -8,12 +8,17 @@ Claude Code Hooks 处理脚本
 import sys
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import threading
+import time
 
 # 脚本所在目录
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 事件 id 与权限策略判断复用监控平台的模块（monitor/ 下只依赖标准库的部分）
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "monitor"))
+from dedup import uuid7  # noqa: E402
+
 # 日志文件路径
 LOG_FILE = os.path.join(SCRIPT_DIR, "hooks_log.txt")
 
@@ -22,6 +27,18 @@ MONITOR_URL = "http://localhost:18765/api/event"
 CONFIG_URL = "http://localhost:18765/api/config"
 MONITOR_ENABLED = True
 
+# 本地权限策略缓存（由监控平台根据看板中的规则生成），判断时不访问网络
+POLICY_CACHE_FILE = os.path.join(SCRIPT_DIR, "policy_cache.json")
+
+# 熔断器：多个 hook 进程共享的状态文件。监控平台连续连接失败后熔断，
+# 之后的 hook 不再访问网络，按退避间隔由单个 hook 试探是否恢复。
+# 文件不存在表示正常；文件修改时间为下次允许试探的时间，未到时间只需一次 stat 即可跳过
+BREAKER_FILE = os.path.join(SCRIPT_DIR, ".monitor_breaker")
+BREAKER_THRESHOLD = 3                          # 连续失败多少次后熔断
+BREAKER_BACKOFF = (5, 15, 30, 60, 120, 300)    # 熔断后的试探间隔（秒），逐次加长
+BREAKER_FAILED_HERE = threading.Event()        # 本进程是否已经连接失败过（发送线程和主线程共用）
+BREAKER_LOCK = threading.Lock()                # 熔断器状态的检查和写入在进程内串行执行
+
 # ============ 音频播放开关配置 ============
 # 默认值 - 如果无法从监控平台读取，则使用这些默认值
 DEFAULT_SOUND_ENABLED = {
@@ -58,16 +75,100 @@ def read_stdin_data():
     except Exception as e:
         return {"error": str(e)}
 
-def send_to_monitor(event_type: str, data: dict = None):
-    """异步发送事件到监控平台"""
-    if not MONITOR_ENABLED:
+def read_breaker():
+    """读取熔断器状态，文件不存在或损坏时视为没有失败记录"""
+    try:
+        with open(BREAKER_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {"failures": 0}
+    except (OSError, ValueError):
+        return {"failures": 0}
+
+def write_breaker(state: dict, retry_at: float):
+    """原子写入熔断器状态（先写临时文件再替换），修改时间设为下次允许试探的时间"""
+    tmp_path = f"{BREAKER_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.utime(tmp_path, (retry_at, retry_at))
+        os.replace(tmp_path, BREAKER_FILE)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def breaker_backoff(failures: int) -> float:
+    return BREAKER_BACKOFF[min(failures - BREAKER_THRESHOLD, len(BREAKER_BACKOFF) - 1)]
+
+def breaker_allows() -> bool:
+    """是否允许访问监控平台：熔断中且未到试探时间时返回 False（只做一次 stat）"""
+    if BREAKER_FAILED_HERE.is_set():
+        return False
+    try:
+        st = os.stat(BREAKER_FILE)
+    except OSError:
+        return True
+    now = time.time()
+    if st.st_mtime > now:
+        return False
+    state = read_breaker()
+    failures = state.get("failures", 0)
+    if failures >= BREAKER_THRESHOLD:
+        # 半开：由本进程试探，先推后下次试探时间，其他 hook 进程继续跳过
+        write_breaker(state, now + breaker_backoff(failures))
+    return True
+
+def breaker_record(success: bool):
+    """记录一次访问结果：成功时关闭熔断器，失败时累计次数，达到阈值后熔断
+
+    同一个 hook 进程（发送事件和读取配置）最多记一次失败
+    """
+    with BREAKER_LOCK:
+        if success:
+            try:
+                os.remove(BREAKER_FILE)
+            except OSError:
+                pass
+            return
+        if BREAKER_FAILED_HERE.is_set():
+            return
+        BREAKER_FAILED_HERE.set()
+        now = time.time()
+        state = read_breaker()
+        failures = state.get("failures", 0) + 1
+        retry_at = now + breaker_backoff(failures) if failures >= BREAKER_THRESHOLD else now
+        write_breaker({"failures": failures, "last_failure": now}, retry_at)
+
+def is_connection_error(error: Exception) -> bool:
+    """监控平台不可达（连接失败、超时）；收到 HTTP 错误响应说明平台仍在运行"""
+    import urllib.error
+    import socket
+    if isinstance(error, urllib.error.HTTPError):
+        return False
+    return isinstance(error, (urllib.error.URLError, socket.timeout, socket.gaierror,
+                              ConnectionError, TimeoutError))
+
+# 后台发送的完成标记：请求已写出或已失败时置位，退出前只等待这一阶段
+PENDING_SENDS = []
+
+def send_to_monitor(event_type: str, data: dict = None, policy: dict = None):
+    """异步发送事件到监控平台（policy 为本地策略的自动决策结果）"""
+    if not MONITOR_ENABLED or not breaker_allows():
         return
 
+    # 采集时生成事件 id 和时间，重发时保持不变，监控平台据此去重
+    event_id = uuid7()
+    # 带时区的 UTC 时间，跨时区中继或本机时区变化时监控平台也能正确比较
+    captured_at = datetime.now(timezone.utc).isoformat()
+
+    delivered = threading.Event()
+
     def _send():
         try:
-            import urllib.request
-            import urllib.error
+            import http.client
             import socket
+            from urllib.parse import urlsplit
             import getpass
 
             # 获取会话信息 - 优先使用 data 中的 session_id
@@ -89,29 +190,48 @@ def send_to_monitor(event_type: str, data: dict = None):
             }
 
             event = {
+                "event_id": event_id,
                 "event_type": event_type,
                 "event_name": event_type,
                 "data": data or {},
                 "session": session_info,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": captured_at
             }
+            if policy:
+                event["policy"] = policy
 
-            req = urllib.request.Request(
-                MONITOR_URL,
-                data=json.dumps(event).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-
-            with urllib.request.urlopen(req, timeout=2) as response:
-                response.read()
+            url = urlsplit(MONITOR_URL)
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=2)
+            try:
+                # 连接并写出请求；能写出说明监控平台在运行，不必等它处理完再关闭熔断器
+                conn.request("POST", url.path, body=json.dumps(event).encode('utf-8'),
+                             headers={'Content-Type': 'application/json'})
+                breaker_record(True)
+                delivered.set()
+                conn.getresponse().read()
+            finally:
+                conn.close()
         except Exception as e:
             # 静默失败，不影响 hooks 正常运行
-            pass
+            if not delivered.is_set() and is_connection_error(e):
+                breaker_record(False)
+        finally:
+            delivered.set()
 
     # 在后台线程发送，避免阻塞
     thread = threading.Thread(target=_send)
     thread.daemon = True
     thread.start()
+    PENDING_SENDS.append(delivered)
+
+def wait_for_sends(timeout: float = 2.5):
+    """等待后台发送写出请求（连接和写出阶段），不等待监控平台的响应
+
+    daemon 线程会在进程退出时被直接终止，退出前写出的事件和记录的熔断状态不会丢失
+    """
+    deadline = time.time() + timeout
+    for delivered in PENDING_SENDS:
+        delivered.wait(max(0.0, deadline - time.time()))
 
 
 def load_config_from_monitor():
@@ -122,6 +242,11 @@ def load_config_from_monitor():
         # 已经加载过配置
         return SOUND_ENABLED
 
+    if not MONITOR_ENABLED or not breaker_allows():
+        # 监控平台不可达（熔断中），直接使用默认配置
+        SOUND_ENABLED = DEFAULT_SOUND_ENABLED
+        return SOUND_ENABLED
+
     try:
         import urllib.request
         import urllib.error
@@ -134,18 +259,44 @@ def load_config_from_monitor():
         with urllib.request.urlopen(req, timeout=1) as response:
             config = json.loads(response.read().decode('utf-8'))
             SOUND_ENABLED = config.get('sound_enabled', DEFAULT_SOUND_ENABLED)
-            return SOUND_ENABLED
+        breaker_record(True)
+        return SOUND_ENABLED
     except Exception as e:
         # 无法连接到监控平台，使用默认配置
+        if is_connection_error(e):
+            breaker_record(False)
         SOUND_ENABLED = DEFAULT_SOUND_ENABLED
         return DEFAULT_SOUND_ENABLED
 
-def log_event(event_type: str, data: dict = None):
+def apply_policy(event_type: str, data: dict):
+    """按本地缓存的权限策略判断，命中时输出决策并返回决策信息
+
+    只读取本地缓存文件，不访问网络；缓存不存在、规则未启用或出错时不做决策，交给 Claude Code 默认流程
+    """
+    started = time.perf_counter()
+    try:
+        from policy import load_cache, evaluate, hook_output
+
+        result = evaluate(load_cache(POLICY_CACHE_FILE), event_type, data)
+        if result is None:
+            return None
+        output = hook_output(event_type, result)
+        if output is not None:
+            print(json.dumps(output, ensure_ascii=False))
+        result["eval_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+    except Exception as e:
+        print(f"[HOOK] 策略判断失败: {e}", file=sys.stderr)
+        return None
+
+def log_event(event_type: str, data: dict = None, policy: dict = None):
     """记录事件到日志文件并发送到监控平台"""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_entry = f"[{timestamp}] {event_type}"
     if data:
         log_entry += f"\n  数据: {json.dumps(data, ensure_ascii=False, indent=4)}"
+    if policy:
+        log_entry += f"\n  策略决策: {json.dumps(policy, ensure_ascii=False)}"
     log_entry += "\n" + "-" * 60 + "\n"
 
     with open(LOG_FILE, "a", encoding="utf-8") as f:
@@ -164,24 +315,22 @@ def log_event(event_type: str, data: dict = None):
     pure_event_type = event_type.split(" - ")[0] if " - " in event_type else event_type
 
     # 发送到监控平台
-    send_to_monitor(pure_event_type, data)
+    send_to_monitor(pure_event_type, data, policy)
 
 def handle_pre_tool_use():
     """
     PreToolUse: 在工具调用之前运行
     - 可以阻止工具调用
     - 输入: stdin 接收 JSON，包含 tool_name, tool_input 等
-    - 输出: 可返回 {"decision": "block", "reason": "..."} 来阻止
+    - 输出: hookSpecificOutput.permissionDecision 为 allow / deny / ask
+    - 决策由本地权限策略给出（看板中配置），未命中规则时不输出
     """
     data = read_stdin_data()
 
-    log_event("PreToolUse - 工具调用前", data)
+    policy = apply_policy("PreToolUse", data)
+    log_event("PreToolUse - 工具调用前", data, policy)
     play_sound("PreToolUse")
 
-    # 示例：不阻止任何工具
-    # 如果要阻止，输出: {"decision": "block", "reason": "原因"}
-    # print(json.dumps({"decision": "block", "reason": "测试阻止"}))
-
 def handle_post_tool_use():
     """
     PostToolUse: 在工具调用完成后运行
@@ -198,16 +347,16 @@ def handle_permission_request():
     PermissionRequest: 在显示权限对话框时运行
     - 可以自动允许或拒绝权限请求
     - 输入: stdin 接收 JSON，包含权限请求详情
-    - 输出: 可返回 {"decision": "allow"} 或 {"decision": "deny", "reason": "..."}
+    - 输出: hookSpecificOutput.decision.behavior 为 allow / deny
+    - 决策由本地权限策略给出（看板中配置），未命中或规则为 ask 时交给用户决定
     """
     data = read_stdin_data()
 
-    log_event("PermissionRequest - 权限请求", data)
-    play_sound("PermissionRequest")
-
-    # 示例：不自动处理，让用户决定
-    # 如果要自动允许: print(json.dumps({"decision": "allow"}))
-    # 如果要自动拒绝: print(json.dumps({"decision": "deny", "reason": "原因"}))
+    policy = apply_policy("PermissionRequest", data)
+    log_event("PermissionRequest - 权限请求", data, policy)
+    # 已自动处理的权限请求不需要提醒用户
+    if not policy or policy.get("decision") == "ask":
+        play_sound("PermissionRequest")
 
 def handle_user_prompt_submit():
     """
@@ -370,6 +519,7 @@ def main():
         handler()
     else:
         log_event(f"未知事件类型: {event_type}")
+    wait_for_sends()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 多分辨率活动时间线
+按 1 分钟 / 1 小时 / 24 小时三种窗口维护定长的分桶计数，
+看板切换窗口时直接从服务端取数，不依赖页面打开了多久。
+"""
+
+import time
+from array import array
+from typing import Dict, Optional
+
+# 窗口名 -> (每个桶的秒数, 桶数量)
+ACTIVITY_WINDOWS = {
+    "1m": (1, 60),
+    "1h": (60, 60),
+    "24h": (900, 96),
+}
+
+
+class ActivitySeries:
+    """定长环形分桶计数，每个槽位记录所属的桶序号，过期槽位在写入时清零"""
+
+    def __init__(self, bucket_seconds: int, size: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.counts = array("L", [0] * size)
+        self.buckets = array("q", [-1] * size)
+
+    def add(self, timestamp: float, amount: int = 1):
+        bucket = int(timestamp // self.bucket_seconds)
+        current = int(time.time() // self.bucket_seconds)
+        # 超出窗口的旧事件（如补录的历史数据）不计入
+        if bucket <= current - self.size:
+            return
+        slot = bucket % self.size
+        if self.buckets[slot] != bucket:
+            self.buckets[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """按时间顺序（最旧在前）返回窗口内每个桶的计数"""
+        current = int((now or time.time()) // self.bucket_seconds)
+        counts = []
+        for bucket in range(current - self.size + 1, current + 1):
+            slot = bucket % self.size
+            counts.append(self.counts[slot] if self.buckets[slot] == bucket else 0)
+        return {
+            "bucket_seconds": self.bucket_seconds,
+            "end": current * self.bucket_seconds,
+            "counts": counts,
+        }
+
+
+class ActivityTracker:
+    """同时维护所有窗口的活动计数"""
+
+    def __init__(self):
+        self.series = {
+            name: ActivitySeries(bucket_seconds, size)
+            for name, (bucket_seconds, size) in ACTIVITY_WINDOWS.items()
+        }
+
+    def add(self, timestamp: float):
+        for series in self.series.values():
+            series.add(timestamp)
+
+    def snapshot(self, window: str) -> Optional[Dict]:
+        series = self.series.get(window)
+        if series is None:
+            return None
+        return {"window": window, **series.snapshot()}
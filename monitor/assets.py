@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 静态资源
+启动时读取 static/ 下的所有文件，计算内容指纹并预压缩（gzip，安装了 brotli 时还有 br），
+之后直接从内存返回：
+    - /static/css/style.<指纹>.css 这类带指纹的地址内容永远不变，按 immutable 长期缓存
+    - 原始地址（/static/css/style.css）仍可访问，每次用 ETag 向服务端确认
+    - 按 Accept-Encoding 选择压缩版本，音频等文件支持 Range 请求（206）
+看板 HTML 中引用的 /static/ 地址在启动时改写为带指纹的地址。
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# 值得压缩的类型（音频、图片本身已压缩或压缩收益很低）
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+COMPRESS_MIN_SIZE = 1024     # 小于该大小的文件不压缩
+COMPRESS_MIN_SAVING = 0.1    # 压缩后至少节省 10% 才保留压缩版本
+
+# 协商时的优先顺序
+ENCODINGS = ("br", "gzip")
+
+STATIC_URL_PATTERN = re.compile(r"/static/([\w./-]+)")
+
+
+def fingerprinted_name(path: str, fingerprint: str) -> str:
+    """css/style.css -> css/style.<指纹>.css"""
+    stem, dot, suffix = path.rpartition(".")
+    if not dot or "/" in suffix:
+        return f"{path}.{fingerprint}"
+    return f"{stem}.{fingerprint}.{suffix}"
+
+
+def compress(content: bytes) -> Dict[str, bytes]:
+    """生成各压缩版本，只保留确实更小的"""
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, quality=11)
+    limit = len(content) * (1 - COMPRESS_MIN_SAVING)
+    return {encoding: data for encoding, data in variants.items() if len(data) <= limit}
+
+
+def negotiate_encoding(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """按 Accept-Encoding（含 q 值）和 ENCODINGS 的顺序选择压缩方式，None 表示不压缩"""
+    available = set(available)
+    if not accept_encoding or not available:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for encoding in ENCODINGS:
+        if encoding in available and weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单个 bytes 区间，返回 [start, end]（含）；不可满足时返回 None
+
+    多区间请求只返回第一个区间。
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges:
+        return None
+    first, _, last = ranges.split(",")[0].strip().partition("-")
+    try:
+        if not first:
+            # bytes=-N：最后 N 个字节
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class Asset:
+    """一个静态资源：原始内容、指纹与各压缩版本"""
+
+    __slots__ = ("path", "url", "content", "media_type", "fingerprint", "encoded")
+
+    def __init__(self, path: str, content: bytes, url_prefix: str):
+        self.path = path
+        self.content = content
+        self.fingerprint = hashlib.sha256(content).hexdigest()[:FINGERPRINT_LENGTH]
+        self.url = f"{url_prefix}/{fingerprinted_name(path, self.fingerprint)}"
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+            media_type += "; charset=utf-8"
+        self.media_type = media_type
+        compressible = media_type.startswith(COMPRESSIBLE_TYPES) and len(content) >= COMPRESS_MIN_SIZE
+        self.encoded = compress(content) if compressible else {}
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        return f'"{self.fingerprint}-{encoding}"' if encoding else f'"{self.fingerprint}"'
+
+    def respond(self, headers, immutable: bool = False):
+        """按请求头返回 (状态码, 响应头, 内容)"""
+        cache_control = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+        response_headers = {"Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+        if self.encoded:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        # Range 请求只对未压缩的内容生效（浏览器请求音频时不要求压缩）
+        range_header = headers.get("range")
+        if range_header and headers.get("if-range", self.etag()) == self.etag():
+            size = len(self.content)
+            byte_range = parse_range(range_header, size)
+            if byte_range is None:
+                response_headers["Content-Range"] = f"bytes */{size}"
+                return 416, response_headers, b""
+            start, end = byte_range
+            response_headers["ETag"] = self.etag()
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return 206, response_headers, self.content[start:end + 1]
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""), self.encoded)
+        etag = self.etag(encoding)
+        response_headers["ETag"] = etag
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in (
+                tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()
+                for tag in if_none_match.split(","))):
+            return 304, response_headers, b""
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+            return 200, response_headers, self.encoded[encoding]
+        return 200, response_headers, self.content
+
+
+class AssetManifest:
+    """static/ 目录下所有资源的指纹清单"""
+
+    def __init__(self, static_dir: Path, url_prefix: str = "/static"):
+        self.static_dir = Path(static_dir)
+        self.url_prefix = url_prefix
+        self.assets: Dict[str, Asset] = {}
+        self.fingerprinted: Dict[str, Asset] = {}
+
+    def build(self) -> "AssetManifest":
+        assets = {}
+        for file in sorted(self.static_dir.rglob("*")):
+            if file.is_file() and not file.name.startswith("."):
+                path = file.relative_to(self.static_dir).as_posix()
+                assets[path] = Asset(path, file.read_bytes(), self.url_prefix)
+        self.assets = assets
+        self.fingerprinted = {asset.url[len(self.url_prefix) + 1:]: asset for asset in assets.values()}
+        return self
+
+    def lookup(self, path: str) -> Tuple[Optional[Asset], bool]:
+        """按请求路径（不含前缀）查找资源，返回 (资源, 是否为带指纹的地址)"""
+        asset = self.fingerprinted.get(path)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(path), False
+
+    def url(self, path: str) -> str:
+        asset = self.assets.get(path)
+        return asset.url if asset else f"{self.url_prefix}/{path}"
+
+    def urls(self) -> Dict[str, str]:
+        return {path: asset.url for path, asset in self.assets.items()}
+
+    def render_html(self, html: str) -> str:
+        """把 HTML 中引用的 /static/ 地址改写为带指纹的地址，并注入资源地址表（window.ASSET_URLS）"""
+        def replace(match):
+            asset = self.assets.get(match.group(1))
+            return asset.url if asset else match.group(0)
+
+        html = STATIC_URL_PATTERN.sub(replace, html)
+        manifest = json.dumps(self.urls(), ensure_ascii=False).replace("</", "<\\/")
+        return html.replace("</head>", f"    <script>window.ASSET_URLS = {manifest};</script>\n</head>", 1)
+
+    def page(self, template: Path) -> Asset:
+        """渲染后的页面，同样预压缩、带 ETag"""
+        return Asset(template.name, self.render_html(template.read_text(encoding="utf-8")).encode("utf-8"),
+                     self.url_prefix)
+
+    def status(self) -> Dict:
+        return {
+            "assets": len(self.assets),
+            "bytes": sum(len(asset.content) for asset in self.assets.values()),
+            "encodings": [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None],
+            "files": {
+                path: {
+                    "url": asset.url,
+                    "size": len(asset.content),
+                    **{encoding: len(data) for encoding, data in asset.encoded.items()},
+                }
+                for path, asset in self.assets.items()
+            },
+        }
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 历史会话回填
+监控平台安装之前或停止期间运行的会话没有 hook 事件，但 Claude Code 在 ~/.claude/projects
+下保留了每个会话的记录（transcript JSONL）。这里把会话记录转换为与 hook 相同的事件
+（SessionStart、UserPromptSubmit、PreToolUse、PostToolUse、Stop、SubagentStop、PreCompact），
+批量发送到监控平台的 /api/backfill。
+
+多个会话记录由进程池并行处理，每个文件逐行流式读取。每个文件读到的位置和解析状态
+记录在检查点文件中，再次运行时只处理新增或变化的文件，已处理的部分不会重复发送。
+回填的事件带 backfill 标记，不触发钉钉推送和失控检测。
+
+    python monitor/backfill.py --since 2026-01-01
+    python monitor/backfill.py --url http://monitor-host:18765 --workers 8
+"""
+
+import argparse
+import getpass
+import gzip
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from relay import compact_event
+from search import parse_since
+
+DEFAULT_PROJECTS_DIR = Path.home() / ".claude" / "projects"
+DEFAULT_CHECKPOINT_FILE = Path(__file__).parent / "backfill_state.json"
+DEFAULT_MONITOR_URL = "http://localhost:18765"
+
+BACKFILL_BATCH_SIZE = 500      # 每个请求发送的事件数
+STOP_IDLE_SECONDS = 300        # 会话记录多久没有写入后，未结束的一轮对话按已结束处理
+MAX_PENDING_TOOLS = 256        # 记录的未返回结果的工具调用数（用于 PostToolUse 的工具名）
+REQUEST_TIMEOUT = 60.0
+
+# 以这些内容开头的用户消息是命令输出或中断提示，不是用户输入的提示词
+NON_PROMPT_PREFIXES = ("<local-command-stdout>", "<local-command-stderr>", "[Request interrupted")
+
+
+def utc_timestamp(value: str) -> Optional[str]:
+    """会话记录中的时间转换为与 hook 一致的带时区 UTC ISO 字符串（不带时区的按本地时间处理）"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def discover(projects_dir: Path) -> List[Path]:
+    """查找所有会话记录（包括子代理的记录）"""
+    return sorted(path for path in Path(projects_dir).rglob("*.jsonl") if path.is_file())
+
+
+class TranscriptParser:
+    """逐条解析会话记录，生成 hook 格式的事件；状态可保存到检查点，下次从断点继续"""
+
+    def __init__(self, path: str, state: Optional[Dict] = None, since: Optional[float] = None):
+        state = state or {}
+        self.path = path
+        self.since = since
+        self.offset = state.get("offset", 0)
+        self.started = state.get("started", False)
+        self.turn_open = state.get("turn_open", False)
+        self.tools: Dict[str, str] = state.get("tools", {})
+        self.session: Dict = state.get("session", {})
+        self.last_uuid = state.get("last_uuid", "")
+        self.last_timestamp = state.get("last_timestamp")
+        self.sidechain = state.get("sidechain", False)
+        self.hostname = socket.gethostname()
+        self.username = getpass.getuser()
+
+    def state(self) -> Dict:
+        return {
+            "offset": self.offset,
+            "started": self.started,
+            "turn_open": self.turn_open,
+            "tools": dict(self.tools),
+            "session": dict(self.session),
+            "last_uuid": self.last_uuid,
+            "last_timestamp": self.last_timestamp,
+            "sidechain": self.sidechain,
+        }
+
+    def _event(self, event_type: str, key: str, timestamp: str, data: Dict) -> Dict:
+        session_id = self.session.get("session_id", "")
+        return {
+            # 由记录 uuid 确定的 event_id：重复回填同一条记录时会被监控平台去重
+            "event_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"transcript:{session_id}:{key}:{event_type}")),
+            "event_type": event_type,
+            "timestamp": timestamp,
+            "session": self.session,
+            "data": {
+                "session_id": session_id,
+                "transcript_path": self.path,
+                "cwd": self.session.get("project_path", ""),
+                "hook_event_name": event_type,
+                **data,
+            },
+        }
+
+    def _stop(self, timestamp: Optional[str] = None) -> Dict:
+        # 子代理的记录结束时，主会话的这一轮仍在进行
+        if not self.sidechain:
+            self.turn_open = False
+        event_type = "SubagentStop" if self.sidechain else "Stop"
+        return self._event(event_type, self.last_uuid, timestamp or self.last_timestamp, {})
+
+    def feed(self, entry: Dict) -> List[Dict]:
+        """处理一条记录，返回生成的事件"""
+        entry_type = entry.get("type")
+        timestamp = utc_timestamp(entry.get("timestamp"))
+        if entry_type not in ("user", "assistant", "system") or not timestamp or not entry.get("sessionId"):
+            return []
+
+        cwd = entry.get("cwd") or self.session.get("project_path", "")
+        self.session = {
+            "session_id": entry["sessionId"],
+            "project_path": cwd,
+            "project_name": os.path.basename(cwd.rstrip("/\\")) if cwd else "未知项目",
+            "hostname": self.hostname,
+            "username": self.username,
+        }
+        self.sidechain = bool(entry.get("isSidechain"))
+        key = entry.get("uuid") or f"{self.path}:{self.offset}"
+        events = []
+
+        if not self.started and not self.sidechain:
+            self.started = True
+            events.append(self._event("SessionStart", key, timestamp, {"source": "startup"}))
+
+        message = entry.get("message") or {}
+        content = message.get("content")
+        if entry_type == "user" and not entry.get("isMeta"):
+            if isinstance(content, str):
+                blocks = [{"type": "text", "text": content}]
+            else:
+                blocks = content if isinstance(content, list) else []
+            prompt = "\n".join(block.get("text", "") for block in blocks
+                               if isinstance(block, dict) and block.get("type") == "text")
+            for index, block in enumerate(blocks):
+                if not isinstance(block, dict) or block.get("type") != "tool_result":
+                    continue
+                tool_use_id = block.get("tool_use_id", "")
+                response = entry.get("toolUseResult")
+                events.append(self._event("PostToolUse", f"{key}:{index}", timestamp, {
+                    "tool_name": self.tools.pop(tool_use_id, "unknown"),
+                    "tool_use_id": tool_use_id,
+                    "tool_response": response if response is not None else block.get("content"),
+                }))
+            if prompt and not self.sidechain and not prompt.startswith(NON_PROMPT_PREFIXES):
+                # 上一轮没有正常结束（如被中断），在新提示词之前补上 Stop
+                if self.turn_open:
+                    events.append(self._stop())
+                self.turn_open = True
+                self.tools.clear()
+                events.append(self._event("UserPromptSubmit", key, timestamp, {"prompt": prompt}))
+
+        elif entry_type == "assistant" and isinstance(content, list):
+            self.turn_open = self.turn_open or not self.sidechain
+            for index, block in enumerate(content):
+                if isinstance(block, dict) and block.get("type") == "tool_use":
+                    tool_use_id = block.get("id", "")
+                    self.tools[tool_use_id] = block.get("name", "unknown")
+                    while len(self.tools) > MAX_PENDING_TOOLS:
+                        self.tools.pop(next(iter(self.tools)))
+                    events.append(self._event("PreToolUse", f"{key}:{index}", timestamp, {
+                        "tool_name": block.get("name", "unknown"),
+                        "tool_use_id": tool_use_id,
+                        "tool_input": block.get("input", {}),
+                    }))
+            if message.get("stop_reason") == "end_turn":
+                self.last_uuid, self.last_timestamp = key, timestamp
+                events.append(self._stop(timestamp))
+
+        elif entry_type == "system" and isinstance(entry.get("compactMetadata"), dict):
+            events.append(self._event("PreCompact", key, timestamp,
+                                      {"trigger": entry["compactMetadata"].get("trigger", "auto")}))
+
+        self.last_uuid, self.last_timestamp = key, timestamp
+        if self.since is not None:
+            events = [e for e in events if datetime.fromisoformat(e["timestamp"]).timestamp() >= self.since]
+        return events
+
+    def finish(self, idle: bool) -> List[Dict]:
+        """读到文件末尾：会话记录已不再写入时结束未完成的一轮"""
+        if idle and self.turn_open and not self.tools and self.last_timestamp:
+            # turn_open 只跟踪主会话的一轮
+            self.sidechain = False
+            return [self._stop()]
+        return []
+
+
+def read_entries(path: Path, offset: int) -> Iterator[Tuple[Dict, int]]:
+    """从 offset 开始逐行读取，返回 (记录, 该行之后的偏移)；最后一行不完整（正在写入）时停止"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                yield entry, offset
+
+
+def encode_events(events: List[Dict]) -> bytes:
+    payload = {"source": socket.gethostname(), "events": [compact_event(e) for e in events]}
+    return gzip.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+
+def backfill_file(path: str, state: Optional[Dict], url: str, since: Optional[float],
+                  dry_run: bool = False) -> Dict:
+    """处理一个会话记录（在进程池中运行），返回新的检查点状态与统计
+
+    每发送成功一批就推进检查点，发送失败时返回最后一次成功的位置。
+    """
+    stat = os.stat(path)
+    parser = TranscriptParser(path, state, since)
+    committed = parser.state()
+    result = {"path": path, "events": 0, "accepted": 0, "error": None}
+    batch: List[Dict] = []
+
+    with httpx.Client(timeout=REQUEST_TIMEOUT) as client:
+        def flush():
+            nonlocal committed
+            if batch and not dry_run:
+                response = client.post(f"{url}/api/backfill", content=encode_events(batch),
+                                       headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+                response.raise_for_status()
+                result["accepted"] += response.json().get("accepted", 0)
+            result["events"] += len(batch)
+            batch.clear()
+            committed = parser.state()
+
+        try:
+            for entry, offset in read_entries(Path(path), parser.offset):
+                batch.extend(parser.feed(entry))
+                parser.offset = offset
+                if len(batch) >= BACKFILL_BATCH_SIZE:
+                    flush()
+            batch.extend(parser.finish(idle=time.time() - stat.st_mtime >= STOP_IDLE_SECONDS))
+            flush()
+        except (httpx.HTTPError, OSError, ValueError) as e:
+            # ValueError：监控平台返回的不是 JSON（如地址指向了其他服务）
+            result["error"] = str(e)
+
+    # 文件大小与修改时间只在完整处理后记录，失败的文件下次从断点继续
+    committed["size"] = stat.st_size if result["error"] is None else -1
+    committed["mtime"] = stat.st_mtime
+    result["state"] = committed
+    return result
+
+
+def load_checkpoint(path: Path) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+    return checkpoint if isinstance(checkpoint.get("files"), dict) else {"files": {}}
+
+
+def save_checkpoint(path: Path, checkpoint: Dict):
+    """先写临时文件再替换，中途退出不会留下损坏的检查点"""
+    fd, temp = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(temp, path)
+
+
+def pending_files(files: List[Path], checkpoint: Dict, since: Optional[float]) -> List[Tuple[str, Optional[Dict]]]:
+    """需要处理的文件与其断点状态：新文件、有新增内容的文件从断点继续，变小的文件（被重写）从头处理"""
+    pending = []
+    for path in files:
+        stat = path.stat()
+        if since is not None and stat.st_mtime < since:
+            continue
+        state = checkpoint["files"].get(str(path))
+        if state is not None:
+            if state.get("size") == stat.st_size and state.get("mtime") == stat.st_mtime:
+                continue
+            if stat.st_size < state.get("offset", 0):
+                state = None
+        pending.append((str(path), state))
+    return pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从 Claude Code 会话记录回填历史事件")
+    parser.add_argument("--projects", type=Path, default=DEFAULT_PROJECTS_DIR,
+                        help="会话记录目录（默认 ~/.claude/projects）")
+    parser.add_argument("--url", default=os.environ.get("MONITOR_BACKFILL_URL", DEFAULT_MONITOR_URL),
+                        help="监控平台地址")
+    parser.add_argument("--since", default="", help="只回填该时间之后的事件（Unix 时间戳或 ISO 时间）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="并行处理的进程数")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT_FILE, help="检查点文件")
+    parser.add_argument("--reset", action="store_true", help="忽略检查点，全部重新处理")
+    parser.add_argument("--dry-run", action="store_true", help="只解析并统计，不发送也不更新检查点")
+    args = parser.parse_args()
+
+    if not args.projects.is_dir():
+        parser.error(f"会话记录目录不存在: {args.projects}")
+    try:
+        since = parse_since(args.since)
+    except ValueError as e:
+        parser.error(f"无法解析时间: {e}")
+
+    checkpoint = {"files": {}} if args.reset else load_checkpoint(args.checkpoint)
+    pending = pending_files(discover(args.projects), checkpoint, since)
+    print(f"待处理会话记录: {len(pending)}", file=sys.stderr)
+
+    started = time.perf_counter()
+    total_events = total_accepted = failed = 0
+    url = args.url.rstrip("/")
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(backfill_file, path, state, url, since, args.dry_run): path for path, state in pending}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # 解析出错等意外失败只影响这一个文件，检查点保持原样，下次重新处理
+                failed += 1
+                print(f"失败: {futures[future]}: {e!r}", file=sys.stderr)
+                continue
+            total_events += result["events"]
+            total_accepted += result["accepted"]
+            if result["error"]:
+                failed += 1
+                print(f"失败: {result['path']}: {result['error']}", file=sys.stderr)
+            if not args.dry_run:
+                checkpoint["files"][result["path"]] = result["state"]
+                save_checkpoint(args.checkpoint, checkpoint)
+
+    elapsed = time.perf_counter() - started
+    print(f"事件: {total_events}，监控平台接收: {total_accepted}，失败文件: {failed}，"
+          f"耗时 {elapsed:.1f} 秒", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
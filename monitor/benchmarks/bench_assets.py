@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+看板加载基准测试
+
+启动 server.py，模拟浏览器打开看板：先请求页面，再并行请求页面引用的样式和脚本，
+记录首次打开（无缓存）和再次打开（有缓存）时的请求数、传输字节数和耗时。
+再次打开时，带 immutable / max-age 缓存头的资源直接使用缓存，其余资源按 ETag / Last-Modified 发送条件请求。
+
+本机回环的耗时几乎只有服务端处理时间，因此同时按给定的往返延迟和带宽估算远程访问看板时
+页面可交互前的网络耗时：页面一个往返，样式和脚本并行一个往返，加上传输字节所需时间。
+
+对比改动前后时，用 --server 指定旧版本的 server.py（如 git worktree 中的检出）:
+    python monitor/benchmarks/bench_assets.py
+    python monitor/benchmarks/bench_assets.py --server /tmp/baseline/monitor/server.py
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "server.py"
+ASSET_PATTERN = re.compile(r'(?:href|src)="(/static/[^"]+\.(?:css|js))"')
+BROWSER_HEADERS = {"Accept-Encoding": "gzip, deflate, br"}
+
+
+async def wait_ready(base_url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                await client.get(f"{base_url}/api/stats", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+
+def cacheable(response: httpx.Response) -> bool:
+    """响应是否可以不经确认直接从缓存使用"""
+    cache_control = response.headers.get("cache-control", "")
+    return "immutable" in cache_control or ("max-age" in cache_control and "no-cache" not in cache_control)
+
+
+def conditional_headers(response: httpx.Response) -> dict:
+    headers = dict(BROWSER_HEADERS)
+    if "etag" in response.headers:
+        headers["If-None-Match"] = response.headers["etag"]
+    if "last-modified" in response.headers:
+        headers["If-Modified-Since"] = response.headers["last-modified"]
+    return headers
+
+
+async def fetch(client: httpx.AsyncClient, url: str, cache: dict) -> tuple:
+    """按浏览器缓存规则请求一个地址，返回 (是否发出请求, 传输字节数)"""
+    cached = cache.get(url)
+    if cached is not None and cacheable(cached):
+        return False, 0
+    headers = conditional_headers(cached) if cached is not None else BROWSER_HEADERS
+    response = await client.get(url, headers=headers)
+    if response.status_code == 200:
+        cache[url] = response
+    elif response.status_code != 304:
+        response.raise_for_status()
+    header_bytes = sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+    return True, response.num_bytes_downloaded + header_bytes
+
+
+async def load_dashboard(base_url: str, cache: dict) -> dict:
+    """打开一次看板：页面 + 并行请求样式和脚本"""
+    limits = httpx.Limits(max_connections=6)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=10.0) as client:
+        started = time.perf_counter()
+        _, page_bytes = await fetch(client, "/", cache)
+        html = cache["/"].text
+        urls = ASSET_PATTERN.findall(html)
+        results = await asyncio.gather(*(fetch(client, url, cache) for url in urls))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": 1 + sum(1 for requested, _ in results if requested),
+        "page_bytes": page_bytes,
+        "asset_bytes": sum(size for _, size in results),
+        "asset_requests": sum(1 for requested, _ in results if requested),
+        "elapsed_ms": elapsed * 1000,
+    }
+
+
+def modeled_ms(load: dict, rtt_ms: float, bandwidth_mbps: float) -> float:
+    """按往返延迟和带宽估算的页面可交互前网络耗时"""
+    per_byte_ms = 8 / (bandwidth_mbps * 1000)
+    total = rtt_ms + load["page_bytes"] * per_byte_ms
+    if load["asset_requests"]:
+        total += rtt_ms + load["asset_bytes"] * per_byte_ms
+    return total
+
+
+async def bench(server: Path, port: int, rounds: int, rtt_ms: float, bandwidth_mbps: float) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env["MONITOR_STATE_DB"] = str(Path(tempfile.mkdtemp()) / "events.db")
+    env["MONITOR_PERSIST"] = "0"
+    env.pop("MONITOR_WORKERS", None)
+
+    proc = subprocess.Popen(
+        [sys.executable, str(server), "--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(base_url)
+        cold, warm = [], []
+        for _ in range(rounds):
+            cache: dict = {}
+            cold.append(await load_dashboard(base_url, cache))
+            warm.append(await load_dashboard(base_url, cache))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    def summarize(loads: list) -> dict:
+        load = loads[-1]
+        return {
+            "requests": load["requests"],
+            "bytes": load["page_bytes"] + load["asset_bytes"],
+            "local_ms": statistics.median(item["elapsed_ms"] for item in loads),
+            "modeled_ms": modeled_ms(load, rtt_ms, bandwidth_mbps),
+        }
+
+    return {"cold": summarize(cold), "warm": summarize(warm)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="看板加载基准测试")
+    parser.add_argument("--server", type=Path, default=SERVER_SCRIPT, help="要测试的 server.py")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--rtt", type=float, default=50.0, help="估算用的往返延迟（毫秒）")
+    parser.add_argument("--bandwidth", type=float, default=10.0, help="估算用的带宽（Mbit/s）")
+    parser.add_argument("--port", type=int, default=18798)
+    args = parser.parse_args()
+
+    result = await bench(args.server, args.port, args.rounds, args.rtt, args.bandwidth)
+    print(f"server: {args.server}")
+    print(f"{'load':>6} {'requests':>9} {'bytes':>9} {'local ms':>9} "
+          f"{f'modeled ms ({args.rtt:g}ms/{args.bandwidth:g}Mbps)':>28}")
+    for name in ("cold", "warm"):
+        item = result[name]
+        print(f"{name:>6} {item['requests']:>9} {item['bytes']:>9} {item['local_ms']:>9.2f} "
+              f"{item['modeled_ms']:>28.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
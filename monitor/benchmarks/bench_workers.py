@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+多 worker 吞吐基准测试
+
+依次以不同 worker 数量启动 server.py，并发向 /api/event 推送事件，
+同时用一个 WebSocket 看板连接统计收到的事件数，验证跨 worker 推送完整有序。
+看板读取跟不上时服务端会改为补发状态和缺失的事件（resync 列），
+服务端主动关闭看板连接时记录关闭码（closed 列），不中断测试。
+
+用法:
+    python monitor/benchmarks/bench_workers.py --workers 1 2 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import httpx
+import websockets
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "server.py"
+
+
+def make_event(i: int) -> dict:
+    return {
+        "event_type": "PostToolUse",
+        "event_name": "PostToolUse",
+        "data": {"tool_name": "Bash", "tool_input": {"command": f"echo {i}"}},
+        "session": {
+            "session_id": f"bench-{i % 8}",
+            "project_name": "bench",
+            "hostname": "bench-host",
+            "pid": 0,
+        },
+    }
+
+
+async def wait_ready(base_url: str, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                await client.get(f"{base_url}/api/stats", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+
+async def watch_dashboard(ws_url: str, received: set, status: dict, stop: asyncio.Event):
+    """模拟一个看板连接：记录收到的事件 id（包括补发的事件）、补发次数和服务端关闭连接的关闭码"""
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            except websockets.ConnectionClosed as e:
+                status["closed"] = e.rcvd.code if e.rcvd is not None else 1006
+                return
+            message = json.loads(raw)
+            kind, data = message.get("type"), message.get("data") or {}
+            if kind == "event":
+                received.add(data.get("id"))
+            elif kind == "resume":
+                received.update(event.get("id") for event in data.get("events", []))
+            elif kind in ("init", "state"):
+                status["snapshots"] += 1
+            elif kind == "ping":
+                await ws.send(json.dumps({"type": "pong", "data": {"id": data.get("id")}}))
+
+
+async def run_load(base_url: str, duration: float, concurrency: int, offset: int) -> int:
+    sent = 0
+    deadline = time.time() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+        async def producer(worker_id: int):
+            nonlocal sent
+            i = offset + worker_id
+            while time.time() < deadline:
+                response = await client.post(f"{base_url}/api/event", json=make_event(i))
+                response.raise_for_status()
+                sent += 1
+                i += concurrency
+
+        await asyncio.gather(*(producer(n) for n in range(concurrency)))
+    return sent
+
+
+def run_load_process(base_url: str, duration: float, concurrency: int, offset: int) -> int:
+    """单个压测进程（客户端本身也要多进程，否则压测端先成为瓶颈）"""
+    return asyncio.run(run_load(base_url, duration, concurrency, offset))
+
+
+async def bench(workers: int, port: int, duration: float, concurrency: int, clients: int) -> dict:
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    env["MONITOR_STATE_DB"] = str(Path(tempfile.mkdtemp()) / "events.db")
+    env.pop("MONITOR_WORKERS", None)
+
+    proc = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(base_url)
+        received: set = set()
+        status = {"snapshots": 0, "closed": None}
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(
+            watch_dashboard(f"ws://127.0.0.1:{port}/ws", received, status, stop))
+        await asyncio.sleep(0.5)
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=clients) as pool:
+            counts = await asyncio.gather(*(
+                loop.run_in_executor(pool, run_load_process, base_url, duration,
+                                     concurrency, n * 1_000_000)
+                for n in range(clients)
+            ))
+        elapsed = time.perf_counter() - start
+        sent = sum(counts)
+
+        # 等待推送追上
+        drain_deadline = time.time() + 10
+        while len(received) < sent and time.time() < drain_deadline and not watcher.done():
+            await asyncio.sleep(0.1)
+        stop.set()
+        await watcher
+
+        return {
+            "workers": workers,
+            "sent": sent,
+            "received": len(received),
+            "events_per_sec": sent / elapsed,
+            # 第一个快照是连接时的 init，之后的都是补发
+            "resyncs": max(0, status["snapshots"] - 1),
+            "closed": status["closed"],
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="多 worker 吞吐基准测试")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="每个压测进程的并发请求数")
+    parser.add_argument("--clients", type=int, default=4, help="压测进程数")
+    parser.add_argument("--port", type=int, default=18799)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'sent':>8} {'received':>9} {'events/s':>10} {'resyncs':>8} {'closed':>7}")
+    for workers in args.workers:
+        result = await bench(workers, args.port, args.duration, args.concurrency, args.clients)
+        print(f"{result['workers']:>8} {result['sent']:>8} "
+              f"{result['received']:>9} {result['events_per_sec']:>10.1f} "
+              f"{result['resyncs']:>8} {result['closed'] or '-':>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 看板连接状态
+记录每个 WebSocket 连接的发送量、心跳往返延迟和发送超时次数，
+服务端据此主动发送心跳并清理已失效（半开、不再读取）的连接。
+每个连接有自己的有界发送队列，由单独的任务按顺序发送，某个对端卡住不影响其他连接。
+整体替换的状态消息（会话列表、统计等）在队列中只保留最新的一条；读取跟不上的连接在队列满时
+丢弃积压的消息，改为补发一次最新状态和缺失的事件，不断开连接。
+"""
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+class ConnectionStats:
+    """单个看板连接的统计与心跳状态"""
+
+    __slots__ = ("id", "client", "connected_at", "bytes_sent", "messages_sent", "last_received",
+                 "last_pong", "lag", "ping_id", "ping_sent_at", "send_timeouts", "queue", "writer",
+                 "last_seq", "resync_pending", "resyncs", "latest")
+
+    def __init__(self, connection_id: int, client: str = "", queue_size: int = 1000):
+        now = time.time()
+        self.id = connection_id
+        self.client = client
+        self.connected_at = now
+        self.bytes_sent = 0
+        self.messages_sent = 0
+        self.last_received = now
+        self.last_pong: Optional[float] = None
+        self.lag: Optional[float] = None  # 最近一次心跳的往返时间（秒）
+        self.ping_id = 0
+        self.ping_sent_at: Optional[float] = None  # 未收到回应的心跳发送时间
+        self.send_timeouts = 0
+        # 待发送的 [文本, 字节数, 事件序号, 是否可由状态快照替代, 合并类型]；文本为 None 表示补发状态
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.last_seq: Optional[int] = None  # 已发出的消息中最新的事件序号
+        self.resync_pending = False
+        self.resyncs = 0
+        # 合并类型 -> 队列中尚未发送的该类消息，新消息直接替换其内容
+        self.latest: Dict[str, list] = {}
+
+    def enqueue(self, text: str, size: int, seq: Optional[int] = None,
+                replaceable: bool = False, coalesce: str = "") -> bool:
+        """放入发送队列，返回是否需要补发状态（队列已满，积压的可替代消息已丢弃）
+
+        coalesce 非空时，队列中还有同类消息未发送则只替换其内容，不占用新的位置。
+        补发之前新的可替代消息不再入队（补发的状态中已包含）。
+        """
+        if replaceable and self.resync_pending:
+            return False
+        pending = self.latest.get(coalesce) if coalesce else None
+        if pending is not None:
+            pending[0], pending[1] = text, size
+            return False
+        item = [text, size, seq, replaceable, coalesce]
+        overflowed = False
+        if self.queue.full():
+            self._overflow()
+            overflowed = True
+            if replaceable or self.queue.full():
+                return overflowed
+        self.queue.put_nowait(item)
+        if coalesce:
+            self.latest[coalesce] = item
+        return overflowed
+
+    def dequeued(self, item: list):
+        """发送任务取出一条消息后调用"""
+        if item[4] and self.latest.get(item[4]) is item:
+            del self.latest[item[4]]
+        if item[0] is None:
+            self.resync_pending = False
+
+    def _overflow(self):
+        """丢弃可由状态快照替代的积压消息，排入一次补发标记"""
+        kept = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if not item[3]:
+                kept.append(item)
+        self.latest = {kind: item for kind, item in self.latest.items() if not item[3]}
+        self.queue.put_nowait([None, 0, None, False, ""])
+        for item in kept:
+            self.queue.put_nowait(item)
+        self.resync_pending = True
+        self.resyncs += 1
+
+    def sent(self, size: int):
+        self.bytes_sent += size
+        self.messages_sent += 1
+
+    def start_ping(self, now: float) -> Dict:
+        """生成心跳消息并记录发送时间"""
+        self.ping_id += 1
+        self.ping_sent_at = now
+        return {"type": "ping", "data": {"id": self.ping_id, "ts": now}}
+
+    def received(self, message: Dict, now: float) -> Optional[float]:
+        """收到客户端消息；是对当前心跳的回应时返回往返时间
+
+        收到任何消息都说明连接仍然有效，未回应的心跳随之作废（旧版看板不回应心跳，只定时发送 ping）
+        """
+        self.last_received = now
+        ping_sent_at, self.ping_sent_at = self.ping_sent_at, None
+        if message.get("type") != "pong" or ping_sent_at is None:
+            return None
+        data = message.get("data") or {}
+        if data.get("id") != self.ping_id:
+            return None
+        self.lag = now - ping_sent_at
+        self.last_pong = now
+        return self.lag
+
+    def snapshot(self, now: float) -> Dict:
+        return {
+            "id": self.id,
+            "client": self.client,
+            "age_seconds": round(now - self.connected_at, 1),
+            "bytes_sent": self.bytes_sent,
+            "messages_sent": self.messages_sent,
+            "idle_seconds": round(now - self.last_received, 1),
+            "last_pong_seconds_ago": round(now - self.last_pong, 1) if self.last_pong else None,
+            "lag_ms": round(self.lag * 1000, 2) if self.lag is not None else None,
+            "ping_pending": self.ping_sent_at is not None,
+            "send_timeouts": self.send_timeouts,
+            "queued": self.queue.qsize(),
+            "resyncs": self.resyncs,
+        }
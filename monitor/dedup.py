@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 事件去重
+hook 在采集时为每个事件生成 event_id（按时间排序的 UUIDv7），重试、中继重发或重放时 id 不变。
+服务端在入口用有时间窗口和容量上限的集合记录最近见过的 id，重复事件直接丢弃，
+“至少一次”的投递路径因此是幂等的。
+"""
+
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+
+def uuid7() -> str:
+    """UUIDv7：48 位毫秒时间戳 + 74 位随机数，按生成时间大致有序"""
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = ((ms & ((1 << 48) - 1)) << 80) | (0x7 << 76) | ((rand >> 68) << 64) \
+        | (0b10 << 62) | (rand & ((1 << 62) - 1))
+    return str(uuid.UUID(int=value))
+
+
+class DedupWindow:
+    """最近 ttl 秒内见过的 id（最多 max_size 个），成员判断 O(1)
+
+    按插入顺序保存，过期和超出容量的 id 从最旧的一端淘汰，每次检查的摊还代价为 O(1)
+    """
+
+    def __init__(self, ttl: float = 600.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self.checked = 0
+        self.duplicates = 0
+
+    def seen(self, event_id: str, now: Optional[float] = None) -> bool:
+        """已在窗口内见过时返回 True，否则记录该 id 并返回 False"""
+        now = time.monotonic() if now is None else now
+        self.checked += 1
+        # 淘汰过期的 id
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[oldest]
+
+        if event_id in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[event_id] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def status(self) -> dict:
+        return {
+            "size": len(self._seen),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+        }
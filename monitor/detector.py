@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 失控会话检测
+在事件流上在线检测三类异常，每个会话只保存固定大小的状态：
+    - 重复循环：最近的工具调用中同一调用（工具 + 参数）反复出现，或反复读写同一个文件
+    - 频率突增：短时间窗口的事件频率远高于该会话的长期频率
+    - 静默卡住：一轮对话（UserPromptSubmit 之后、Stop 之前）长时间没有任何事件，或一轮持续过久
+检测结果由监控平台作为 AgentAlert 事件发出，可以像普通事件一样触发提醒音和钉钉推送。
+"""
+
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+ALERT_EVENT = "AgentAlert"
+
+LOOP_WINDOW = 10          # 重复检测看最近多少次工具调用
+LOOP_REPEAT = 4           # 同一调用在窗口内出现多少次算循环
+FILE_LOOP_WINDOW = 12     # 文件循环检测看最近多少次文件操作
+FILE_LOOP_REPEAT = 10     # 同一文件在窗口内被操作多少次算循环
+FILE_TOOLS = ("Read", "Edit", "MultiEdit", "Write", "NotebookEdit")
+
+RATE_FAST_SECONDS = 10.0   # 短期频率的时间常数
+RATE_SLOW_SECONDS = 600.0  # 长期频率的时间常数
+RATE_WARMUP_SECONDS = 120  # 会话开始后多久才判断频率突增
+SPIKE_FACTOR = 5.0         # 短期频率超过长期频率的倍数
+SPIKE_MIN_RATE = 2.0       # 短期频率至少达到多少（事件/秒）
+
+STALL_SECONDS = 600        # 一轮对话中多久没有事件算卡住
+TURN_MAX_SECONDS = 3600    # 一轮对话最长持续多久
+ALERT_COOLDOWN = 600       # 同一会话同一类告警的最短间隔（秒）
+
+# 等待用户操作的事件：之后没有事件是正常的，不算卡住
+WAITING_EVENTS = ("PermissionRequest", "Notification")
+
+
+def call_fingerprint(tool_name: str, tool_input) -> int:
+    """工具调用的指纹：工具名 + 参数"""
+    try:
+        arguments = json.dumps(tool_input, sort_keys=True, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        arguments = repr(tool_input)
+    return hash((tool_name, arguments))
+
+
+class Window:
+    """定长滑动窗口，同时维护窗口内每个值的出现次数"""
+
+    __slots__ = ("size", "items", "counts")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.items = deque()
+        self.counts: Dict = {}
+
+    def push(self, value) -> int:
+        """加入一个值，返回该值在窗口内的出现次数"""
+        self.items.append(value)
+        self.counts[value] = self.counts.get(value, 0) + 1
+        if len(self.items) > self.size:
+            old = self.items.popleft()
+            remaining = self.counts[old] - 1
+            if remaining:
+                self.counts[old] = remaining
+            else:
+                del self.counts[old]
+        return self.counts[value]
+
+    def clear(self):
+        self.items.clear()
+        self.counts.clear()
+
+
+class SessionWatch:
+    """单个会话的检测状态（大小固定）"""
+
+    __slots__ = ("calls", "files", "first_seen", "last_event", "last_received", "last_seq", "fast_rate",
+                 "slow_rate", "turn_started", "turn_seq", "waiting", "last_alert", "session")
+
+    def __init__(self, timestamp: float, received: float):
+        self.calls = Window(LOOP_WINDOW)
+        self.files = Window(FILE_LOOP_WINDOW)
+        self.first_seen = timestamp
+        self.last_event = timestamp
+        # 卡住和持续过久按本机收到事件的时间判断，与各主机的时钟偏差无关
+        self.last_received = received
+        self.last_seq = 0
+        # 指数衰减的事件频率（事件/秒）
+        self.fast_rate = 0.0
+        self.slow_rate = 0.0
+        self.turn_started: Optional[float] = None  # 本轮开始时本机收到 UserPromptSubmit 的时间
+        self.turn_seq = 0
+        self.waiting = False
+        self.last_alert: Dict[str, float] = {}
+        self.session: Dict = {}
+
+    def update_rates(self, timestamp: float):
+        elapsed = max(0.0, timestamp - self.last_event)
+        self.fast_rate = self.fast_rate * math.exp(-elapsed / RATE_FAST_SECONDS) + 1.0 / RATE_FAST_SECONDS
+        self.slow_rate = self.slow_rate * math.exp(-elapsed / RATE_SLOW_SECONDS) + 1.0 / RATE_SLOW_SECONDS
+
+    def rates(self, timestamp: float) -> tuple:
+        """(短期频率, 长期频率)，按会话已持续的时间修正衰减平均在开始阶段的偏低"""
+        age = max(timestamp - self.first_seen, 1e-3)
+        fast = self.fast_rate / (1.0 - math.exp(-age / RATE_FAST_SECONDS))
+        slow = self.slow_rate / (1.0 - math.exp(-age / RATE_SLOW_SECONDS))
+        return fast, slow
+
+
+class AgentDetector:
+    """按会话在线检测循环、频率突增和卡住，超过 max_sessions 时淘汰最久没有事件的会话"""
+
+    def __init__(self, max_sessions: int = 2000, enabled: bool = True):
+        self.max_sessions = max_sessions
+        self.enabled = enabled
+        self.sessions: "OrderedDict[str, SessionWatch]" = OrderedDict()
+        self.observed = 0
+        self.cost_ns = 0
+        self.max_cost_ns = 0
+        self.alerts: Dict[str, int] = {}
+
+    def observe(self, event: Dict, timestamp: float, received: Optional[float] = None) -> List[Dict]:
+        """处理一个事件，返回触发的告警
+
+        timestamp 为事件发生的时间（用于重复和频率检测），received 为本机收到事件的时间（默认当前时间）
+        """
+        if not self.enabled or event.get("event_type") == ALERT_EVENT:
+            return []
+        session_info = event.get("session") or {}
+        session_id = session_info.get("session_id")
+        if not session_id:
+            return []
+
+        started = time.perf_counter_ns()
+        try:
+            return self._observe(session_id, session_info, event, timestamp,
+                                 time.time() if received is None else received)
+        finally:
+            cost = time.perf_counter_ns() - started
+            self.observed += 1
+            self.cost_ns += cost
+            self.max_cost_ns = max(self.max_cost_ns, cost)
+
+    def _observe(self, session_id: str, session_info: Dict, event: Dict, timestamp: float,
+                 received: float) -> List[Dict]:
+        event_type = event.get("event_type", "")
+        if event_type == "SessionEnd":
+            self.sessions.pop(session_id, None)
+            return []
+
+        watch = self.sessions.get(session_id)
+        if watch is None:
+            watch = self.sessions[session_id] = SessionWatch(timestamp, received)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+
+        watch.update_rates(timestamp)
+        watch.last_event = max(watch.last_event, timestamp)
+        watch.last_received = max(watch.last_received, received)
+        watch.last_seq = event.get("seq") or watch.last_seq
+        watch.session = session_info
+        watch.waiting = event_type in WAITING_EVENTS
+
+        alerts = []
+        if event_type == "UserPromptSubmit":
+            # 用户发起新一轮对话，之前的重复不再延续
+            watch.turn_started = received
+            watch.turn_seq = watch.last_seq
+            watch.calls.clear()
+            watch.files.clear()
+        elif event_type == "Stop":
+            watch.turn_started = None
+
+        data = event.get("data") or {}
+        # 削峰精简过的事件没有参数，不参与重复检测
+        if event_type == "PreToolUse" and isinstance(data, dict) and not event.get("shed"):
+            tool_name = data.get("tool_name") or "unknown"
+            tool_input = data.get("tool_input") or {}
+            repeats = watch.calls.push(call_fingerprint(tool_name, tool_input))
+            if repeats >= LOOP_REPEAT:
+                alerts.append(self._alert(watch, session_id, "loop", timestamp,
+                                          f"{tool_name} 以相同参数在最近 {LOOP_WINDOW} 次调用中重复了 {repeats} 次",
+                                          {"tool_name": tool_name, "repeats": repeats}))
+            path = (tool_input.get("file_path") or tool_input.get("notebook_path")) if isinstance(tool_input, dict) else None
+            if tool_name in FILE_TOOLS and isinstance(path, str):
+                repeats = watch.files.push(path)
+                if repeats >= FILE_LOOP_REPEAT:
+                    alerts.append(self._alert(watch, session_id, "file_loop", timestamp,
+                                              f"最近 {FILE_LOOP_WINDOW} 次文件操作中有 {repeats} 次针对 {path}",
+                                              {"file_path": path, "repeats": repeats}))
+
+        if timestamp - watch.first_seen >= RATE_WARMUP_SECONDS:
+            fast, slow = watch.rates(timestamp)
+            if fast >= SPIKE_MIN_RATE and fast > SPIKE_FACTOR * slow:
+                alerts.append(self._alert(watch, session_id, "rate_spike", timestamp,
+                                          f"事件频率 {fast:.1f}/秒，是该会话平时的 {fast / max(slow, 1e-6):.0f} 倍",
+                                          {"rate": round(fast, 2), "baseline": round(slow, 3)}))
+        return [alert for alert in alerts if alert is not None]
+
+    def check(self, now: Optional[float] = None) -> List[Dict]:
+        """定期调用：检查进行中的对话是否卡住或持续过久"""
+        if not self.enabled:
+            return []
+        now = now or time.time()
+        alerts = []
+        for session_id, watch in self.sessions.items():
+            if watch.turn_started is None:
+                continue
+            idle = now - watch.last_received
+            if not watch.waiting and idle >= STALL_SECONDS:
+                alerts.append(self._alert(watch, session_id, "stall", now,
+                                          f"对话进行中，已 {idle / 60:.0f} 分钟没有任何事件",
+                                          {"idle_seconds": round(idle)}))
+            running = now - watch.turn_started
+            if running >= TURN_MAX_SECONDS:
+                alerts.append(self._alert(watch, session_id, "long_turn", now,
+                                          f"本轮对话已持续 {running / 60:.0f} 分钟",
+                                          {"turn_seconds": round(running)}, key_seq=watch.turn_seq))
+        return [alert for alert in alerts if alert is not None]
+
+    def _alert(self, watch: SessionWatch, session_id: str, kind: str, timestamp: float,
+               message: str, details: Dict, key_seq: Optional[int] = None) -> Optional[Dict]:
+        last = watch.last_alert.get(kind)
+        if last is not None and timestamp - last < ALERT_COOLDOWN:
+            return None
+        watch.last_alert[kind] = timestamp
+        self.alerts[kind] = self.alerts.get(kind, 0) + 1
+        return {
+            # 同一告警在每个 worker 上得到相同的 id（会话 + 类型 + 触发时的事件序号）
+            "alert_id": f"{session_id}:{kind}:{key_seq if key_seq is not None else watch.last_seq}",
+            "kind": kind,
+            "message": message,
+            "session": watch.session,
+            **details,
+        }
+
+    def remove(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "sessions": len(self.sessions),
+            "observed": self.observed,
+            "avg_cost_us": round(self.cost_ns / self.observed / 1000, 2) if self.observed else 0.0,
+            "max_cost_us": round(self.max_cost_ns / 1000, 2),
+            "alerts": self.alerts,
+            "thresholds": {
+                "loop": {"window": LOOP_WINDOW, "repeat": LOOP_REPEAT},
+                "file_loop": {"window": FILE_LOOP_WINDOW, "repeat": FILE_LOOP_REPEAT},
+                "rate_spike": {"factor": SPIKE_FACTOR, "min_rate": SPIKE_MIN_RATE},
+                "stall_seconds": STALL_SECONDS,
+                "turn_max_seconds": TURN_MAX_SECONDS,
+                "cooldown_seconds": ALERT_COOLDOWN,
+            },
+        }
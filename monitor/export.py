@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 事件导出
+从 SQLite 事件存储（events.db）按条件流式导出事件，支持 NDJSON、CSV 和 Parquet（列式，需要 pyarrow）。
+按 seq 分批读取并逐批编码输出，导出数百万条事件时内存占用也保持不变。
+
+既由 GET /api/export 使用，也可以作为命令行工具直接读取数据库文件：
+    python monitor/export.py --format csv --since 2026-01-01 --project my-app -o events.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from search import parse_since
+
+# 格式 -> (Content-Type, 文件扩展名)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# omit=large 时去掉的大字段（点号分隔的路径）
+LARGE_FIELDS = ("data.tool_input", "data.tool_response", "data.prompt", "data.message")
+
+# CSV / Parquet 的列；data 列为 JSON 文本
+EXPORT_COLUMNS = ("seq", "created", "timestamp", "event_type", "session_id",
+                  "project_name", "hostname", "tool_name", "data")
+
+EXPORT_BATCH_SIZE = 1000  # 每次从数据库读取、编码输出的条数
+
+
+def columnar_available() -> bool:
+    """是否安装了 pyarrow（Parquet 导出需要）"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_omit(omit: str) -> Tuple[str, ...]:
+    """逗号分隔的字段路径，large 表示 LARGE_FIELDS"""
+    paths = []
+    for item in (omit or "").split(","):
+        item = item.strip()
+        if item == "large":
+            paths.extend(LARGE_FIELDS)
+        elif item:
+            paths.append(item)
+    return tuple(paths)
+
+
+def omit_fields(event: Dict, paths: Sequence[str]) -> Dict:
+    """按路径删除字段（原地修改）"""
+    for path in paths:
+        *parents, leaf = path.split(".")
+        target = event
+        for key in parents:
+            target = target.get(key) if isinstance(target, dict) else None
+        if isinstance(target, dict):
+            target.pop(leaf, None)
+    return event
+
+
+def event_matches(event: Dict, session: str = "", project: str = "", event_type: str = "") -> bool:
+    session_info = event.get("session") or {}
+    if session and session_info.get("session_id") != session:
+        return False
+    if project and project not in (session_info.get("project_name"), session_info.get("project_path")):
+        return False
+    if event_type and event.get("event_type") != event_type:
+        return False
+    return True
+
+
+def iter_events(db_path, since: Optional[float] = None, until: Optional[float] = None,
+                session: str = "", project: str = "", event_type: str = "",
+                omit: Sequence[str] = (), batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Dict]:
+    """按 seq 顺序逐条返回满足条件的事件
+
+    时间范围按事件发生的时间（event_time 列，即事件的 timestamp）过滤，[since, until)；
+    补录的历史事件写入得晚，但按其原本的时间导出。
+    使用独立的只读连接，只导出开始时已写入的事件，不影响服务端写入。
+    """
+    conn = sqlite3.connect(f"file:{Path(db_path)}?mode=ro", uri=True, timeout=30)
+    try:
+        # 旧版本服务端写入、尚未升级的数据库没有 event_time 列，只能按写入时间过滤
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        time_column = "event_time" if "event_time" in columns else "created"
+        # 用时间索引确定 seq 区间，之后按主键分批扫描（区间内时间不在范围内的事件逐条过滤）
+        if since is not None:
+            start = conn.execute(f"SELECT MIN(seq) FROM events WHERE {time_column} >= ?", (since,)).fetchone()[0]
+        else:
+            start = conn.execute("SELECT MIN(seq) FROM events").fetchone()[0]
+        if until is not None:
+            end = conn.execute(f"SELECT MAX(seq) FROM events WHERE {time_column} < ?", (until,)).fetchone()[0]
+        else:
+            end = conn.execute("SELECT MAX(seq) FROM events").fetchone()[0]
+        if start is None or end is None:
+            return
+
+        last = start - 1
+        while last < end:
+            rows = conn.execute(
+                f"SELECT seq, created, body FROM events "
+                f"WHERE seq > ? AND seq <= ? AND kind = 'event' AND {time_column} >= ? AND {time_column} < ? "
+                f"ORDER BY seq LIMIT ?",
+                (last, end, since if since is not None else float("-inf"),
+                 until if until is not None else float("inf"), batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            for seq, created, body in rows:
+                event = json.loads(body)
+                if not event_matches(event, session, project, event_type):
+                    continue
+                event.setdefault("seq", seq)
+                event["created"] = created
+                yield omit_fields(event, omit) if omit else event
+            last = rows[-1][0]
+    finally:
+        conn.close()
+
+
+def event_row(event: Dict) -> Tuple:
+    """CSV / Parquet 的一行，列顺序与 EXPORT_COLUMNS 一致"""
+    session_info = event.get("session") or {}
+    data = event.get("data")
+    tool_name = data.get("tool_name") if isinstance(data, dict) else None
+    return (
+        event.get("seq"),
+        event.get("created"),
+        event.get("timestamp"),
+        event.get("event_type"),
+        session_info.get("session_id"),
+        session_info.get("project_name"),
+        session_info.get("hostname"),
+        tool_name,
+        json.dumps(data, ensure_ascii=False) if data is not None else None,
+    )
+
+
+def _batches(events: Iterable[Dict], size: int) -> Iterator[list]:
+    batch = []
+    for event in events:
+        batch.append(event)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def encode_ndjson(events: Iterable[Dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    for batch in _batches(events, batch_size):
+        yield "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch).encode("utf-8")
+
+
+def encode_csv(events: Iterable[Dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in _batches(events, batch_size):
+        writer.writerows(event_row(e) for e in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """供 ParquetWriter 写入的类文件对象，写入的数据按块取走"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_parquet(events: Iterable[Dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """每批写成一个 row group，写完即输出（需要 pyarrow）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("seq", pa.int64()), ("created", pa.float64()), ("timestamp", pa.string()),
+        ("event_type", pa.string()), ("session_id", pa.string()), ("project_name", pa.string()),
+        ("hostname", pa.string()), ("tool_name", pa.string()), ("data", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in _batches(events, batch_size):
+            columns = list(zip(*(event_row(e) for e in batch)))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv, "parquet": encode_parquet}
+
+
+def encode_events(events: Iterable[Dict], fmt: str) -> Iterator[bytes]:
+    return ENCODERS[fmt](events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从事件存储导出事件")
+    parser.add_argument("--db", default=os.environ.get("MONITOR_STATE_DB", str(Path(__file__).parent / "events.db")),
+                        help="事件存储文件（默认 monitor/events.db）")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson", help="导出格式")
+    parser.add_argument("--since", default="", help="起始时间（Unix 时间戳或 ISO 时间）")
+    parser.add_argument("--until", default="", help="结束时间（不含）")
+    parser.add_argument("--session", default="", help="只导出该会话的事件")
+    parser.add_argument("--project", default="", help="只导出该项目（项目名或路径）的事件")
+    parser.add_argument("--type", default="", help="只导出该类型的事件")
+    parser.add_argument("--omit", default="", help="去掉的字段，逗号分隔（如 data.tool_response），large 表示常见大字段")
+    parser.add_argument("-o", "--output", default="-", help="输出文件，默认标准输出")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not columnar_available():
+        parser.error("Parquet 导出需要安装 pyarrow: pip install pyarrow")
+    if not Path(args.db).exists():
+        parser.error(f"事件存储不存在: {args.db}")
+    try:
+        since, until = parse_since(args.since), parse_since(args.until)
+    except ValueError as e:
+        parser.error(f"无法解析时间: {e}")
+
+    events = iter_events(args.db, since=since, until=until, session=args.session,
+                         project=args.project, event_type=args.type, omit=parse_omit(args.omit))
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in encode_events(events, args.format):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
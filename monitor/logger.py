@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 分级结构化日志
+日志级别由环境变量 MONITOR_LOG_LEVEL 控制（默认 INFO），
+MONITOR_LOG_FORMAT=json 时每行输出一个 JSON 对象，便于日志系统采集。
+
+结构化字段通过 fields() 传入，只有在日志真正输出时才会被序列化，
+因此关闭 DEBUG 时，热路径上的调试日志几乎没有开销。
+"""
+
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Dict
+
+LOG_LEVEL = os.environ.get("MONITOR_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("MONITOR_LOG_FORMAT", "text").lower()
+
+# 文本格式下单个字段的最大输出长度，避免大 payload 刷屏
+MAX_TEXT_FIELD_CHARS = 500
+
+
+def fields(**kwargs) -> Dict:
+    """构造结构化字段：logger.info("消息", extra=fields(key=value))"""
+    return {"fields": kwargs}
+
+
+def _to_text(value) -> str:
+    if isinstance(value, (dict, list)):
+        text = json.dumps(value, ensure_ascii=False, default=str)
+    else:
+        text = str(value)
+    if len(text) > MAX_TEXT_FIELD_CHARS:
+        text = text[:MAX_TEXT_FIELD_CHARS] + "..."
+    return text
+
+
+class StructuredFormatter(logging.Formatter):
+    """text: 时间 级别 [模块] 消息 key=value ...；json: 每行一个 JSON 对象"""
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        extra = getattr(record, "fields", None) or {}
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+
+        if self.as_json:
+            payload = {
+                "ts": timestamp,
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **extra,
+            }
+            if record.exc_info:
+                payload["exc"] = self.formatException(record.exc_info)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} [{record.name}] {record.getMessage()}"
+        if extra:
+            line += " " + " ".join(f"{k}={_to_text(v)}" for k, v in extra.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def get_logger(name: str = "monitor") -> logging.Logger:
+    """获取监控平台的 logger（首次调用时配置根 logger "monitor"）"""
+    root = logging.getLogger("monitor")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(as_json=LOG_FORMAT == "json"))
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+    return root if name == "monitor" else root.getChild(name)
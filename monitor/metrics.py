@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 内部指标
+轻量的 Counter / Gauge / Histogram 实现，输出 Prometheus / OpenMetrics 文本格式。
+热路径上只做一次字典查找和几次浮点加法；标签组合数量有上限，
+超出上限的新组合统一归入 "other"，避免高基数标签撑爆内存。
+"""
+
+import bisect
+import math
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认延迟分桶（秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 标签值最大长度
+MAX_LABEL_VALUE_CHARS = 64
+OVERFLOW_LABEL_VALUE = "other"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 max_series: int = 200):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labelvalues: Sequence[str]) -> Tuple[str, ...]:
+        """规范化标签值，超出序列上限的新组合归入 other"""
+        key = tuple(str(v)[:MAX_LABEL_VALUE_CHARS] for v in labelvalues)
+        if key not in self._series and len(self._series) >= self.max_series:
+            key = tuple(OVERFLOW_LABEL_VALUE for _ in self.labelnames)
+        return key
+
+    @abstractmethod
+    def render(self, openmetrics: bool) -> List[str]:
+        """按 OpenMetrics（openmetrics=True）或 Prometheus 文本格式输出各行"""
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        key = self._key(labelvalues)
+        self._series[key] = self._series.get(key, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._series.get(tuple(labelvalues), 0.0)
+
+    def render(self, openmetrics: bool) -> List[str]:
+        # OpenMetrics 中 counter 的 family 名不带 _total 后缀
+        family = self.name[:-6] if openmetrics and self.name.endswith("_total") else self.name
+        lines = [f"# HELP {family} {self.documentation}", f"# TYPE {family} counter"]
+        for key, value in self._series.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 max_series: int = 200, callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames, max_series)
+        # 通过回调在抓取时计算的 gauge，热路径零开销
+        self.callback = callback
+
+    def set(self, value: float, *labelvalues: str):
+        self._series[self._key(labelvalues)] = float(value)
+
+    def render(self, openmetrics: bool) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.callback is not None and self.labelnames:
+            # 带标签的回调 gauge：回调返回 {标签值元组: 数值}
+            try:
+                series = self.callback()
+            except Exception:
+                series = {}
+            for key, value in series.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+            return lines
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = math.nan
+            lines.append(f"{self.name} {_format_value(value)}")
+            return lines
+        for key, value in self._series.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 max_series: int = 50, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues: str):
+        key = self._key(labelvalues)
+        series = self._series.get(key)
+        if series is None:
+            # [各分桶计数（非累计）..., +Inf 计数, sum]
+            series = [0] * (len(self.buckets) + 1) + [0.0]
+            self._series[key] = series
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, openmetrics: bool) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bounds = self.buckets + (math.inf,)
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                max_series: int = 200) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, max_series))
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None,
+              labelnames: Sequence[str] = (), max_series: int = 200) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, max_series, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 50) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, max_series, buckets))
+
+    def render(self, openmetrics: bool = True) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render(openmetrics))
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
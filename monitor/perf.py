@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 热路径耗时分析
+记录各处理阶段（parse / add_event / broadcast / notify 等）的耗时分布，
+并定期采样事件循环延迟，通过 /api/debug/perf 查看。
+未启用时 stage() 返回共享的空上下文管理器，几乎没有开销。
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict, List
+
+# 每个阶段保留的最近样本数（用于计算分位数）
+SAMPLE_SIZE = 2048
+
+_NULL_CONTEXT = nullcontext()
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(q * len(sorted_samples)))
+    return sorted_samples[index]
+
+
+class StageStats:
+    """单个阶段的累计统计与最近样本"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+
+    def snapshot(self) -> Dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "total_ms": round(self.total * 1000, 3),
+        }
+
+
+class _StageTimer:
+    __slots__ = ("recorder", "name", "started")
+
+    def __init__(self, recorder: "PerfRecorder", name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class PerfRecorder:
+    """阶段耗时与事件循环延迟记录器"""
+
+    def __init__(self, enabled: bool = False, lag_interval: float = 0.5):
+        self.enabled = enabled
+        self.lag_interval = lag_interval
+        self.stages: Dict[str, StageStats] = {}
+        self.loop_lag = StageStats()
+        self.started_at = time.time()
+
+    def stage(self, name: str):
+        """with perf.stage("broadcast"): ...  未启用时返回空上下文"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _StageTimer(self, name)
+
+    def record(self, name: str, seconds: float):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.add(seconds)
+
+    async def sample_loop_lag(self):
+        """后台任务：测量 sleep 实际唤醒时间与预期的差值，即事件循环延迟"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.add(max(0.0, loop.time() - expected))
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "stages": {name: stats.snapshot() for name, stats in sorted(self.stages.items())},
+            "loop_lag": self.loop_lag.snapshot(),
+        }
+
+    def reset(self):
+        self.stages.clear()
+        self.loop_lag = StageStats()
+        self.started_at = time.time()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 分阶段异步处理管线
+/api/event 只做校验、分配序号和入队，随即返回；状态更新、持久化、推送和通知
+分别由独立的阶段在后台处理。每个阶段有自己的有界队列、并发数和批量大小，
+下游队列满时上游阶段等待（背压），入口队列积压时按事件优先级降级或丢弃（削峰）。
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from logger import get_logger, fields
+
+logger = get_logger("pipeline")
+
+# 削峰时保留的字段：事件的 data 只保留这些键（会话记录路径用于统计 token 用量），
+# 其余大字段（tool_input、tool_response 等）丢弃
+SHED_KEEP_FIELDS = ("tool_name", "tool_use_id", "session_id", "hook_event_name", "cwd",
+                    "transcript_path", "agent_transcript_path")
+# 输入即状态的工具（如 TodoWrite 的任务列表）即使削峰也保留完整 data
+SHED_KEEP_TOOLS = ("TodoWrite",)
+
+
+class Stage:
+    """管线中的一个阶段：有界队列 + 固定数量的 worker 任务"""
+
+    def __init__(self, name: str, handler: Callable[[List], Awaitable[None]],
+                 concurrency: int = 1, maxsize: int = 10000, batch_size: int = 1,
+                 duration_histogram=None, outcome_counter=None):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # 可选的指标：按阶段记录批次耗时（histogram）和处理结果计数（counter，标签 stage, outcome）
+        self.duration_histogram = duration_histogram
+        self.outcome_counter = outcome_counter
+        self.in_flight = 0
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def maxsize(self) -> int:
+        return self.queue.maxsize
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def fill_ratio(self) -> float:
+        return self.queue.qsize() / self.queue.maxsize if self.queue.maxsize else 0.0
+
+    async def put(self, item):
+        """入队，队列满时等待（背压）"""
+        await self.queue.put(item)
+
+    def put_nowait(self, item) -> bool:
+        """入队，队列满时返回 False"""
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"stage-{self.name}-{i}")
+                for i in range(self.concurrency)
+            ]
+
+    async def join(self):
+        """等待队列中已有的条目全部处理完"""
+        await self.queue.join()
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            self.in_flight += len(batch)
+            started = time.perf_counter()
+            try:
+                await self.handler(batch)
+                self.processed += len(batch)
+                if self.outcome_counter is not None:
+                    self.outcome_counter.inc(self.name, "ok", amount=len(batch))
+            except Exception as e:
+                self.errors += len(batch)
+                if self.outcome_counter is not None:
+                    self.outcome_counter.inc(self.name, "error", amount=len(batch))
+                logger.error("阶段处理出错", extra=fields(stage=self.name, size=len(batch), error=str(e)))
+            finally:
+                elapsed = time.perf_counter() - started
+                self.busy_seconds += elapsed
+                self.in_flight -= len(batch)
+                if self.duration_histogram is not None:
+                    self.duration_histogram.observe(elapsed, self.name)
+                for _ in batch:
+                    self.queue.task_done()
+
+    def status(self) -> Dict:
+        return {
+            "depth": self.depth(),
+            "maxsize": self.maxsize,
+            "in_flight": self.in_flight,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "processed": self.processed,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class ShedPolicy:
+    """削峰策略：根据入口队列的填充率和事件优先级决定保留、精简、丢弃或等待
+
+    - 低优先级事件（默认 PreToolUse / PostToolUse）：超过 soft 时精简 data，超过 hard 时丢弃
+    - 普通事件：超过 hard 时精简 data，队列满时丢弃
+    - 高优先级事件（默认 PermissionRequest / Notification / Stop 等）：从不丢弃，队列满时等待
+    """
+
+    KEEP, STRIP, DROP, WAIT = "keep", "strip", "drop", "wait"
+
+    def __init__(self, low: Iterable[str], high: Iterable[str],
+                 soft: float = 0.5, hard: float = 0.9, enabled: bool = True):
+        self.low = set(low)
+        self.high = set(high)
+        self.soft = soft
+        self.hard = hard
+        self.enabled = enabled
+
+    def decide(self, event_type: str, fill_ratio: float) -> str:
+        if event_type in self.high:
+            return self.WAIT if fill_ratio >= 1.0 else self.KEEP
+        if not self.enabled:
+            return self.WAIT if fill_ratio >= 1.0 else self.KEEP
+        if event_type in self.low:
+            if fill_ratio >= self.hard:
+                return self.DROP
+            return self.STRIP if fill_ratio >= self.soft else self.KEEP
+        if fill_ratio >= 1.0:
+            return self.DROP
+        return self.STRIP if fill_ratio >= self.hard else self.KEEP
+
+    @staticmethod
+    def strip(event: Dict) -> Dict:
+        """去掉事件 data 中的大字段，只保留用于统计和展示的标识"""
+        data = event.get("data")
+        if isinstance(data, dict) and data.get("tool_name") in SHED_KEEP_TOOLS:
+            return event
+        if isinstance(data, dict):
+            event["data"] = {k: data[k] for k in SHED_KEEP_FIELDS if k in data}
+        event["shed"] = True
+        return event
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "soft": self.soft,
+            "hard": self.hard,
+            "low_priority": sorted(self.low),
+            "high_priority": sorted(self.high),
+        }
+
+
+class Pipeline:
+    """一组按名称管理的阶段"""
+
+    def __init__(self, entry: str):
+        self.entry = entry
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, stage: Stage) -> Stage:
+        self.stages[stage.name] = stage
+        return stage
+
+    def get(self, name: str) -> Optional[Stage]:
+        return self.stages.get(name)
+
+    def start(self):
+        for stage in self.stages.values():
+            stage.start()
+
+    async def drain(self):
+        """按添加顺序等待各阶段处理完已入队的条目"""
+        for stage in self.stages.values():
+            await stage.join()
+
+    def status(self) -> Dict:
+        return {"entry": self.entry, "stages": {name: s.status() for name, s in self.stages.items()}}
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 本地权限策略
+在看板中维护 allow / deny / ask 规则，监控平台将其编译为本地缓存文件（policy_cache.json），
+hook 脚本直接读取缓存并在本地完成判断，不需要访问监控平台。
+
+本模块只依赖标准库，claude_hooks.py 会直接导入 evaluate()，导入和判断都必须足够快。
+
+规则示例：
+    {"id": "no-rm", "action": "deny", "tools": ["Bash"], "commands": ["rm -rf *"], "reason": "禁止 rm -rf"}
+    {"id": "read-src", "action": "allow", "tools": ["Read", "Glob", "Grep"], "paths": ["*/src/*"]}
+
+字段（都可省略，省略表示不限制）：
+    tools     工具名通配符，如 "Bash"、"mcp__github__*"
+    commands  Bash 命令通配符，以 "re:" 开头时为正则表达式。
+              命令按 ; && || | & 和换行拆分为多段：deny / ask 规则命中任意一段即生效，
+              allow 只在每一段都命中 allow 规则时生效；含 $(...)、反引号或引号不完整的命令不会被自动允许
+    paths     文件路径通配符（file_path / path / notebook_path），路径按 cwd 补全并规范化（去掉 .. 等）后再匹配
+    projects  项目名或项目路径通配符
+    events    生效的事件，默认 PreToolUse 和 PermissionRequest
+"""
+
+import fnmatch
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+POLICY_ACTIONS = ("allow", "deny", "ask")
+POLICY_EVENTS = ("PreToolUse", "PermissionRequest")
+# 同时命中多条规则时的优先级：deny > ask > allow
+ACTION_PRIORITY = {"deny": 3, "ask": 2, "allow": 1}
+PATTERN_FIELDS = ("tools", "commands", "paths", "projects")
+PATH_KEYS = ("file_path", "path", "notebook_path")
+
+CACHE_VERSION = 2
+
+# 拆分命令的 shell 操作符（长的在前）
+SHELL_SEPARATORS = ("&&", "||", "|&", ";;", ";", "|", "&", "\n")
+# 会执行嵌套命令、无法按段判断的写法
+SHELL_SUBSTITUTIONS = ("$(", "`", "<(", ">(")
+
+
+def _pattern_regex(pattern: str) -> str:
+    """通配符转正则（"re:" 前缀表示原样使用正则）"""
+    if pattern.startswith("re:"):
+        return f"(?:{pattern[3:]})"
+    return f"(?:{fnmatch.translate(pattern)})"
+
+
+def _glob_prefix(pattern: str) -> Optional[str]:
+    """通配符开头不含 * ? [ 的固定前缀，正则返回 None"""
+    if pattern.startswith("re:"):
+        return None
+    return re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+
+
+def split_command(command: str) -> Optional[List[str]]:
+    """按引号之外的 shell 操作符把命令拆成多段；含命令替换或引号不完整时返回 None"""
+    segments = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(command):
+        char = command[i]
+        if quote == "'":
+            if char == "'":
+                quote = None
+            current.append(char)
+            i += 1
+            continue
+        if char == "\\":
+            current.append(command[i:i + 2])
+            i += 2
+            continue
+        if command.startswith(SHELL_SUBSTITUTIONS, i) and not (quote == '"' and char in "<>"):
+            return None
+        if quote == '"':
+            if char == '"':
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif not (char == "&" and (command[i - 1:i] in ("<", ">") or command.startswith("&>", i))):
+            # 2>&1、&> 等重定向中的 & 不是操作符
+            separator = next((sep for sep in SHELL_SEPARATORS if command.startswith(sep, i)), None)
+            if separator is not None:
+                segments.append("".join(current).strip())
+                current = []
+                i += len(separator)
+                continue
+        current.append(char)
+        i += 1
+    if quote is not None:
+        return None
+    segments.append("".join(current).strip())
+    return [segment for segment in segments if segment]
+
+
+def validate_rules(rules) -> List[Dict]:
+    """校验并规范化规则列表，规则无效时抛出 ValueError"""
+    if not isinstance(rules, list):
+        raise ValueError("rules 必须是列表")
+    normalized = []
+    seen_ids = set()
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f"第 {index + 1} 条规则必须是对象")
+        action = rule.get("action")
+        if action not in POLICY_ACTIONS:
+            raise ValueError(f"第 {index + 1} 条规则的 action 必须是 allow / deny / ask")
+        rule_id = str(rule.get("id") or f"rule-{index + 1}")
+        if rule_id in seen_ids:
+            raise ValueError(f"规则 id 重复: {rule_id}")
+        seen_ids.add(rule_id)
+
+        item = {"id": rule_id, "action": action, "reason": str(rule.get("reason") or "")}
+        for field in PATTERN_FIELDS:
+            patterns = rule.get(field) or []
+            if isinstance(patterns, str):
+                patterns = [patterns]
+            if not isinstance(patterns, list) or not all(isinstance(p, str) and p for p in patterns):
+                raise ValueError(f"规则 {rule_id} 的 {field} 必须是字符串列表")
+            for pattern in patterns:
+                try:
+                    re.compile(_pattern_regex(pattern))
+                except re.error as e:
+                    raise ValueError(f"规则 {rule_id} 的 {field} 无效: {pattern} ({e})")
+            item[field] = patterns
+        events = rule.get("events") or list(POLICY_EVENTS)
+        if not isinstance(events, list) or any(e not in POLICY_EVENTS for e in events):
+            raise ValueError(f"规则 {rule_id} 的 events 只能包含 {' / '.join(POLICY_EVENTS)}")
+        item["events"] = events
+        normalized.append(item)
+    return normalized
+
+
+def compile_policy(policy: Dict) -> Dict:
+    """编译为缓存格式：每个字段合并成一个正则，并按工具名建立索引"""
+    rules = validate_rules(policy.get("rules", []))
+    compiled_rules = []
+    by_tool: Dict[str, List[int]] = {}
+    wildcard: List[int] = []
+    for index, rule in enumerate(rules):
+        compiled = {
+            "id": rule["id"],
+            "action": rule["action"],
+            "reason": rule["reason"],
+            "events": rule["events"],
+        }
+        prefixes = {}
+        for field in PATTERN_FIELDS:
+            compiled[field] = "|".join(_pattern_regex(p) for p in rule[field]) if rule[field] else None
+            field_prefixes = [_glob_prefix(p) for p in rule[field]]
+            if field_prefixes and None not in field_prefixes:
+                prefixes[field] = field_prefixes
+        # 全是通配符的字段记下各自的固定前缀，hook 判断时先比较前缀，不命中就不必编译正则
+        compiled["prefixes"] = prefixes
+        compiled_rules.append(compiled)
+
+        # 只含普通工具名（无通配符）的规则按工具名索引，其余规则对所有工具检查
+        tools = rule["tools"]
+        if tools and not any(p.startswith("re:") or any(c in p for c in "*?[") for p in tools):
+            for tool in tools:
+                by_tool.setdefault(tool, []).append(index)
+        else:
+            wildcard.append(index)
+
+    body = {"rules": compiled_rules, "by_tool": by_tool, "wildcard": wildcard}
+    # 只有监控平台编译策略时用到，hook 导入本模块时不加载 hashlib
+    import hashlib
+    return {
+        "version": CACHE_VERSION,
+        "enabled": bool(policy.get("enabled")),
+        "hash": hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:12],
+        "generated": time.time(),
+        **body,
+    }
+
+
+def write_cache(path: str, compiled: Dict):
+    """原子写入缓存文件（先写临时文件再替换），hook 不会读到写了一半的文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # patterns 是预编译的正则，只存在于内存中
+        json.dump({k: v for k, v in compiled.items() if k != "patterns"}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def prepare(compiled: Dict) -> Dict:
+    """准备正则缓存；hook 每次调用只判断一次，正则在 evaluate 中按需编译，只编译用到的规则"""
+    if "patterns" not in compiled:
+        compiled["patterns"] = [None] * len(compiled.get("rules", []))
+    return compiled
+
+
+def _rule_matches(compiled: Dict, index: int, field: str, values) -> bool:
+    """第 index 条规则的 field 是否命中 values 中任意一个值；字段未限制时为 True
+
+    正则第一次用到时才编译并缓存到 compiled["patterns"]，没有值能命中固定前缀时不编译
+    """
+    rule = compiled["rules"][index]
+    source = rule.get(field)
+    if not source:
+        return True
+    values = [v for v in values if isinstance(v, str)]
+    prefixes = rule.get("prefixes", {}).get(field)
+    if prefixes is not None:
+        values = [v for v in values if v.startswith(tuple(prefixes))]
+    if not values:
+        return False
+    patterns = compiled["patterns"][index]
+    if patterns is None:
+        patterns = compiled["patterns"][index] = {}
+    pattern = patterns.get(field)
+    if pattern is None:
+        pattern = patterns[field] = re.compile(source, re.DOTALL)
+    return any(pattern.match(v) for v in values)
+
+
+def load_cache(path: str) -> Optional[Dict]:
+    """读取缓存文件，不存在或已损坏时返回 None（正则在 evaluate 时按需编译）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            compiled = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(compiled, dict) or compiled.get("version") != CACHE_VERSION:
+        return None
+    if not isinstance(compiled.get("rules"), list):
+        return None
+    return prepare(compiled)
+
+
+def _normalize_path(path: str, cwd: str) -> str:
+    """相对路径按 cwd 补全，并去掉 . 和 ..，避免 /repo/src/../../etc/passwd 命中 */src/*"""
+    normalized = os.path.normpath(os.path.join(cwd, path) if cwd and not os.path.isabs(path) else path)
+    if os.sep != "/" and "\\" not in path and "\\" not in cwd:
+        # Windows 上保留原来的 / 分隔符，规则通配符不必写成两种形式
+        normalized = normalized.replace(os.sep, "/")
+    return normalized
+
+
+def evaluate(compiled: Optional[Dict], event_name: str, data: Dict) -> Optional[Dict]:
+    """按缓存的策略判断 hook 输入，返回 {"decision", "rule_id", "reason"}，没有命中时返回 None
+
+    deny > ask > allow。Bash 命令拆分为多段后：deny / ask 规则命中任意一段（或整条命令）即生效；
+    allow 要求每一段都命中某条 allow 规则，命令无法拆分时改为 ask，交给用户确认。
+    """
+    if not compiled or not compiled.get("enabled"):
+        return None
+    prepare(compiled)
+    tool_name = data.get("tool_name") or ""
+    tool_input = data.get("tool_input") if isinstance(data.get("tool_input"), dict) else {}
+    cwd = data.get("cwd") or ""
+    projects = (os.path.basename(cwd.rstrip("/\\")), cwd) if cwd else ()
+    paths = [_normalize_path(tool_input[key], cwd) for key in PATH_KEYS if isinstance(tool_input.get(key), str) and tool_input[key]]
+    command = tool_input.get("command")
+    segments = split_command(command) if isinstance(command, str) else None
+
+    try:
+        return _evaluate(compiled, event_name, tool_name, paths, projects, command, segments)
+    except (re.error, KeyError, TypeError, IndexError):
+        # 缓存已损坏：与读取失败一样不做决策
+        return None
+
+
+def _evaluate(compiled: Dict, event_name: str, tool_name: str, paths, projects, command, segments) -> Optional[Dict]:
+    rules = compiled.get("rules", [])
+    # by_tool 中的规则工具名与 tool_name 完全相同，不必再匹配 tools
+    exact = set(compiled.get("by_tool", {}).get(tool_name, []))
+    candidates = sorted(exact | set(compiled.get("wildcard", [])))
+    command_values = (command, *(segments or ()))
+    best = None
+    allow_rules = []
+    for index in candidates:
+        rule = rules[index]
+        if event_name not in rule["events"]:
+            continue
+        if index not in exact and not _rule_matches(compiled, index, "tools", (tool_name,)):
+            continue
+        if not _rule_matches(compiled, index, "paths", paths):
+            continue
+        if not _rule_matches(compiled, index, "projects", projects):
+            continue
+        if rule["action"] == "allow":
+            allow_rules.append(index)
+            continue
+        if not _rule_matches(compiled, index, "commands", command_values):
+            continue
+        if best is None or ACTION_PRIORITY[rule["action"]] > ACTION_PRIORITY[best["action"]]:
+            best = rule
+        if rule["action"] == "deny":
+            break
+
+    if best is not None:
+        return {"decision": best["action"], "rule_id": best["id"], "reason": best["reason"]}
+    if not allow_rules:
+        return None
+
+    def allowed_by(value) -> Optional[Dict]:
+        index = next((i for i in allow_rules if _rule_matches(compiled, i, "commands", (value,))), None)
+        return None if index is None else rules[index]
+
+    if not isinstance(command, str):
+        rule = allowed_by(command)
+    elif segments is None:
+        # 含命令替换等无法拆分的命令：原本会被允许时改为交给用户确认
+        rule = allowed_by(command)
+        if rule is not None:
+            return {"decision": "ask", "rule_id": rule["id"], "reason": "命令无法按段检查，需要确认"}
+        return None
+    else:
+        rule = None
+        for segment in segments or [command]:
+            matched = allowed_by(segment)
+            if matched is None:
+                # 有一段没有被允许即可结束，后面的段不必再编译规则
+                rule = None
+                break
+            rule = rule or matched
+    if rule is None:
+        return None
+    return {"decision": "allow", "rule_id": rule["id"], "reason": rule["reason"]}
+
+
+def hook_output(event_name: str, result: Dict) -> Optional[Dict]:
+    """转换为 hook 的输出格式；PermissionRequest 的 ask 表示交给用户，不输出"""
+    reason = result.get("reason") or f"监控平台策略 {result['rule_id']}"
+    if event_name == "PreToolUse":
+        return {"hookSpecificOutput": {
+            "hookEventName": "PreToolUse",
+            "permissionDecision": result["decision"],
+            "permissionDecisionReason": reason,
+        }}
+    if event_name == "PermissionRequest" and result["decision"] in ("allow", "deny"):
+        decision = {"behavior": result["decision"]}
+        if result["decision"] == "deny":
+            decision["message"] = reason
+        return {"hookSpecificOutput": {
+            "hookEventName": "PermissionRequest",
+            "decision": decision,
+        }}
+    return None
+
+
+class PolicyStats:
+    """自动决策统计与节省的等待时间估算
+
+    人工处理的权限请求：从 PermissionRequest 到该会话下一个事件的间隔即为等待时间；
+    每个自动处理的权限请求按最近人工等待时间的中位数估算节省的时间。
+    """
+
+    def __init__(self, max_samples: int = 200, default_wait: float = 10.0):
+        self.max_samples = max_samples
+        self.default_wait = default_wait
+        self.decisions: Dict[str, Dict[str, int]] = {}
+        self.by_rule: Dict[str, int] = {}
+        self.eval_ms_total = 0.0
+        self.eval_ms_max = 0.0
+        self.auto_permissions = 0
+        self.wait_samples: List[float] = []
+        self._pending: Dict[str, float] = {}
+
+    def observe(self, event_type: str, session_id: str, policy: Optional[Dict], timestamp: float):
+        # 上一个待人工处理的权限请求在该会话的下一个事件到来时结束
+        started = self._pending.pop(session_id, None) if session_id else None
+        if started is not None:
+            self.wait_samples.append(max(0.0, timestamp - started))
+            if len(self.wait_samples) > self.max_samples:
+                del self.wait_samples[0]
+
+        if isinstance(policy, dict) and policy.get("decision") in POLICY_ACTIONS:
+            decision = policy["decision"]
+            counts = self.decisions.setdefault(event_type, {})
+            counts[decision] = counts.get(decision, 0) + 1
+            rule_id = str(policy.get("rule_id", ""))
+            self.by_rule[rule_id] = self.by_rule.get(rule_id, 0) + 1
+            eval_ms = float(policy.get("eval_ms") or 0.0)
+            self.eval_ms_total += eval_ms
+            self.eval_ms_max = max(self.eval_ms_max, eval_ms)
+            if event_type == "PermissionRequest" and decision in ("allow", "deny"):
+                self.auto_permissions += 1
+                return
+
+        if event_type == "PermissionRequest" and session_id:
+            self._pending[session_id] = timestamp
+            if len(self._pending) > 1000:
+                # 会话结束前没有后续事件的请求不再等待
+                self._pending.pop(next(iter(self._pending)))
+
+    def median_wait(self) -> float:
+        if not self.wait_samples:
+            return self.default_wait
+        ordered = sorted(self.wait_samples)
+        return ordered[len(ordered) // 2]
+
+    def snapshot(self) -> Dict:
+        total = sum(sum(c.values()) for c in self.decisions.values())
+        median_wait = self.median_wait()
+        return {
+            "decisions": self.decisions,
+            "by_rule": self.by_rule,
+            "total": total,
+            "avg_eval_ms": round(self.eval_ms_total / total, 3) if total else 0.0,
+            "max_eval_ms": round(self.eval_ms_max, 3),
+            "auto_permissions": self.auto_permissions,
+            "manual_wait_samples": len(self.wait_samples),
+            "median_manual_wait_seconds": round(median_wait, 2),
+            "estimated_saved_seconds": round(self.auto_permissions * median_wait, 1),
+        }
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 中继转发
+本机监控平台作为中继运行时，除了保留本地看板，还会把事件压缩、批量转发到
+中心监控平台。上游不可达时事件暂存在本地 SQLite 发件箱，恢复后按顺序补发。
+"""
+
+import asyncio
+import gzip
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from logger import get_logger, fields
+
+logger = get_logger("relay")
+
+# 转发时单个字符串字段的最大长度，超出部分截断（工具输出往往很大）
+MAX_FIELD_CHARS = 2000
+# 转发时列表字段的最大长度
+MAX_LIST_ITEMS = 50
+
+
+def compact_value(value, max_chars: int = MAX_FIELD_CHARS):
+    """递归压缩事件内容：截断长字符串和长列表，去掉空值"""
+    if isinstance(value, str):
+        if len(value) > max_chars:
+            return value[:max_chars] + f"...[截断 {len(value) - max_chars} 字符]"
+        return value
+    if isinstance(value, dict):
+        return {
+            k: compact_value(v, max_chars)
+            for k, v in value.items()
+            if v is not None and v != "" and v != {} and v != []
+        }
+    if isinstance(value, list):
+        items = [compact_value(v, max_chars) for v in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"...[截断 {len(value) - MAX_LIST_ITEMS} 项]")
+        return items
+    return value
+
+
+def compact_event(event: Dict) -> Dict:
+    """生成用于转发的精简事件"""
+    compacted = compact_value(event)
+    # event_name 与 event_type 相同时无需重复传输
+    if compacted.get("event_name") == compacted.get("event_type"):
+        compacted.pop("event_name", None)
+    return compacted
+
+
+def encode_batch(relay_id: str, epoch: str, events: List[Dict]) -> bytes:
+    """将一批事件编码为 gzip 压缩的 JSON"""
+    payload = {"relay_id": relay_id, "epoch": epoch, "events": events}
+    return gzip.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+
+def decode_batch(body: bytes, content_encoding: str = "") -> Dict:
+    """解码中继批次（支持 gzip 或未压缩的 JSON）"""
+    if "gzip" in (content_encoding or "").lower():
+        body = gzip.decompress(body)
+    return json.loads(body.decode("utf-8"))
+
+
+class RelayOutbox:
+    """本地发件箱：SQLite 持久化的待转发队列"""
+
+    def __init__(self, path: Path, max_rows: int = 100000):
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox (seq INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        # epoch 标识这个发件箱的生命周期，发件箱重建后 seq 会从头开始，
+        # 中心端按 (relay_id, epoch) 记录已确认的 seq 来去重
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'epoch'").fetchone()
+        if row:
+            self.epoch = row[0]
+        else:
+            self.epoch = uuid.uuid4().hex
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('epoch', ?)", (self.epoch,))
+        # 行数在写入和确认时维护，size() 不查询数据库（/metrics 在事件循环中读取）
+        self._size = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def put_many(self, events: List[Dict]) -> int:
+        """批量写入待转发事件，超出容量时丢弃最旧的事件，返回丢弃数量"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO outbox (body) VALUES (?)",
+                [(json.dumps(e, ensure_ascii=False),) for e in events],
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+            dropped = max(0, count - self.max_rows)
+            if dropped:
+                self._conn.execute(
+                    "DELETE FROM outbox WHERE seq IN (SELECT seq FROM outbox ORDER BY seq LIMIT ?)",
+                    (dropped,),
+                )
+            self._conn.execute("COMMIT")
+            self._size = count - dropped
+        return dropped
+
+    def peek(self, limit: int) -> List[Dict]:
+        """按顺序取出最早的一批事件（不删除），每个事件带上 relay_seq"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, body FROM outbox ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        events = []
+        for seq, body in rows:
+            event = json.loads(body)
+            event["relay_seq"] = seq
+            events.append(event)
+        return events
+
+    def ack(self, seq: int):
+        """上游确认后删除 seq 及之前的事件"""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM outbox WHERE seq <= ?", (seq,)).rowcount
+            self._size = max(0, self._size - deleted)
+
+    def size(self) -> int:
+        """发件箱中待转发的事件数"""
+        return self._size
+
+
+class RelayForwarder:
+    """将本地事件批量、压缩后转发到中心监控平台"""
+
+    def __init__(self, upstream_url: str, relay_id: str, outbox_path: Path,
+                 batch_size: int = 200, flush_interval: float = 1.0,
+                 max_backoff: float = 30.0):
+        self.upstream_url = upstream_url.rstrip("/") + "/api/relay/batch"
+        self.relay_id = relay_id
+        self.outbox = RelayOutbox(outbox_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._pending: List[Dict] = []
+        self._backoff = 0.0
+        self.stats = {
+            "forwarded": 0,
+            "dropped": 0,
+            "failures": 0,
+            "last_error": None,
+        }
+
+    def enqueue(self, event: Dict):
+        """事件进入待转发缓冲（O(1)，不做 IO）"""
+        self._pending.append(compact_event(event))
+
+    def pending_count(self) -> int:
+        """尚未被上游确认的事件数：内存缓冲加上发件箱"""
+        return len(self._pending) + self.outbox.size()
+
+    def status(self) -> Dict:
+        return {
+            "upstream": self.upstream_url,
+            "relay_id": self.relay_id,
+            "epoch": self.outbox.epoch,
+            "pending": self.pending_count(),
+            "outbox": self.outbox.size(),
+            "backoff": self._backoff,
+            **self.stats,
+        }
+
+    async def _spool_pending(self):
+        """把内存缓冲写入发件箱"""
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        dropped = await asyncio.to_thread(self.outbox.put_many, events)
+        if dropped:
+            self.stats["dropped"] += dropped
+            logger.warning("发件箱已满，丢弃最旧的事件", extra=fields(dropped=dropped))
+
+    async def _send_batches(self, client: httpx.AsyncClient) -> bool:
+        """发送发件箱中的事件，全部成功返回 True"""
+        while True:
+            events = await asyncio.to_thread(self.outbox.peek, self.batch_size)
+            if not events:
+                return True
+
+            body = encode_batch(self.relay_id, self.outbox.epoch, events)
+            try:
+                response = await client.post(
+                    self.upstream_url,
+                    content=body,
+                    headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+                )
+                response.raise_for_status()
+            except Exception as e:
+                self.stats["failures"] += 1
+                self.stats["last_error"] = str(e)
+                return False
+
+            await asyncio.to_thread(self.outbox.ack, events[-1]["relay_seq"])
+            self.stats["forwarded"] += len(events)
+            self.stats["last_error"] = None
+
+    async def run(self):
+        """后台转发循环"""
+        next_attempt = 0.0
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    # 退避期间也按间隔把内存缓冲写入发件箱，进程退出时不会丢失
+                    await self._spool_pending()
+                    if time.monotonic() < next_attempt:
+                        continue
+                    if await self._send_batches(client):
+                        self._backoff = 0.0
+                    else:
+                        # 上游不可达：指数退避，事件留在发件箱中
+                        self._backoff = min(self.max_backoff, max(1.0, self._backoff * 2))
+                        next_attempt = time.monotonic() + self._backoff
+                except Exception as e:
+                    logger.error("转发出错", extra=fields(error=str(e)))
+
+
+class RelayCursors:
+    """中心端：记录每个中继已接收的最大 relay_seq，丢弃重发的事件"""
+
+    def __init__(self):
+        self._cursors: Dict[str, int] = {}
+        self.relays: Dict[str, Dict] = {}
+
+    def filter_new(self, relay_id: str, epoch: str, events: List[Dict]) -> List[Dict]:
+        key = f"{relay_id}:{epoch}"
+        cursor = self._cursors.get(key, 0)
+        fresh = [e for e in events if e.get("relay_seq", 0) > cursor]
+        if events:
+            self._cursors[key] = max(cursor, max(e.get("relay_seq", 0) for e in events))
+        return fresh
+
+    def touch(self, relay_id: str, received: int, accepted: int, last_seen: Optional[str]):
+        info = self.relays.setdefault(relay_id, {"received": 0, "accepted": 0})
+        info["received"] += received
+        info["accepted"] += accepted
+        info["last_seen"] = last_seen
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 事件全文检索
+在 add_event 时增量维护倒排索引，覆盖命令、文件路径、提示词、通知内容、
+项目名和工具名。文档数和倒排条目总数都有上限，超出后按先进先出淘汰最旧的事件，
+每个事件的索引与淘汰成本只取决于它的词数（有上限），因此摊还为常数时间。
+"""
+
+import math
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 英文/数字/下划线词，或单个 CJK 字符（CJK 连续文本再组合成二元组）
+_TOKEN_RE = re.compile(r"[a-z0-9_]+|[一-鿿]")
+_CJK_RE = re.compile(r"[一-鿿]")
+
+MAX_TOKEN_CHARS = 64
+MAX_TOKENS_PER_DOC = 128
+SNIPPET_CHARS = 200
+
+# (字段路径, 权重)：路径在事件的 data 中查找，session.* 在会话信息中查找
+SEARCH_FIELDS = (
+    (("tool_input", "command"), 3.0),
+    (("tool_input", "file_path"), 3.0),
+    (("tool_input", "path"), 2.0),
+    (("tool_input", "notebook_path"), 2.0),
+    (("tool_input", "pattern"), 2.0),
+    (("tool_input", "url"), 1.5),
+    (("tool_input", "description"), 1.0),
+    (("prompt",), 2.0),
+    (("message",), 2.0),
+    (("tool_name",), 1.0),
+    (("session", "project_name"), 1.0),
+)
+
+
+def tokenize(text: str, query: bool = False) -> List[str]:
+    """小写分词
+
+    连续的 CJK 字符：建索引时同时生成单字和相邻二元组；
+    查询时长度不少于 2 的连续段只用二元组，单个字用单字，以便按 AND 匹配。
+    """
+    tokens: List[str] = []
+    run: List[str] = []
+
+    def flush_run():
+        if not run:
+            return
+        bigrams = [a + b for a, b in zip(run, run[1:])]
+        if query:
+            tokens.extend(bigrams or run)
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+        run.clear()
+
+    previous_end = -1
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        if _CJK_RE.fullmatch(token):
+            if match.start() != previous_end:
+                flush_run()
+            run.append(token)
+        else:
+            flush_run()
+            tokens.append(token[:MAX_TOKEN_CHARS])
+        previous_end = match.end()
+    flush_run()
+    return tokens
+
+
+def _field_value(event: Dict, path: Tuple[str, ...]):
+    if path[0] == "session":
+        value = event.get("session", {})
+        path = path[1:]
+    else:
+        value = event.get("data", {})
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, str) and value else None
+
+
+def parse_since(since: str) -> Optional[float]:
+    """since 支持 Unix 时间戳或 ISO 时间"""
+    if not since:
+        return None
+    try:
+        return float(since)
+    except ValueError:
+        return datetime.fromisoformat(since).timestamp()
+
+
+class SearchIndex:
+    """有内存上限的增量倒排索引"""
+
+    def __init__(self, max_docs: int = 20000, max_postings: int = 1_000_000):
+        self.max_docs = max_docs
+        self.max_postings = max_postings
+        # doc_id -> (词频权重, 结果摘要)
+        self.docs: "OrderedDict[int, Tuple[Dict[str, float], Dict]]" = OrderedDict()
+        # 词 -> {doc_id: 权重}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.total_postings = 0
+
+    def add(self, doc_id: int, event: Dict, timestamp: float):
+        weights: Dict[str, float] = {}
+        snippet = ""
+        for path, weight in SEARCH_FIELDS:
+            value = _field_value(event, path)
+            if value is None:
+                continue
+            if not snippet and path[0] != "tool_name":
+                snippet = value[:SNIPPET_CHARS]
+            for token in tokenize(value[:4096]):
+                if token in weights or len(weights) < MAX_TOKENS_PER_DOC:
+                    weights[token] = weights.get(token, 0.0) + weight
+        if not weights:
+            return
+
+        session = event.get("session", {})
+        data = event.get("data", {})
+        summary = {
+            "seq": doc_id,
+            "id": event.get("id"),
+            "timestamp": event.get("timestamp"),
+            "time": timestamp,
+            "event_type": event.get("event_type", ""),
+            "session_id": session.get("session_id", ""),
+            "project": session.get("project_name", ""),
+            "tool_name": data.get("tool_name", ""),
+            "snippet": snippet,
+        }
+
+        self.docs[doc_id] = (weights, summary)
+        for token, weight in weights.items():
+            self.postings.setdefault(token, {})[doc_id] = weight
+        self.total_postings += len(weights)
+
+        while self.docs and (len(self.docs) > self.max_docs or self.total_postings > self.max_postings):
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        doc_id, (weights, _) = self.docs.popitem(last=False)
+        for token in weights:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[token]
+        self.total_postings -= len(weights)
+
+    def search(self, query: str, session: str = "", event_type: str = "",
+               since: Optional[float] = None, limit: int = 20, offset: int = 0) -> Dict:
+        """AND 语义检索，按 tf-idf 得分排序，得分相同时新的在前"""
+        tokens = list(dict.fromkeys(tokenize(query, query=True)))
+        if not tokens:
+            return {"total": 0, "results": []}
+
+        postings = [self.postings.get(token) for token in tokens]
+        if any(p is None for p in postings):
+            return {"total": 0, "results": []}
+
+        # 从最短的倒排表开始求交集
+        order = sorted(range(len(tokens)), key=lambda i: len(postings[i]))
+        doc_count = len(self.docs)
+        idf = [math.log(1 + doc_count / len(p)) for p in postings]
+
+        scored: List[Tuple[float, int]] = []
+        for doc_id in postings[order[0]]:
+            if not all(doc_id in postings[i] for i in order[1:]):
+                continue
+            summary = self.docs[doc_id][1]
+            if session and summary["session_id"] != session:
+                continue
+            if event_type and summary["event_type"] != event_type:
+                continue
+            if since is not None and summary["time"] < since:
+                continue
+            score = sum(postings[i][doc_id] * idf[i] for i in range(len(tokens)))
+            scored.append((score, doc_id))
+
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        page = scored[offset:offset + limit]
+        return {
+            "total": len(scored),
+            "results": [
+                {**self.docs[doc_id][1], "score": round(score, 3)}
+                for score, doc_id in page
+            ],
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "docs": len(self.docs),
+            "terms": len(self.postings),
+            "postings": self.total_postings,
+            "max_docs": self.max_docs,
+            "max_postings": self.max_postings,
+        }
@@ -4,25 +4,47 @@ Claude Code 监控平台 - 后端服务
 基于 FastAPI + WebSocket 实现实时监控
 """
 
+import argparse
 import asyncio
 import json
 import os
-from datetime import datetime
-from typing import Dict, List, Set
+import socket
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from pathlib import Path
 import time
 import hmac
 import hashlib
 import base64
+import bisect
 import urllib.parse
+import uuid
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import httpx
 
+from shared_state import EventStore
+from relay import RelayForwarder, RelayCursors, decode_batch
+from metrics import MetricsRegistry, OPENMETRICS_CONTENT_TYPE, PROMETHEUS_CONTENT_TYPE
+from logger import get_logger, fields
+from perf import PerfRecorder
+from activity import ActivityTracker, ACTIVITY_WINDOWS
+from search import SearchIndex, parse_since
+from traces import TraceStore
+from usage import UsageTracker, UsageTotals, TRANSCRIPT_EVENTS, BASELINE_EVENTS
+from todos import TodoBoard, GLOBAL_TODOS
+from pipeline import Pipeline, Stage, ShedPolicy
+from policy import PolicyStats, compile_policy, validate_rules, write_cache, evaluate
+from topk import SpaceSaving, TopKStore, project_scope, session_scope
+from detector import AgentDetector, ALERT_EVENT, ALERT_COOLDOWN
+from connections import ConnectionStats
+from dedup import DedupWindow, uuid7
+from export import EXPORT_FORMATS, columnar_available, encode_events, iter_events, parse_omit
+from assets import AssetManifest
+
 # 配置
 BASE_DIR = Path(__file__).parent
 HOOKS_LOG_FILE = BASE_DIR.parent / "hooks_log.txt"
@@ -30,6 +52,75 @@ STATIC_DIR = BASE_DIR / "static"
 TEMPLATES_DIR = BASE_DIR / "templates"
 CONFIG_FILE = BASE_DIR / "config.json"
 
+# 多 worker 模式：worker 数量与共享事件日志路径（由启动参数写入环境变量，worker 子进程继承）
+WORKERS = int(os.environ.get("MONITOR_WORKERS", "1"))
+STATE_DB_FILE = Path(os.environ.get("MONITOR_STATE_DB", str(BASE_DIR / "events.db")))
+SHARED_LOG_POLL_INTERVAL = 0.02  # 共享日志轮询间隔（秒）
+
+# 热路径耗时分析（/api/debug/perf），MONITOR_PERF=1 时启用
+PERF_ENABLED = os.environ.get("MONITOR_PERF", "") == "1"
+
+# 本地权限策略缓存：hook 脚本直接读取该文件做判断（默认放在 claude_hooks.py 所在目录）
+POLICY_CACHE_FILE = Path(os.environ.get("MONITOR_POLICY_CACHE", str(BASE_DIR.parent / "policy_cache.json")))
+
+# 事件持久化（单 worker 模式写入 STATE_DB_FILE，MONITOR_PERSIST=0 关闭）与保留条数。
+# 默认只保留最近 5 万条，足够导出和补录时跳过已上报的区间，需要更长的历史时调大
+PERSIST_ENABLED = os.environ.get("MONITOR_PERSIST", "1") != "0"
+STORE_MAX_EVENTS = int(os.environ.get("MONITOR_STORE_MAX_EVENTS", "50000"))
+STORE_TRIM_INTERVAL = 1000  # 每写入多少条检查一次保留条数
+
+# 处理管线：入口队列容量、通知并发数与削峰策略（阈值为入口队列的填充率）
+INGEST_QUEUE_SIZE = int(os.environ.get("MONITOR_INGEST_QUEUE", "10000"))
+NOTIFY_CONCURRENCY = int(os.environ.get("MONITOR_NOTIFY_CONCURRENCY", "4"))
+SHED_ENABLED = os.environ.get("MONITOR_SHED", "1") != "0"
+SHED_SOFT = float(os.environ.get("MONITOR_SHED_SOFT", "0.5"))
+SHED_HARD = float(os.environ.get("MONITOR_SHED_HARD", "0.9"))
+SHED_LOW_PRIORITY = os.environ.get("MONITOR_SHED_LOW", "PreToolUse,PostToolUse").split(",")
+SHED_HIGH_PRIORITY = os.environ.get(
+    "MONITOR_SHED_HIGH", "PermissionRequest,Notification,Stop,SubagentStop,SessionStart,SessionEnd,AgentAlert"
+).split(",")
+
+# 失控会话检测（循环、频率突增、卡住），MONITOR_DETECTOR=0 关闭；卡住检查的间隔（秒）
+DETECTOR_ENABLED = os.environ.get("MONITOR_DETECTOR", "1") != "0"
+DETECTOR_CHECK_INTERVAL = 30
+ALERT_CLAIM_PREFIX = "alert:"  # 多 worker 模式下告警登记在共享日志 meta 中的键前缀
+
+# 工具与事件类型的 Top-K 计数：全局计数器数、每个项目 / 会话的计数器数与范围数上限
+TOPK_CAPACITY = int(os.environ.get("MONITOR_TOPK_CAPACITY", "200"))
+TOPK_SCOPE_CAPACITY = int(os.environ.get("MONITOR_TOPK_SCOPE_CAPACITY", "32"))
+TOPK_MAX_SCOPES = int(os.environ.get("MONITOR_TOPK_MAX_SCOPES", "1000"))
+TOOLS_TOP_LIMIT = 20  # 快照中附带的工具排行条数
+# 统计信息（含工具排行）推送给看板的最短间隔（秒），看板不再自行计数
+STATS_BROADCAST_INTERVAL = float(os.environ.get("MONITOR_STATS_INTERVAL", "1"))
+
+# 事件去重：按 event_id 丢弃该时间窗口（秒）内重复到达的事件，最多记录的 id 数
+DEDUP_WINDOW_SECONDS = float(os.environ.get("MONITOR_DEDUP_WINDOW", "600"))
+DEDUP_MAX_IDS = int(os.environ.get("MONITOR_DEDUP_MAX_IDS", "100000"))
+
+# 看板连接心跳：连接空闲多久后发送心跳、等待回应的时间、单次发送的最长时间（秒）
+# 空闲时间 + 等待时间需大于旧版看板自行发送 ping 的间隔（30 秒）
+WS_IDLE_TIMEOUT = float(os.environ.get("MONITOR_WS_IDLE_TIMEOUT", "20"))
+WS_PONG_TIMEOUT = float(os.environ.get("MONITOR_WS_PONG_TIMEOUT", "15"))
+WS_SEND_TIMEOUT = float(os.environ.get("MONITOR_WS_SEND_TIMEOUT", "5"))
+WS_SEND_QUEUE = int(os.environ.get("MONITOR_WS_SEND_QUEUE", "1000"))  # 每个连接最多排队的消息数
+WS_HEARTBEAT_CHECK_INTERVAL = 5
+# 内容已包含在状态快照中的广播消息：连接的发送队列满时可以丢弃，之后补发一次状态
+SNAPSHOT_MESSAGE_TYPES = ("event", "usage", "sessions", "todo_diff", "stats")
+# 整体替换的状态消息：队列中还有同类消息未发送时只保留最新的一条
+COALESCED_MESSAGE_TYPES = ("usage", "sessions", "stats")
+
+# 历史回填：回填事件只在入口队列填充率低于该值时入队，不挤占实时事件
+BACKFILL_QUEUE_LIMIT = 0.25
+# 回填事件与实时事件时间范围的容差（秒），会话记录与 hook 的时间略有先后
+LIVE_SPAN_MARGIN = 10.0
+LIVE_SPAN_SESSIONS = 10000  # 内存中记录实时事件时间范围的会话数上限
+
+# 中继模式：设置上游地址后，本机事件会批量转发到中心监控平台
+RELAY_OUTBOX_FILE = Path(os.environ.get("MONITOR_RELAY_OUTBOX", str(BASE_DIR / "relay_outbox.db")))
+
+logger = get_logger()
+perf = PerfRecorder(enabled=PERF_ENABLED)
+
 app = FastAPI(title="Claude Code Monitor", version="1.0.0")
 
 # CORS 配置
@@ -41,59 +132,388 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 静态文件
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+
+async def perf_timing_middleware(request: Request, call_next):
+    """请求耗时中间件：按路由模板记录整个请求的处理时间"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    perf.record(f"request {getattr(route, 'path', 'other')}", time.perf_counter() - started)
+    return response
+
+
+def enable_perf():
+    """启用耗时分析：记录各阶段耗时并挂载请求耗时中间件"""
+    perf.enabled = True
+    app.middleware("http")(perf_timing_middleware)
+
+
+if PERF_ENABLED:
+    enable_perf()
+
+# 静态文件：启动时计算指纹并预压缩，看板页面中的资源地址改写为带指纹的地址
+assets = AssetManifest(STATIC_DIR).build()
+dashboard_page = assets.page(TEMPLATES_DIR / "dashboard.html")
+
+
+def asset_response(request: Request, asset, immutable: bool = False) -> Response:
+    status_code, headers, body = asset.respond(request.headers, immutable)
+    media_type = asset.media_type if status_code in (200, 206) else None
+    return Response(content=body, status_code=status_code, headers=headers, media_type=media_type)
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def get_static(path: str, request: Request):
+    """静态资源：带指纹的地址长期缓存，原始地址按 ETag 确认"""
+    asset, immutable = assets.lookup(path)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset_response(request, asset, immutable)
+
+# 内部指标（/metrics），多 worker 模式下每个 worker 各自统计
+metrics = MetricsRegistry()
+ingested_counter = metrics.counter(
+    "monitor_events_ingested_total", "本进程接收的事件数", ["source"])
+events_counter = metrics.counter(
+    "monitor_events_total", "按事件类型、项目和主机统计的事件数",
+    ["event_type", "project", "host"], max_series=500)
+tool_events_counter = metrics.counter(
+    "monitor_tool_events_total", "按工具、项目和主机统计的工具事件数",
+    ["tool", "project", "host"], max_series=500)
+ingest_latency = metrics.histogram(
+    "monitor_ingest_latency_seconds", "事件接收接口的处理耗时", ["endpoint"])
+broadcast_duration = metrics.histogram(
+    "monitor_broadcast_duration_seconds", "单次 WebSocket 广播耗时", ["message_type"])
+dingtalk_failures = metrics.counter(
+    "monitor_dingtalk_failures_total", "钉钉推送失败次数", ["reason"])
+stage_duration = metrics.histogram(
+    "monitor_stage_duration_seconds", "处理管线各阶段单个批次的耗时", ["stage"])
+stage_outcomes = metrics.counter(
+    "monitor_stage_items_total", "处理管线各阶段处理的条目数", ["stage", "outcome"])
+shed_counter = metrics.counter(
+    "monitor_events_shed_total", "削峰精简或丢弃的事件数", ["event_type", "action"])
+duplicate_counter = metrics.counter(
+    "monitor_events_duplicate_total", "按 event_id 去重丢弃的事件数", ["stage"])
+ws_reaped_counter = metrics.counter(
+    "monitor_ws_reaped_total", "服务端主动清理的看板连接数", ["reason"])
+ws_resync_counter = metrics.counter(
+    "monitor_ws_resync_total", "发送队列已满、改为补发状态的次数")
+ws_lag = metrics.histogram(
+    "monitor_ws_heartbeat_lag_seconds", "看板连接心跳的往返时间")
+alert_counter = metrics.counter(
+    "monitor_agent_alerts_total", "失控会话检测发出的告警数", ["kind"])
+metrics.gauge("monitor_stage_queue_depth", "处理管线各阶段的队列积压",
+              lambda: {(name, ): stage.depth() for name, stage in pipeline.stages.items()},
+              labelnames=["stage"])
+metrics.gauge("monitor_stage_in_flight", "处理管线各阶段正在处理的条目数",
+              lambda: {(name, ): stage.in_flight for name, stage in pipeline.stages.items()},
+              labelnames=["stage"])
+metrics.gauge("monitor_stage_concurrency", "处理管线各阶段的并发数",
+              lambda: {(name, ): stage.concurrency for name, stage in pipeline.stages.items()},
+              labelnames=["stage"])
+metrics.gauge("monitor_active_connections", "当前 WebSocket 连接数",
+              lambda: len(manager.active_connections))
+metrics.gauge("monitor_history_size", "内存中的历史事件数",
+              lambda: len(manager.event_history))
+metrics.gauge("monitor_sessions", "当前活跃会话数",
+              lambda: len(manager.sessions))
+metrics.gauge("monitor_relay_pending", "中继尚未被上游确认的事件数（内存缓冲和发件箱）",
+              lambda: relay.pending_count() if relay is not None else 0)
+
+
+def event_time(event: Dict) -> float:
+    """事件发生时间（Unix 时间戳），无法解析时使用当前时间"""
+    try:
+        return datetime.fromisoformat(event["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def is_live_event(event: Dict) -> bool:
+    """是否为 hook 实时上报的会话事件（不是回填的历史事件，也不是服务端生成的告警）"""
+    return (bool((event.get("session") or {}).get("session_id"))
+            and not event.get("backfill") and event.get("event_type") != ALERT_EVENT)
+
+
+def live_spans_of(records: List[tuple]) -> Dict[str, tuple]:
+    """一批记录中各会话实时事件的时间范围"""
+    spans: Dict[str, tuple] = {}
+    for kind, body in records:
+        if kind != "event" or not is_live_event(body):
+            continue
+        session_id = body["session"]["session_id"]
+        timestamp = event_time(body)
+        first, last = spans.get(session_id, (timestamp, timestamp))
+        spans[session_id] = (min(first, timestamp), max(last, timestamp))
+    return spans
+
+
+def utc_now() -> str:
+    """当前时间，带时区的 UTC ISO 字符串（事件时间的统一格式）"""
+    return datetime.now(timezone.utc).isoformat()
+
+
+def normalize_timestamp(value) -> Optional[str]:
+    """把事件时间统一为带时区的 UTC ISO 字符串，无法解析时返回 None
+
+    旧版 hook 发送不带时区的本地时间，按本机时区解释。
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+def encode_message(message: Dict) -> str:
+    """将消息编码为 JSON 文本（与 send_json 的编码方式一致）"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
 
 
 class ConnectionManager:
     """WebSocket 连接管理器"""
 
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        # 看板连接及其统计（发送量、心跳延迟等）
+        self.active_connections: Dict[WebSocket, ConnectionStats] = {}
+        self.connection_count = 0
         self.event_history: List[Dict] = []
         self.max_history = 1000
-        self.todos: List[Dict] = []
+        self.todos = TodoBoard()  # 每个会话的任务列表
         self.sessions: Dict[str, Dict] = {}  # 会话信息存储
         self.stats = {
             "total_events": 0,
             "session_start_time": None,
-            "events_by_type": {},
-            "tools_used": {},
         }
+        # 事件类型和工具使用次数（有界 Top-K，工具按项目和会话分别统计）
+        self.event_types = SpaceSaving(TOPK_CAPACITY)
+        self.tool_usage = TopKStore(TOPK_CAPACITY, TOPK_SCOPE_CAPACITY, TOPK_MAX_SCOPES)
         # 会话超时时间（秒）- 30分钟没有活动就标记为非活跃
         self.session_timeout = 1800
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.add(websocket)
-        # 发送历史数据和当前状态
-        await websocket.send_json({
+        # 事件序号：每个事件带递增的 seq，看板断线重连时据此只补发缺失的事件。
+        # epoch 标识序号空间，服务重启后 epoch 改变，旧的 seq 不再有效
+        self.seq = 0
+        self.epoch = uuid.uuid4().hex
+        # 缺失事件超过该数量时不再补发，改为发送完整快照
+        self.resume_max_gap = 500
+
+        # 多分辨率活动时间线（1m / 1h / 24h）
+        self.activity = ActivityTracker()
+        # 全文检索索引（有内存上限）
+        self.search_index = SearchIndex()
+        # 每个会话的链路追踪（turn / tool / subagent / compaction span）
+        self.traces = TraceStore()
+        # token 用量与费用（增量读取会话记录）
+        self.usage = UsageTracker()
+        # 权限策略的自动决策统计
+        self.policy_stats = PolicyStats()
+        # 失控会话检测
+        self.detector = AgentDetector(enabled=DETECTOR_ENABLED)
+        # 本次运行中各会话通过 hook 实时收到的事件时间范围 [first, last]（持久化到事件存储的 live_spans）
+        self.live_spans: Dict[str, List[float]] = {}
+
+        # 状态版本号：状态每次变化都会递增，快照缓存按版本号失效
+        self.version = 0
+        self._snapshot_cache: Dict[str, tuple] = {}
+
+    def _cached(self, name: str, build) -> str:
+        """按状态版本号缓存编码后的快照，状态未变化时所有连接复用同一份文本"""
+        cached = self._snapshot_cache.get(name)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        text = encode_message(build())
+        self._snapshot_cache[name] = (self.version, text)
+        return text
+
+    def stats_snapshot(self) -> Dict:
+        """统计信息：tools_top 已按次数排好序，tools_used / events_by_type 只含 Top-K 中的键"""
+        tools_top = self.tool_usage.global_counts.top(TOOLS_TOP_LIMIT)
+        return {
+            **self.stats,
+            "events_by_type": self.event_types.as_dict(),
+            "tools_used": {item["name"]: item["count"] for item in tools_top},
+            "tools_top": tools_top,
+        }
+
+    def init_snapshot(self) -> str:
+        """完整快照：最近的历史事件和当前状态"""
+        return self._cached("init", lambda: {
             "type": "init",
             "data": {
                 "history": self.event_history[-100:],
-                "stats": self.stats,
-                "todos": self.todos,
-                "sessions": self.sessions  # 发送会话信息
+                "stats": self.stats_snapshot(),
+                "todos": self.todos.snapshot(),
+                "sessions": self.sessions,  # 发送会话信息
+                "usage": self.usage.summary(),
+                "seq": self.seq,
+                "epoch": self.epoch,
             }
         })
 
+    def state_snapshot(self) -> str:
+        """状态快照（不含历史事件），用于断线续传"""
+        return self._cached("state", lambda: {
+            "type": "state",
+            "data": {
+                "stats": self.stats_snapshot(),
+                "todos": self.todos.snapshot(),
+                "sessions": self.sessions,
+                "usage": self.usage.summary(),
+                "seq": self.seq,
+                "epoch": self.epoch,
+            }
+        })
+
+    def events_since(self, since: int, max_gap: Optional[int] = None) -> Optional[List[Dict]]:
+        """返回 seq 大于 since 的历史事件；缺口过大或已不在历史中时返回 None"""
+        max_gap = self.resume_max_gap if max_gap is None else max_gap
+        if since > self.seq or self.seq - since > max_gap:
+            return None
+        if since == self.seq:
+            return []
+        if not self.event_history or self.event_history[0].get("seq", 0) > since + 1:
+            return None
+        start = bisect.bisect_right(self.event_history, since, key=lambda e: e.get("seq", 0))
+        return self.event_history[start:]
+
+    async def connect(self, websocket: WebSocket, since: Optional[int] = None, epoch: str = ""):
+        await websocket.accept()
+        self.connection_count += 1
+        client = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else ""
+        stats = self.active_connections[websocket] = ConnectionStats(self.connection_count, client, WS_SEND_QUEUE)
+        stats.writer = asyncio.create_task(self._write(websocket, stats))
+
+        # 断线重连：同一 epoch 且缺口不大时，只补发缺失的事件；否则发送历史数据和当前状态
+        for text in self.catch_up(since if epoch == self.epoch else None):
+            await self.send(websocket, text, seq=self.seq)
+
+    def catch_up(self, since: Optional[int], max_gap: Optional[int] = None) -> List[str]:
+        """让客户端追上当前状态的消息：缺口不大时为状态快照和 seq 之后的事件，否则为完整快照"""
+        missed = self.events_since(since, max_gap) if since is not None else None
+        if missed is None:
+            return [self.init_snapshot()]
+        return [self.state_snapshot(), encode_message({
+            "type": "resume",
+            "data": {"events": missed, "seq": self.seq}
+        })]
+
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
+        stats = self.active_connections.pop(websocket, None)
+        if stats is not None and stats.writer is not None:
+            stats.writer.cancel()
+
+    async def send(self, websocket: WebSocket, text: str, size: Optional[int] = None,
+                   seq: Optional[int] = None, message_type: str = "") -> bool:
+        """放入连接的发送队列后立即返回，连接已移除时返回 False
+
+        内容已包含在状态快照中的消息（事件、会话、用量等）在队列满（对端读取跟不上）时被丢弃，
+        改为补发一次状态和缺失的事件，不断开连接；失效的连接由心跳超时清理。
+        """
+        stats = self.active_connections.get(websocket)
+        if stats is None:
+            return False
+        size = size if size is not None else len(text.encode("utf-8"))
+        coalesce = message_type if message_type in COALESCED_MESSAGE_TYPES else ""
+        if stats.enqueue(text, size, seq, message_type in SNAPSHOT_MESSAGE_TYPES, coalesce):
+            ws_resync_counter.inc()
+        return True
+
+    async def _write(self, websocket: WebSocket, stats: ConnectionStats):
+        """连接的发送任务：按顺序发送队列中的消息，单次发送超时或出错时清理该连接"""
+        while True:
+            item = await stats.queue.get()
+            stats.dequeued(item)
+            text, size, seq = item[0], item[1], item[2]
+            if text is None:
+                # 补发：在同一时刻生成状态快照和缺失的事件，之后入队的消息都比它新
+                seq = self.seq
+                # 发送队列积压的事件都还在内存历史中，缺口不受断线续传的上限限制
+                items = [(text, len(text.encode("utf-8")))
+                         for text in self.catch_up(stats.last_seq, self.max_history)]
+            else:
+                items = [(text, size)]
+            for text, size in items:
+                try:
+                    await asyncio.wait_for(websocket.send_text(text), WS_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    stats.send_timeouts += 1
+                    self.reap(websocket, "send_timeout")
+                    return
+                except Exception:
+                    self.reap(websocket, "send_error")
+                    return
+                stats.sent(size)
+            if seq is not None:
+                stats.last_seq = seq
+
+    def reap(self, websocket: WebSocket, reason: str):
+        """移除失效的连接，停止其发送任务并在后台关闭"""
+        stats = self.active_connections.pop(websocket, None)
+        if stats is None:
+            return
+        ws_reaped_counter.inc(reason)
+        logger.info("清理看板连接", extra=fields(connection=stats.id, client=stats.client, reason=reason))
+        if stats.writer is not None and stats.writer is not asyncio.current_task():
+            stats.writer.cancel()
+        asyncio.create_task(self._close(websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1001), 1.0)
+        except Exception:
+            pass
+
+    def received(self, websocket: WebSocket, message: Dict):
+        """记录收到的客户端消息（心跳回应时记录往返时间）"""
+        stats = self.active_connections.get(websocket)
+        if stats is not None:
+            lag = stats.received(message, time.time())
+            if lag is not None:
+                ws_lag.observe(lag)
+
+    async def heartbeat(self):
+        """向空闲的连接发送心跳，清理心跳超时未回应的连接"""
+        now = time.time()
+        for websocket, stats in list(self.active_connections.items()):
+            if stats.ping_sent_at is not None:
+                if now - stats.ping_sent_at > WS_PONG_TIMEOUT:
+                    self.reap(websocket, "pong_timeout")
+            elif now - stats.last_received >= WS_IDLE_TIMEOUT:
+                await self.send(websocket, encode_message(stats.start_ping(now)))
+
+    def connection_stats(self) -> List[Dict]:
+        now = time.time()
+        return [stats.snapshot(now) for stats in self.active_connections.values()]
 
     async def broadcast(self, message: Dict):
         """广播消息到所有连接"""
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                disconnected.add(connection)
-
-        for conn in disconnected:
-            self.active_connections.discard(conn)
+        started = time.perf_counter()
+        # 只编码一次，所有连接发送同一份文本
+        text = encode_message(message)
+        size = len(text.encode("utf-8"))
+        message_type = message.get("type", "")
+        seq = message["data"].get("seq") if message_type == "event" else None
+        # 只放入各连接的发送队列，不等待发送完成；入队过程中可能有连接被清理，遍历副本
+        for connection in list(self.active_connections):
+            await self.send(connection, text, size, seq, message_type)
+
+        broadcast_duration.observe(time.perf_counter() - started, message.get("type", ""))
 
     def add_event(self, event: Dict):
         """添加事件到历史"""
+        # 多 worker 模式下 seq 由共享日志分配；单 worker 模式在状态阶段按处理顺序在这里分配，
+        # 入队时等待的高优先级事件可能晚于后到的事件入队，不能在入口分配
+        if event.get("seq") is None:
+            self.seq += 1
+            event["seq"] = self.seq
+        else:
+            self.seq = event["seq"]
+        self.version += 1
+
         self.event_history.append(event)
         if len(self.event_history) > self.max_history:
             self.event_history = self.event_history[-self.max_history:]
@@ -101,49 +521,78 @@ class ConnectionManager:
         # 更新统计
         self.stats["total_events"] += 1
         event_type = event.get("event_type", "unknown")
-        self.stats["events_by_type"][event_type] = self.stats["events_by_type"].get(event_type, 0) + 1
+        self.event_types.add(event_type)
+        timestamp = event_time(event)
+        self.activity.add(timestamp)
+        self.search_index.add(event["seq"], event, timestamp)
+        self.traces.add(event, timestamp)
+        session_info = event.get("session", {})
+        session_id = session_info.get("session_id")
+        self.policy_stats.observe(event_type, session_id or "", event.get("policy"), timestamp)
 
         # 统计工具使用
         if event_type in ["PreToolUse", "PostToolUse"]:
-            # 调试：打印事件结构
-            print(f"[DEBUG] Event structure: {json.dumps(event, ensure_ascii=False, indent=2)}")
-
             # tool_name 应该在 data 字段中
             tool_name = event.get("data", {}).get("tool_name") or "unknown"
-            print(f"[DEBUG] Extracted tool_name: {tool_name}")
+            # 调试：事件结构只在 DEBUG 级别输出时才会被序列化
+            logger.debug("工具事件", extra=fields(tool_name=tool_name, event=event))
 
-            self.stats["tools_used"][tool_name] = self.stats["tools_used"].get(tool_name, 0) + 1
+            scopes = [project_scope(session_info.get("project_name") or "未知项目")]
+            if session_id:
+                scopes.append(session_scope(session_id))
+            self.tool_usage.add(tool_name, scopes)
 
-        # 处理会话信息
-        session_info = event.get("session", {})
-        session_id = session_info.get("session_id")
+        if is_live_event(event):
+            self.record_live(session_id, timestamp)
 
-        # 如果是 SessionEnd 事件，移除该会话
+        # 处理会话信息：如果是 SessionEnd 事件，移除该会话
         if event_type == "SessionEnd" and session_id:
             self.remove_session(session_id)
             return
 
         # 更新会话信息（排除 SessionEnd）
         if session_id:
+            previous = self.sessions.get(session_id, {})
+            last_event = datetime.now().isoformat()
+            if event.get("backfill"):
+                # 回填的历史事件按事件时间（本地时间）记录，会话随后按过期时间正常清理
+                last_event = max(datetime.fromtimestamp(timestamp).isoformat(), previous.get("last_event") or "")
             self.sessions[session_id] = {
                 "session_id": session_id,
                 "project_name": session_info.get("project_name", "未知项目"),
                 "project_path": session_info.get("project_path", ""),
                 "hostname": session_info.get("hostname", ""),
                 "pid": session_info.get("pid", ""),
-                "last_event": datetime.now().isoformat(),
-                "event_count": self.sessions.get(session_id, {}).get("event_count", 0) + 1
+                "last_event": last_event,
+                "event_count": previous.get("event_count", 0) + 1
             }
 
-    def update_todos(self, todos: List[Dict]):
-        """更新任务列表"""
-        self.todos = todos
+    def record_live(self, session_id: str, timestamp: float):
+        span = self.live_spans.get(session_id)
+        if span is None:
+            self.live_spans[session_id] = [timestamp, timestamp]
+            while len(self.live_spans) > LIVE_SPAN_SESSIONS:
+                self.live_spans.pop(next(iter(self.live_spans)))
+        else:
+            span[0] = min(span[0], timestamp)
+            span[1] = max(span[1], timestamp)
+
+    def update_todos(self, session_id: str, todos: List[Dict]) -> Optional[Dict]:
+        """替换会话的任务列表，返回逐项变化，没有变化时返回 None"""
+        diff = self.todos.update(session_id, todos)
+        if diff is not None:
+            self.version += 1
+        return diff
 
     def remove_session(self, session_id: str):
         """移除指定会话"""
+        self.todos.remove(session_id)
+        self.tool_usage.remove(session_scope(session_id))
+        self.detector.remove(session_id)
         if session_id in self.sessions:
             del self.sessions[session_id]
-            print(f"[INFO] 会话已移除: {session_id}")
+            self.version += 1
+            logger.info("会话已移除", extra=fields(session_id=session_id))
 
     def cleanup_expired_sessions(self):
         """清理过期的会话"""
@@ -159,18 +608,33 @@ class ConnectionManager:
                     if elapsed > self.session_timeout:
                         expired_sessions.append(session_id)
                 except Exception as e:
-                    print(f"[ERROR] 解析会话时间失败: {e}")
+                    logger.error("解析会话时间失败", extra=fields(session_id=session_id, error=str(e)))
 
         # 移除过期会话
+        if expired_sessions:
+            self.version += 1
         for session_id in expired_sessions:
             del self.sessions[session_id]
-            print(f"[INFO] 清理过期会话: {session_id}")
+            self.todos.remove(session_id)
+            self.tool_usage.remove(session_scope(session_id))
+            self.detector.remove(session_id)
+            logger.info("清理过期会话", extra=fields(session_id=session_id))
 
         return len(expired_sessions)
 
 
 manager = ConnectionManager()
 
+# 事件存储：多 worker 模式下同时是共享事件日志，单 worker 模式下用于持久化（可关闭）
+event_store = EventStore(STATE_DB_FILE) if WORKERS > 1 or PERSIST_ENABLED else None
+# 多 worker 模式下的共享事件日志，单 worker 模式为 None
+shared_log = event_store if WORKERS > 1 else None
+persisted_since_trim = 0
+
+# 中继转发器（启动时根据 MONITOR_UPSTREAM 创建）与中心端的中继游标
+relay = None
+relay_cursors = RelayCursors()
+
 
 # 默认配置
 DEFAULT_CONFIG = {
@@ -185,25 +649,45 @@ DEFAULT_CONFIG = {
         "PreCompact": True,
         "SessionStart": True,
         "SessionEnd": True,
+        "AgentAlert": True,
     },
     "dingtalk": {
         "enabled": False,
         "webhook_url": "",
         "secret": "",
         "events": []
+    },
+    # 本地权限策略（allow / deny / ask 规则），保存后编译到 POLICY_CACHE_FILE
+    "policy": {
+        "enabled": False,
+        "rules": []
     }
 }
 
 
+# 配置缓存：(文件修改时间, 文件大小, 配置)，文件未变化时不重复读取和解析
+_config_cache: Optional[tuple] = None
+
+
 def load_config() -> Dict:
-    """加载配置文件,如果不存在则创建默认配置"""
-    if not CONFIG_FILE.exists():
+    """加载配置文件,如果不存在则创建默认配置
+
+    按文件修改时间缓存，其他 worker 或手动修改配置文件后会自动重新加载
+    """
+    global _config_cache
+    try:
+        stat = CONFIG_FILE.stat()
+    except OSError:
+        stat = None
+    if stat is not None and _config_cache is not None and _config_cache[:2] == (stat.st_mtime_ns, stat.st_size):
+        return _config_cache[2]
+
+    if stat is None:
         # 首次运行,自动创建配置文件
-        print(f"配置文件不存在,创建默认配置: {CONFIG_FILE}")
+        logger.info("配置文件不存在,创建默认配置", extra=fields(path=str(CONFIG_FILE)))
         save_config(DEFAULT_CONFIG.copy())
-        print("✓ 已创建默认配置文件")
-        print("  提示: 部分事件(如 PermissionRequest, UserPromptSubmit)默认启用音频提醒")
-        print("  如需修改,请访问监控页面点击设置按钮")
+        logger.info("已创建默认配置文件。部分事件(如 PermissionRequest, UserPromptSubmit)默认启用音频提醒,"
+                    "如需修改,请访问监控页面点击设置按钮")
         return DEFAULT_CONFIG.copy()
 
     try:
@@ -213,23 +697,33 @@ def load_config() -> Dict:
             for key in DEFAULT_CONFIG:
                 if key not in config:
                     config[key] = DEFAULT_CONFIG[key]
-            return config
+        _config_cache = (stat.st_mtime_ns, stat.st_size, config)
+        return config
     except Exception as e:
-        print(f"加载配置失败: {e},使用默认配置")
+        logger.warning("加载配置失败,使用默认配置", extra=fields(error=str(e)))
         return DEFAULT_CONFIG.copy()
 
 
 def save_config(config: Dict) -> bool:
     """保存配置文件"""
+    global _config_cache
+    _config_cache = None
     try:
         with open(CONFIG_FILE, "w", encoding="utf-8") as f:
             json.dump(config, f, ensure_ascii=False, indent=2)
         return True
     except Exception as e:
-        print(f"保存配置失败: {e}")
+        logger.error("保存配置失败", extra=fields(error=str(e)))
         return False
 
 
+def refresh_policy_cache(config: Dict) -> Dict:
+    """将配置中的策略编译并写入本地缓存文件，返回编译结果"""
+    compiled = compile_policy(config.get("policy", DEFAULT_CONFIG["policy"]))
+    write_cache(str(POLICY_CACHE_FILE), compiled)
+    return compiled
+
+
 async def send_dingtalk_notification(event: Dict, config: Dict, is_test: bool = False):
     """发送钉钉通知
 
@@ -285,9 +779,11 @@ async def send_dingtalk_notification(event: Dict, config: Dict, is_test: bool =
                 "text": f"### 🤖 Claude Code 事件通知\n\n"
                         f"**事件类型**: {event_name}\n\n"
                         f"**项目**: {project_name}\n\n"
-                        f"**时间**: {event.get('timestamp', '')}\n\n"
+                        f"**时间**: {datetime.fromtimestamp(event_time(event)).strftime('%Y-%m-%d %H:%M:%S')}\n\n"
             }
         }
+        if event_type == ALERT_EVENT:
+            message["markdown"]["text"] += f"**告警**: {event.get('data', {}).get('message', '')}\n\n"
 
         # 发送请求
         async with httpx.AsyncClient(timeout=5.0) as client:
@@ -295,19 +791,21 @@ async def send_dingtalk_notification(event: Dict, config: Dict, is_test: bool =
             if response.status_code == 200:
                 result = response.json()
                 if result.get("errcode") != 0:
-                    print(f"钉钉推送失败: {result.get('errmsg')}")
+                    dingtalk_failures.inc("api_error")
+                    logger.warning("钉钉推送失败", extra=fields(errmsg=result.get("errmsg")))
             else:
-                print(f"钉钉推送失败: HTTP {response.status_code}")
+                dingtalk_failures.inc("http_error")
+                logger.warning("钉钉推送失败", extra=fields(status_code=response.status_code))
 
     except Exception as e:
-        print(f"钉钉推送异常: {e}")
+        dingtalk_failures.inc("exception")
+        logger.error("钉钉推送异常", extra=fields(error=str(e)))
 
 
 @app.get("/", response_class=HTMLResponse)
-async def get_dashboard():
+async def get_dashboard(request: Request):
     """返回监控看板页面"""
-    html_file = TEMPLATES_DIR / "dashboard.html"
-    return FileResponse(str(html_file))
+    return asset_response(request, dashboard_page)
 
 
 @app.get("/test_audio", response_class=HTMLResponse)
@@ -318,66 +816,530 @@ async def get_audio_test():
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket 端点"""
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: str = ""):
+    """WebSocket 端点
+
+    Args:
+        since: 断线重连时客户端已收到的最后一个事件 seq
+        epoch: 该 seq 所属的序号空间（来自 init/state 消息）
+    """
+    await manager.connect(websocket, since, epoch)
     try:
         while True:
             data = await websocket.receive_text()
-            # 处理客户端消息（如果需要）
-            message = json.loads(data)
+            # 处理客户端消息：心跳回应，以及旧版看板主动发送的 ping
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+            manager.received(websocket, message)
             if message.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
-    except WebSocketDisconnect:
+                await manager.send(websocket, encode_message({"type": "pong"}))
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError：连接已被服务端清理关闭
+        pass
+    finally:
         manager.disconnect(websocket)
 
 
-@app.post("/api/event")
-async def receive_event(event: Dict):
-    """接收来自 hooks 的事件"""
-    event["timestamp"] = datetime.now().isoformat()
-    event["id"] = f"{event['timestamp']}_{manager.stats['total_events']}"
+async def apply_event(event: Dict) -> List[Dict]:
+    """将事件应用到本地状态，返回需要推送给看板的消息"""
+    with perf.stage("add_event"):
+        manager.add_event(event)
 
-    manager.add_event(event)
+    event_type = event.get("event_type", "unknown")
+    session_info = event.get("session", {})
+    project = session_info.get("project_name", "")
+    host = session_info.get("hostname", "")
+    events_counter.inc(event_type, project, host)
+    if event_type in ("PreToolUse", "PostToolUse"):
+        tool_events_counter.inc(event.get("data", {}).get("tool_name") or "unknown", project, host)
 
-    # 广播到所有客户端
-    await manager.broadcast({
+    messages = [{
         "type": "event",
         "data": event
-    })
+    }]
+
+    # TodoWrite 的输入就是会话完整的任务列表，只广播变化的条目
+    data = event.get("data", {})
+    if event_type == "PostToolUse" and data.get("tool_name") == "TodoWrite" and session_info.get("session_id"):
+        tool_input = data.get("tool_input") or {}
+        message = apply_todos(tool_input.get("todos", []) if isinstance(tool_input, dict) else [],
+                              session_info["session_id"])
+        if message is not None:
+            messages.append(message)
+
+    if event_type in TRANSCRIPT_EVENTS or event_type in BASELINE_EVENTS:
+        message = await update_usage(event)
+        if message is not None:
+            messages.append(message)
+
+    # 回填的历史事件不参与失控检测
+    with perf.stage("detector"):
+        alerts = manager.detector.observe(event, event_time(event)) if not event.get("backfill") else []
+    if alerts:
+        # 告警作为新事件重新进入管线，不能在状态阶段内等待入口队列
+        asyncio.create_task(emit_alerts(alerts))
+
+    return messages
+
+
+async def emit_alerts(alerts: List[Dict]):
+    """将检测到的异常作为 AgentAlert 事件送入处理管线（可触发提醒音和钉钉推送）"""
+    sound_enabled = load_config().get("sound_enabled", {}).get(ALERT_EVENT, True)
+    for alert in alerts:
+        # 多 worker 模式下每个 worker 都会检测到同一告警，只由抢先登记的 worker 发出；
+        # 登记在告警间隔后过期，与单 worker 时一样，同一告警每个间隔最多发出一次
+        if shared_log is not None and not await asyncio.to_thread(
+                shared_log.claim, f"{ALERT_CLAIM_PREFIX}{alert['alert_id']}", ALERT_COOLDOWN):
+            continue
+        session_info = alert.pop("session", {})
+        alert_counter.inc(alert["kind"])
+        logger.warning("检测到会话异常", extra=fields(
+            session_id=session_info.get("session_id"), kind=alert["kind"], message=alert["message"]))
+        await ingest_event({
+            # 由告警 id 确定的 event_id，同一告警重复发出时会被去重
+            "event_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"alert:{alert['alert_id']}")),
+            "event_type": ALERT_EVENT,
+            "event_name": ALERT_EVENT,
+            "timestamp": utc_now(),
+            "session": session_info,
+            "data": alert,
+            "sound": bool(sound_enabled),
+        })
 
-    # 如果有会话信息更新，也广播会话更新
+
+async def update_usage(event: Dict) -> Optional[Dict]:
+    """增量读取会话记录中新增的用量，有变化时返回用量汇总消息"""
     session_info = event.get("session", {})
-    if session_info.get("session_id"):
-        await manager.broadcast({
-            "type": "sessions",
-            "data": manager.sessions
-        })
+    session_id = session_info.get("session_id")
+    # 中继转发来的事件，会话记录在远端机器上
+    if not session_id or event.get("relay"):
+        return None
 
-    # 发送钉钉通知
-    config = load_config()
-    await send_dingtalk_notification(event, config)
+    data = event.get("data", {})
+    event_type = event.get("event_type", "")
+    by_model, baseline = {}, {}
+    with perf.stage("usage"):
+        for key in ("transcript_path", "agent_transcript_path"):
+            path = data.get(key)
+            if not isinstance(path, str) or not path:
+                continue
+            # 一轮对话开始时只读取还没读过的会话记录，确定基线
+            if event_type not in TRANSCRIPT_EVENTS and manager.usage.tailer.known(path):
+                continue
+            try:
+                usages, first = await asyncio.to_thread(manager.usage.read_transcript, path)
+            except Exception as e:
+                logger.warning("读取会话记录失败", extra=fields(path=path, error=str(e)))
+                continue
+            # 子代理的会话记录在本轮中创建，首次读取的内容也属于当前轮次
+            target = baseline if first and key == "transcript_path" else by_model
+            for model, totals in usages.items():
+                target.setdefault(model, UsageTotals()).add(totals)
+        if event_type not in TRANSCRIPT_EVENTS and not baseline:
+            return None
+
+        changed = manager.usage.apply(
+            session_id, session_info.get("project_name", ""), event_type,
+            by_model, event.get("timestamp"), baseline,
+        )
+    if not changed:
+        return None
+    manager.version += 1
+    return {
+        "type": "usage",
+        "data": manager.usage.summary()
+    }
+
+
+def apply_todos(todos: List[Dict], session_id: str = GLOBAL_TODOS) -> Optional[Dict]:
+    """更新会话的任务列表，有变化时返回逐项变化的消息"""
+    diff = manager.update_todos(session_id, todos)
+    if diff is None:
+        return None
+    return {
+        "type": "todo_diff",
+        "data": diff
+    }
+
+
+def notification_wanted(event: Dict) -> bool:
+    """按（缓存的）配置判断事件是否需要推送钉钉，避免无关事件进入通知队列"""
+    dingtalk_config = load_config().get("dingtalk", {})
+    if event.get("backfill") or not dingtalk_config.get("enabled") or event.get("event_type", "") not in dingtalk_config.get("events", []):
+        return False
+    # 已由本地策略自动允许或拒绝的权限请求不需要提醒
+    policy = event.get("policy")
+    return not (isinstance(policy, dict) and policy.get("decision") in ("allow", "deny")
+                and event.get("event_type") == "PermissionRequest")
+
+
+async def run_state_stage(records: List[tuple]):
+    """状态阶段：按顺序应用事件和任务列表，再交给推送、持久化和通知阶段"""
+    messages: List[Dict] = []
+    sessions_changed = False
+    for kind, body in records:
+        if kind == "event":
+            messages.extend(await apply_event(body))
+            sessions_changed = sessions_changed or bool(body.get("session", {}).get("session_id"))
+            if shared_log is None and notification_wanted(body):
+                # 通知只是尽力而为，队列满时直接丢弃，不阻塞状态更新
+                if not pipeline.get("notify").put_nowait(body):
+                    shed_counter.inc(body.get("event_type", ""), "notify_drop")
+        elif kind == "todos":
+            message = apply_todos(body.get("todos", []), body.get("session", GLOBAL_TODOS))
+            if message is not None:
+                messages.append(message)
+
+    await pipeline.get("fanout").put((messages, sessions_changed))
+    # 单 worker 模式：状态更新后再持久化；多 worker 模式下记录在入队前已写入共享日志
+    persist = pipeline.get("persist")
+    if shared_log is None and persist is not None:
+        for record in records:
+            await persist.put(record)
+
+
+async def run_fanout_stage(batches: List[tuple]):
+    """推送阶段：按顺序广播消息，同一批次内的会话更新合并为一次广播"""
+    with perf.stage("broadcast"):
+        sessions_changed = False
+        for messages, changed in batches:
+            for message in messages:
+                await manager.broadcast(message)
+            sessions_changed = sessions_changed or changed
+
+        if sessions_changed:
+            await manager.broadcast({
+                "type": "sessions",
+                "data": manager.sessions
+            })
+
+
+async def run_persist_stage(records: List[tuple]):
+    """持久化阶段：批量写入 SQLite 事件存储，并按保留条数定期清理"""
+    global persisted_since_trim
+    with perf.stage("persist"):
+        await asyncio.to_thread(event_store.append_many, records)
+        await asyncio.to_thread(event_store.record_live_spans, manager.epoch, live_spans_of(records))
+        persisted_since_trim += len(records)
+        if persisted_since_trim >= STORE_TRIM_INTERVAL:
+            persisted_since_trim = 0
+            await asyncio.to_thread(event_store.trim, STORE_MAX_EVENTS)
+
+    # 多 worker 模式：写入共享日志后由接收事件的 worker 发送通知（每个事件只发一次）
+    if shared_log is not None:
+        for kind, body in records:
+            if kind == "event" and notification_wanted(body):
+                if not pipeline.get("notify").put_nowait(body):
+                    shed_counter.inc(body.get("event_type", ""), "notify_drop")
+
+
+async def run_notify_stage(events: List[Dict]):
+    """通知阶段：发送钉钉推送"""
+    with perf.stage("notify"):
+        config = load_config()
+        for event in events:
+            await send_dingtalk_notification(event, config)
+
+
+def build_pipeline() -> Pipeline:
+    """组装处理管线
+
+    单 worker：接收 -> state -> fanout / persist / notify
+    多 worker：接收 -> persist（写共享日志）-> notify；各 worker 回放共享日志 -> state -> fanout
+    """
+    def stage(name, handler, **kwargs):
+        return Stage(name, handler, duration_histogram=stage_duration, outcome_counter=stage_outcomes, **kwargs)
+
+    built = Pipeline(entry="persist" if shared_log is not None else "state")
+    if shared_log is not None:
+        built.add(stage("persist", run_persist_stage, maxsize=INGEST_QUEUE_SIZE, batch_size=200))
+    built.add(stage("state", run_state_stage, maxsize=INGEST_QUEUE_SIZE, batch_size=64))
+    built.add(stage("fanout", run_fanout_stage, maxsize=1000, batch_size=64))
+    if shared_log is None and event_store is not None:
+        built.add(stage("persist", run_persist_stage, maxsize=INGEST_QUEUE_SIZE, batch_size=500))
+    built.add(stage("notify", run_notify_stage, concurrency=NOTIFY_CONCURRENCY, maxsize=1000))
+    return built
+
+
+pipeline = build_pipeline()
+shed_policy = ShedPolicy(SHED_LOW_PRIORITY, SHED_HIGH_PRIORITY, SHED_SOFT, SHED_HARD, SHED_ENABLED)
+
+
+# 入口去重（每个 worker 各自记录）；多 worker 模式下回放共享日志时再按全序去重一次
+ingest_dedup = DedupWindow(DEDUP_WINDOW_SECONDS, DEDUP_MAX_IDS)
+replay_dedup = DedupWindow(DEDUP_WINDOW_SECONDS, DEDUP_MAX_IDS) if shared_log is not None else None
+DUPLICATE = "duplicate"
 
+
+async def ingest_event(event: Dict) -> str:
+    """事件入口：去重、按削峰策略处理后入队，返回处理结果（keep / strip / drop / wait / duplicate）"""
+    entry = pipeline.get(pipeline.entry)
+    event_type = event.get("event_type", "")
+    # 旧版 hook 不带 event_id，由服务端生成（此类事件无法识别重发）
+    event_id = event.get("event_id")
+    if not isinstance(event_id, str) or not event_id:
+        event_id = event["event_id"] = uuid7()
+    elif ingest_dedup.seen(event_id):
+        duplicate_counter.inc("ingest")
+        return DUPLICATE
+    event["id"] = event_id
+
+    decision = shed_policy.decide(event_type, entry.fill_ratio())
+    if decision == ShedPolicy.DROP:
+        shed_counter.inc(event_type, "drop")
+        return decision
+    if decision == ShedPolicy.STRIP:
+        shed_counter.inc(event_type, "strip")
+        shed_policy.strip(event)
+
+    # seq 由状态阶段（单 worker）或共享日志（多 worker）分配，不沿用客户端或下级中继带来的值
+    event.pop("seq", None)
+
+    # 中继模式：进入转发缓冲
+    if relay is not None:
+        relay.enqueue(event)
+
+    # 高优先级事件在队列满时等待，其余情况队列都有空位，不会阻塞
+    await entry.put(("event", event))
+    return decision
+
+
+@app.post("/api/event")
+async def receive_event(request: Request):
+    """接收来自 hooks 的事件：校验后入队即返回，不等待后续处理"""
+    started = time.perf_counter()
+    body = await request.body()
+    with perf.stage("parse"):
+        try:
+            event = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无法解析事件: {e}")
+    if not isinstance(event, dict):
+        raise HTTPException(status_code=400, detail="事件必须是 JSON 对象")
+
+    # 保留 hook 采集事件时的时间（统一为 UTC），另记录接收时间；没有或无法解析时使用接收时间
+    event["received_at"] = utc_now()
+    event["timestamp"] = normalize_timestamp(event.get("timestamp")) or event["received_at"]
+    ingested_counter.inc("hook")
+    decision = await ingest_event(event)
+
+    ingest_latency.observe(time.perf_counter() - started, "/api/event")
+    if decision == ShedPolicy.DROP:
+        return {"status": "dropped"}
+    if decision == DUPLICATE:
+        return {"status": "duplicate"}
     return {"status": "ok"}
 
 
-@app.post("/api/todos")
-async def update_todos(todos: List[Dict]):
-    """更新任务列表"""
-    manager.update_todos(todos)
+@app.post("/api/relay/batch")
+async def receive_relay_batch(request: Request):
+    """中心端：接收中继转发的事件批次（gzip 压缩）"""
+    started = time.perf_counter()
+    try:
+        batch = decode_batch(await request.body(), request.headers.get("content-encoding", ""))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"无法解析中继批次: {e}")
+
+    relay_id = batch.get("relay_id") or "unknown"
+    events = batch.get("events", [])
+    fresh = relay_cursors.filter_new(relay_id, batch.get("epoch", ""), events)
+
+    accepted = 0
+    for event in fresh:
+        event.pop("relay_seq", None)
+        event.setdefault("event_name", event.get("event_type", ""))
+        event["relay"] = relay_id
+        event["timestamp"] = normalize_timestamp(event.get("timestamp")) or utc_now()
+        if await ingest_event(event) != DUPLICATE:
+            accepted += 1
+
+    relay_cursors.touch(relay_id, len(events), len(fresh), datetime.now().isoformat())
+    ingested_counter.inc("relay", amount=accepted)
+    ingest_latency.observe(time.perf_counter() - started, "/api/relay/batch")
+    return {"status": "ok", "accepted": accepted}
 
-    await manager.broadcast({
-        "type": "todos",
-        "data": todos
-    })
+
+@app.post("/api/backfill")
+async def receive_backfill(request: Request):
+    """接收从会话记录回填的历史事件批次（gzip 压缩，见 backfill.py）
+
+    落在某会话实时事件时间范围内的事件已由 hook 上报过，跳过；只补充监控平台未运行期间的事件。
+    """
+    started = time.perf_counter()
+    try:
+        batch = decode_batch(await request.body(), request.headers.get("content-encoding", ""))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"无法解析回填批次: {e}")
+
+    events = [e for e in batch.get("events", []) if isinstance(e, dict)]
+    session_ids = {(e.get("session") or {}).get("session_id") for e in events} - {None, ""}
+    spans = await asyncio.to_thread(event_store.live_spans, session_ids) if event_store is not None else {}
+    for session_id in session_ids:
+        if session_id in manager.live_spans:
+            spans.setdefault(session_id, []).append(tuple(manager.live_spans[session_id]))
+
+    entry = pipeline.get(pipeline.entry)
+    accepted = skipped = 0
+    for event in events:
+        event["timestamp"] = normalize_timestamp(event.get("timestamp"))
+        if event["timestamp"] is None:
+            skipped += 1
+            continue
+        timestamp = event_time(event)
+        session_spans = spans.get((event.get("session") or {}).get("session_id"), ())
+        if any(first - LIVE_SPAN_MARGIN <= timestamp <= last + LIVE_SPAN_MARGIN for first, last in session_spans):
+            skipped += 1
+            continue
+        while entry.fill_ratio() >= BACKFILL_QUEUE_LIMIT:
+            await asyncio.sleep(0.05)
+        event.setdefault("event_name", event.get("event_type", ""))
+        event["backfill"] = True
+        if await ingest_event(event) != DUPLICATE:
+            accepted += 1
+
+    ingested_counter.inc("backfill", amount=accepted)
+    ingest_latency.observe(time.perf_counter() - started, "/api/backfill")
+    return {"status": "ok", "accepted": accepted, "skipped": skipped}
+
+
+@app.get("/api/relay/status")
+async def get_relay_status():
+    """中继状态：本机转发情况与中心端已连接的中继"""
+    return {
+        "forwarder": relay.status() if relay is not None else None,
+        "relays": relay_cursors.relays,
+    }
+
+
+@app.get("/api/todos")
+async def get_todos(session: str = GLOBAL_TODOS):
+    """获取任务列表：默认为全局列表（与 POST 对应），指定 session 时返回该会话的列表"""
+    return manager.todos.snapshot().get(session, [])
+
+
+@app.post("/api/todos")
+async def update_todos(todos: List[Dict], session: str = GLOBAL_TODOS):
+    """整体替换任务列表（session 为空时为不属于任何会话的全局列表）"""
+    await pipeline.get(pipeline.entry).put(("todos", {"todos": todos, "session": session}))
 
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus / OpenMetrics 格式的内部指标"""
+    openmetrics = "application/openmetrics-text" in request.headers.get("accept", "")
+    return Response(
+        content=metrics.render(openmetrics),
+        media_type=OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+    )
+
+
+@app.get("/api/pipeline")
+async def get_pipeline():
+    """处理管线各阶段的队列积压、并发和处理计数，以及削峰策略和去重状态"""
+    return {**pipeline.status(), "shed": shed_policy.status(), "dedup": ingest_dedup.status()}
+
+
+@app.get("/api/assets")
+async def get_assets():
+    """静态资源清单：指纹地址与各压缩版本的大小"""
+    return assets.status()
+
+
+@app.get("/api/connections")
+async def get_connections():
+    """看板连接：连接时长、发送量、心跳延迟和发送超时次数"""
+    return {
+        "count": len(manager.active_connections),
+        "idle_timeout": WS_IDLE_TIMEOUT,
+        "pong_timeout": WS_PONG_TIMEOUT,
+        "send_timeout": WS_SEND_TIMEOUT,
+        "send_queue": WS_SEND_QUEUE,
+        "connections": manager.connection_stats(),
+    }
+
+
+@app.get("/api/detector")
+async def get_detector():
+    """失控会话检测：跟踪的会话数、每个事件的检测耗时、各类告警次数和阈值"""
+    return manager.detector.status()
+
+
+@app.get("/api/debug/perf")
+async def get_perf(reset: bool = False):
+    """热路径耗时分析：各阶段耗时分布与事件循环延迟"""
+    snapshot = perf.snapshot()
+    if reset:
+        perf.reset()
+    return snapshot
+
+
 @app.get("/api/stats")
 async def get_stats():
     """获取统计信息"""
-    return manager.stats
+    return manager.stats_snapshot()
+
+
+@app.get("/api/stats/tools")
+async def get_tool_ranking(project: str = "", session: str = "", limit: int = 10):
+    """工具使用排行（全局，或指定项目 / 会话），按次数从高到低
+
+    count 是不低于真实次数的估计，error 为可能多算的上限（为 0 时计数精确）
+    """
+    if session:
+        scope = session_scope(session)
+    elif project:
+        scope = project_scope(project)
+    else:
+        scope = ""
+    counts = manager.tool_usage.get(scope)
+    return {
+        "project": project,
+        "session": session,
+        "total": counts.total if counts else 0,
+        "items": counts.top(max(1, min(limit, 100))) if counts else [],
+        "sketch": manager.tool_usage.status(),
+    }
+
+
+@app.get("/api/activity")
+async def get_activity(window: str = "1m"):
+    """活动时间线：按窗口返回分桶事件计数（最旧在前）"""
+    snapshot = manager.activity.snapshot(window)
+    if snapshot is None:
+        raise HTTPException(status_code=400, detail=f"不支持的窗口: {window}，可选 {list(ACTIVITY_WINDOWS)}")
+    return snapshot
+
+
+@app.get("/api/search")
+async def search_events(q: str, session: str = "", type: str = "", since: str = "",
+                        limit: int = 20, offset: int = 0):
+    """全文检索历史事件
+
+    Args:
+        q: 检索词（多个词为 AND 关系）
+        session: 只返回该会话的事件
+        type: 只返回该类型的事件
+        since: 起始时间（Unix 时间戳或 ISO 时间）
+    """
+    try:
+        since_ts = parse_since(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无法解析时间: {since}")
+
+    started = time.perf_counter()
+    result = manager.search_index.search(
+        q, session=session, event_type=type, since=since_ts,
+        limit=max(1, min(limit, 200)), offset=max(0, offset),
+    )
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    result["index"] = manager.search_index.stats()
+    return result
 
 
 @app.get("/api/sessions")
@@ -389,12 +1351,85 @@ async def get_sessions():
     }
 
 
+@app.get("/api/usage")
+async def get_usage():
+    """token 用量与费用汇总（按项目和模型）"""
+    return manager.usage.summary()
+
+
+@app.get("/api/sessions/{session_id}/usage")
+async def get_session_usage(session_id: str):
+    """会话的 token 用量：累计、当前轮次、最近各轮和模型分布"""
+    usage = manager.usage.session(session_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="会话没有用量数据")
+    return usage
+
+
+@app.get("/api/sessions/{session_id}/trace")
+async def get_session_trace(session_id: str, format: str = "json"):
+    """获取会话的 span 树，format=chrome / otlp 时以文件形式下载"""
+    trace = manager.traces.get(session_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="会话没有追踪数据")
+
+    if format == "json":
+        return {"session_id": session_id, "project": trace.project, "spans": trace.snapshot()}
+    if format == "chrome":
+        payload = trace.to_chrome()
+    elif format == "otlp":
+        payload = trace.to_otlp()
+    else:
+        raise HTTPException(status_code=400, detail=f"未知格式: {format}，可选 json / chrome / otlp")
+
+    filename = f"trace_{session_id[:16]}_{format}.json"
+    return Response(
+        content=encode_message(payload),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.get("/api/history")
 async def get_history(limit: int = 100):
     """获取历史事件"""
     return manager.event_history[-limit:]
 
 
+@app.get("/api/export")
+async def export_events(format: str = "ndjson", since: str = "", until: str = "", session: str = "",
+                        project: str = "", type: str = "", omit: str = ""):
+    """从事件存储流式导出事件
+
+    Args:
+        format: ndjson / csv / parquet（需要 pyarrow）
+        since: 起始时间（Unix 时间戳或 ISO 时间，按写入存储的时间）
+        until: 结束时间（不含）
+        session: 只导出该会话的事件
+        project: 只导出该项目（项目名或路径）的事件
+        type: 只导出该类型的事件
+        omit: 去掉的字段，逗号分隔的路径（如 data.tool_response），large 表示常见大字段
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的格式: {format}，可选 {list(EXPORT_FORMATS)}")
+    if format == "parquet" and not columnar_available():
+        raise HTTPException(status_code=400, detail="Parquet 导出需要安装 pyarrow")
+    if event_store is None:
+        raise HTTPException(status_code=400, detail="事件持久化未开启（MONITOR_PERSIST=0），无法导出")
+    try:
+        since_ts, until_ts = parse_since(since), parse_since(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"无法解析时间: {e}")
+
+    events = iter_events(event_store.path, since=since_ts, until=until_ts, session=session,
+                         project=project, event_type=type, omit=parse_omit(omit))
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"events-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    # 同步生成器由 StreamingResponse 放到线程池中迭代，不阻塞事件循环
+    return StreamingResponse(encode_events(events, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
 @app.get("/api/config")
 async def get_config():
     """获取配置"""
@@ -404,6 +1439,9 @@ async def get_config():
 @app.post("/api/config")
 async def update_config(config: Dict):
     """更新配置"""
+    # 设置弹窗只提交音频和钉钉配置，策略由 /api/policy 单独维护
+    if "policy" not in config:
+        config["policy"] = load_config().get("policy", DEFAULT_CONFIG["policy"])
     if save_config(config):
         # 广播配置更新
         await manager.broadcast({
@@ -415,6 +1453,48 @@ async def update_config(config: Dict):
         return {"status": "error", "message": "配置保存失败"}
 
 
+@app.get("/api/policy")
+async def get_policy():
+    """获取权限策略、缓存状态和自动决策统计"""
+    return {
+        "policy": load_config().get("policy", DEFAULT_CONFIG["policy"]),
+        "cache_file": str(POLICY_CACHE_FILE),
+        "cache_exists": POLICY_CACHE_FILE.exists(),
+        "stats": manager.policy_stats.snapshot(),
+    }
+
+
+@app.post("/api/policy")
+async def update_policy(policy: Dict):
+    """保存权限策略并重新编译本地缓存"""
+    try:
+        rules = validate_rules(policy.get("rules", []))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    config = dict(load_config())
+    config["policy"] = {"enabled": bool(policy.get("enabled")), "rules": rules}
+    if not save_config(config):
+        return {"status": "error", "message": "配置保存失败"}
+    try:
+        compiled = await asyncio.to_thread(refresh_policy_cache, config)
+    except OSError as e:
+        return {"status": "error", "message": f"写入策略缓存失败: {e}"}
+    return {"status": "ok", "hash": compiled["hash"], "rules": len(rules)}
+
+
+@app.post("/api/policy/test")
+async def test_policy(request: Dict):
+    """用当前策略试算一个 hook 输入：{"event": "PreToolUse", "data": {tool_name, tool_input, cwd}}"""
+    try:
+        compiled = compile_policy({**load_config().get("policy", {}), "enabled": True})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    started = time.perf_counter()
+    result = evaluate(compiled, request.get("event", "PreToolUse"), request.get("data", {}))
+    return {"result": result, "eval_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
 @app.post("/api/test-dingtalk")
 async def test_dingtalk():
     """测试钉钉推送"""
@@ -424,7 +1504,7 @@ async def test_dingtalk():
     test_event = {
         "event_type": "Stop",
         "event_name": "Stop - 测试通知",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": utc_now(),
         "session": {
             "project_name": "Claude Code Monitor",
             "hostname": "测试主机",
@@ -471,7 +1551,7 @@ async def watch_log_file():
                         last_content = content
                     last_size = current_size
         except Exception as e:
-            print(f"Error watching log file: {e}")
+            logger.error("监控日志文件出错", extra=fields(error=str(e)))
 
         await asyncio.sleep(0.5)
 
@@ -497,17 +1577,18 @@ def parse_log_entries(content: str) -> List[Dict]:
                     "event_type": event_type.split(" - ")[0] if " - " in event_type else event_type,
                     "event_name": event_type,
                     "data": {},
-                    "id": f"{timestamp}_{len(entries)}"
+                    # 由条目内容确定的 id：同一条日志重复解析时 id 不变
+                    "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"hooks_log:{i}:{line}"))
                 }
 
-                print(f"[PARSE] Found entry: {event_type}")
+                logger.debug("解析到日志条目", extra=fields(event_type=event_type))
 
                 # 查找数据部分
                 i += 1
                 json_lines = []
                 while i < len(lines) and not lines[i].startswith("-" * 10):
                     if "数据:" in lines[i]:
-                        print(f"[PARSE] Found data section at line {i}")
+                        logger.debug("找到数据段", extra=fields(line=i))
                         # 从 "数据: {" 这一行开始提取 JSON
                         # 找到 { 的位置
                         brace_pos = lines[i].find("{")
@@ -531,21 +1612,19 @@ def parse_log_entries(content: str) -> List[Dict]:
                     i += 1
 
                 json_text = "".join(json_lines) if json_lines else ""
-                if json_text:
-                    print(f"[PARSE] Collected JSON: {json_text[:100]}...")
 
                 # 解析 JSON
                 if json_text:
                     try:
                         entry["data"] = json.loads(json_text)
-                        print(f"[PARSE] Successfully parsed JSON, tool_name: {entry['data'].get('tool_name', 'N/A')}")
+                        logger.debug("解析 JSON 成功", extra=fields(tool_name=entry["data"].get("tool_name", "N/A")))
                     except Exception as e:
-                        print(f"[PARSE] JSON parse error: {e}")
+                        logger.debug("JSON 解析失败", extra=fields(error=str(e), json_text=json_text))
                         pass
 
                 entries.append(entry)
             except Exception as e:
-                print(f"[PARSE] Entry parse error: {e}")
+                logger.debug("日志条目解析失败", extra=fields(error=str(e)))
                 pass
 
         i += 1
@@ -566,9 +1645,74 @@ async def cleanup_sessions_periodically():
                     "type": "sessions",
                     "data": manager.sessions
                 })
-                print(f"[INFO] 定期清理: 移除了 {cleaned} 个过期会话")
+                logger.info("定期清理过期会话", extra=fields(removed=cleaned))
+        except Exception as e:
+            logger.error("清理会话时出错", extra=fields(error=str(e)))
+
+
+async def broadcast_stats_periodically():
+    """统计信息有变化时按固定间隔推送给看板，工具排行以服务端的 Top-K 为准"""
+    sent_total = None
+    while True:
+        try:
+            await asyncio.sleep(STATS_BROADCAST_INTERVAL)
+            total = manager.stats["total_events"]
+            if total == sent_total or not manager.active_connections:
+                continue
+            sent_total = total
+            await manager.broadcast({"type": "stats", "data": manager.stats_snapshot()})
+        except Exception as e:
+            logger.error("推送统计信息时出错", extra=fields(error=str(e)))
+
+
+async def heartbeat_periodically():
+    """定期向空闲的看板连接发送心跳并清理失效连接"""
+    while True:
+        try:
+            await asyncio.sleep(WS_HEARTBEAT_CHECK_INTERVAL)
+            await manager.heartbeat()
         except Exception as e:
-            print(f"[ERROR] 清理会话时出错: {e}")
+            logger.error("发送心跳时出错", extra=fields(error=str(e)))
+
+
+async def check_agents_periodically():
+    """定期检查进行中的对话是否卡住或持续过久"""
+    while True:
+        try:
+            await asyncio.sleep(DETECTOR_CHECK_INTERVAL)
+            alerts = manager.detector.check()
+            if alerts:
+                await emit_alerts(alerts)
+            if shared_log is not None:
+                await asyncio.to_thread(shared_log.prune_claims, ALERT_CLAIM_PREFIX)
+        except Exception as e:
+            logger.error("检查会话状态时出错", extra=fields(error=str(e)))
+
+
+async def follow_shared_log():
+    """多 worker 模式：按 seq 顺序回放共享日志，保证所有 worker 状态一致、推送有序"""
+    cursor = int(shared_log.get_meta("start_seq", "0"))
+
+    while True:
+        try:
+            records = await asyncio.to_thread(shared_log.read_since, cursor)
+            for seq, kind, body in records:
+                cursor = seq
+                if kind == "event":
+                    # 重发的事件可能经不同 worker 写入了共享日志，回放时按全序去重（所有 worker 结果一致）
+                    if body.get("event_id") and replay_dedup.seen(body["event_id"]):
+                        duplicate_counter.inc("replay")
+                        continue
+                    body["id"] = body.get("event_id") or f"{body['timestamp']}_{seq}"
+                    body["seq"] = seq
+                # 状态阶段队列满时在这里等待，回放速度跟随处理速度
+                await pipeline.get("state").put((kind, body))
+
+            if not records:
+                await asyncio.sleep(SHARED_LOG_POLL_INTERVAL)
+        except Exception as e:
+            logger.error("回放共享日志出错", extra=fields(cursor=cursor, error=str(e)))
+            await asyncio.sleep(1)
 
 
 @app.on_event("startup")
@@ -580,10 +1724,105 @@ async def startup_event():
     # 启动定期清理过期会话的后台任务
     asyncio.create_task(cleanup_sessions_periodically())
 
+    # 启动处理管线的各阶段
+    pipeline.start()
+
+    asyncio.create_task(heartbeat_periodically())
+    asyncio.create_task(broadcast_stats_periodically())
+
+    if DETECTOR_ENABLED:
+        asyncio.create_task(check_agents_periodically())
+
+    # 按当前配置重新生成本地策略缓存，确保 hook 读到的规则与配置一致
+    try:
+        refresh_policy_cache(load_config())
+    except (OSError, ValueError) as e:
+        logger.warning("生成策略缓存失败", extra=fields(path=str(POLICY_CACHE_FILE), error=str(e)))
+
+    # 耗时分析：采样事件循环延迟
+    if perf.enabled:
+        asyncio.create_task(perf.sample_loop_lag())
+
+    # 多 worker 模式：回放共享事件日志，所有 worker 共用同一个序号空间
+    if shared_log is not None:
+        manager.epoch = shared_log.get_meta("run_id", manager.epoch)
+        asyncio.create_task(follow_shared_log())
+
+    # 中继模式：启动上游转发
+    global relay
+    upstream = os.environ.get("MONITOR_UPSTREAM", "")
+    if upstream:
+        relay_id = os.environ.get("MONITOR_RELAY_ID") or socket.gethostname()
+        relay = RelayForwarder(upstream, relay_id, RELAY_OUTBOX_FILE)
+        asyncio.create_task(relay.run())
+        logger.info("中继模式已启用", extra=fields(upstream=upstream, relay_id=relay_id))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """退出前尽量处理完已入队的事件（持久化、推送）"""
+    try:
+        await asyncio.wait_for(pipeline.drain(), timeout=5)
+    except asyncio.TimeoutError:
+        logger.warning("退出时仍有未处理的事件", extra=fields(pipeline=pipeline.status()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude Code 监控平台")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=18765, help="监听端口")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="uvicorn worker 数量，大于 1 时通过共享 SQLite 日志同步状态")
+    parser.add_argument("--upstream", default=os.environ.get("MONITOR_UPSTREAM", ""),
+                        help="中心监控平台地址（如 http://monitor.example.com:18765），设置后以中继模式运行")
+    parser.add_argument("--relay-id", default=os.environ.get("MONITOR_RELAY_ID", ""),
+                        help="中继标识，默认使用主机名")
+    parser.add_argument("--log-level", default=os.environ.get("MONITOR_LOG_LEVEL", "INFO"),
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"], type=str.upper,
+                        help="日志级别")
+    parser.add_argument("--perf", action="store_true", default=PERF_ENABLED,
+                        help="启用热路径耗时分析（/api/debug/perf）")
+    args = parser.parse_args()
+
+    # 写入环境变量，多 worker 模式下子进程继承同样的设置
+    os.environ["MONITOR_LOG_LEVEL"] = args.log_level
+    logger.setLevel(args.log_level)
+    if args.perf:
+        os.environ["MONITOR_PERF"] = "1"
+        if not perf.enabled:
+            enable_perf()
+
+    if args.upstream and args.workers > 1:
+        parser.error("中继模式仅支持单 worker 运行")
+    if args.upstream:
+        os.environ["MONITOR_UPSTREAM"] = args.upstream
+    if args.relay_id:
+        os.environ["MONITOR_RELAY_ID"] = args.relay_id
 
-if __name__ == "__main__":
     print("=" * 60)
     print("  Claude Code 监控平台")
-    print("  访问地址: http://localhost:18765")
+    print(f"  访问地址: http://localhost:{args.port}")
+    if args.workers > 1:
+        print(f"  Worker 数量: {args.workers}（共享日志: {STATE_DB_FILE}）")
+    if args.upstream:
+        print(f"  中继上游: {args.upstream}")
     print("=" * 60)
-    uvicorn.run(app, host="0.0.0.0", port=18765)
+
+    if args.workers > 1:
+        os.environ["MONITOR_WORKERS"] = str(args.workers)
+        os.environ["MONITOR_STATE_DB"] = str(STATE_DB_FILE)
+
+        # 每次启动从日志末尾开始回放，与单 worker 模式"重启后重新统计"的行为一致
+        store = EventStore(STATE_DB_FILE)
+        store.set_meta("start_seq", str(store.last_seq()))
+        store.set_meta("run_id", uuid.uuid4().hex)
+        store.close()
+
+        uvicorn.run("server:app", host=args.host, port=args.port,
+                    workers=args.workers, app_dir=str(BASE_DIR))
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 共享事件日志
+多 worker 模式下，所有 worker 通过同一个 SQLite 文件（WAL 模式）共享一条
+全序事件日志：任意 worker 接收的事件先追加到日志，再由每个 worker 按 seq
+顺序回放到本地状态并推送给自己的看板连接。
+单 worker 模式下同一个文件作为事件的持久化存储，由处理管线的持久化阶段批量写入。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def event_time(body: Dict, default: float) -> float:
+    """事件发生的时间（事件的 timestamp 字段，Unix 时间戳）；没有或无法解析时使用 default"""
+    timestamp = body.get("timestamp") if isinstance(body, dict) else None
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return float(timestamp)
+    if not isinstance(timestamp, str):
+        return default
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return default
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class EventStore:
+    """基于 SQLite 的追加式事件日志（多进程安全）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.path),
+            timeout=30,
+            isolation_level=None,  # 自动提交，写入由单条 INSERT 完成
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                created REAL NOT NULL,
+                body TEXT NOT NULL,
+                event_time REAL
+            )
+            """
+        )
+        self._migrate_event_time()
+        # 按时间范围导出时用 event_time 索引定位 seq 区间
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_event_time ON events (event_time)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        # 每个会话在每次服务运行期间通过 hook 实时收到的事件时间范围（回填时据此跳过已有的事件）
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS live_spans (
+                session_id TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                first REAL NOT NULL,
+                last REAL NOT NULL,
+                PRIMARY KEY (session_id, run_id)
+            )
+            """
+        )
+
+    def _migrate_event_time(self):
+        """旧版本的数据库没有 event_time 列：补上该列，并按事件的 timestamp 回填"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if "event_time" in columns:
+            return
+        with self._lock:
+            self._conn.execute("ALTER TABLE events ADD COLUMN event_time REAL")
+            try:
+                self._conn.execute(
+                    "UPDATE events SET event_time = COALESCE("
+                    "(julianday(json_extract(body, '$.timestamp')) - 2440587.5) * 86400.0, created)"
+                )
+            except sqlite3.OperationalError:
+                # SQLite 不带 JSON 函数时按写入时间回填
+                self._conn.execute("UPDATE events SET event_time = created")
+
+    def append(self, kind: str, body: Dict) -> int:
+        """追加一条记录，返回全局递增的 seq"""
+        text = json.dumps(body, ensure_ascii=False)
+        created = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO events (kind, created, body, event_time) VALUES (?, ?, ?, ?)",
+                (kind, created, text, event_time(body, created)),
+            )
+            return cursor.lastrowid
+
+    def append_many(self, records: List[Tuple[str, Dict]]) -> int:
+        """在一个事务中批量追加 (kind, body) 记录，返回最后一条的 seq"""
+        created = time.time()
+        rows = [(kind, created, json.dumps(body, ensure_ascii=False), event_time(body, created))
+                for kind, body in records]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO events (kind, created, body, event_time) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+    def record_live_spans(self, run_id: str, spans: Dict[str, Tuple[float, float]]):
+        """合并会话在本次运行中的实时事件时间范围"""
+        if not spans:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO live_spans (session_id, run_id, first, last) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_id, run_id) DO UPDATE SET "
+                "first = MIN(first, excluded.first), last = MAX(last, excluded.last)",
+                [(session_id, run_id, first, last) for session_id, (first, last) in spans.items()],
+            )
+
+    def live_spans(self, session_ids: Iterable[str]) -> Dict[str, List[Tuple[float, float]]]:
+        """各会话所有运行期间的实时事件时间范围"""
+        session_ids = list(set(session_ids))
+        spans: Dict[str, List[Tuple[float, float]]] = {}
+        with self._lock:
+            for start in range(0, len(session_ids), 500):
+                chunk = session_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT session_id, first, last FROM live_spans "
+                    f"WHERE session_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for session_id, first, last in rows:
+                    spans.setdefault(session_id, []).append((first, last))
+        return spans
+
+    def trim(self, max_rows: int) -> int:
+        """只保留最新的 max_rows 条记录，返回删除的条数"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM events").fetchone()
+            if not row[0] or row[0] <= max_rows:
+                return 0
+            cursor = self._conn.execute("DELETE FROM events WHERE seq <= ?", (row[0] - max_rows,))
+            return cursor.rowcount
+
+    def read_since(self, seq: int, limit: int = 500) -> List[Tuple[int, str, Dict]]:
+        """按顺序读取 seq 之后的记录"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, kind, body FROM events WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def last_seq(self) -> int:
+        """当前最大的 seq，日志为空时返回 0"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM events").fetchone()
+        return row[0] or 0
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    def claim(self, key: str, ttl: float) -> bool:
+        """登记一个键，ttl 秒内只有第一个登记的进程返回 True（多 worker 间去重）
+
+        meta 中记录登记的过期时间，过期后可以再次登记
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value WHERE CAST(meta.value AS REAL) <= ?",
+                (key, str(now + ttl), now),
+            )
+            return cursor.rowcount == 1
+
+    def prune_claims(self, prefix: str) -> int:
+        """删除以 prefix 开头且已过期的登记，返回删除的数量"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM meta WHERE key >= ? AND key < ? AND CAST(value AS REAL) <= ?",
+                (prefix, prefix + "\uffff", time.time()),
+            )
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
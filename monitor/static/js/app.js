@@ -2,26 +2,140 @@
  * Claude Code 监控平台 - 前端应用
  */
 
+// 事件列表：固定行高的虚拟列表，只渲染可视区域内的行
+const EVENT_ROW_HEIGHT = 68;       // 行高（含行间距），与 .event-item 的高度一致
+const EVENT_RING_CAPACITY = 1000;  // 最多保留的事件数
+const EVENT_LIST_OVERSCAN = 4;     // 可视区域上下额外渲染的行数
+const EVENT_HIGHLIGHT_MS = 2000;   // 新事件高亮时长
+const STATS_THROTTLE_MS = 500;     // 统计与排行的最短刷新间隔
+const SERVER_SILENCE_MS = 60000;   // 超过该时长收不到服务端消息（包括心跳）时重连
+const TOOLS_RANKING_SHOWN = 5;     // 排行中显示的条数
+
+// 活动图表窗口，与服务端 /api/activity 的窗口定义一致
+const CHART_WINDOWS = {
+    '1m': { bucketMs: 1000, size: 60 },
+    '1h': { bucketMs: 60000, size: 60 },
+    '24h': { bucketMs: 900000, size: 96 },
+};
+
+// 带内容指纹的静态资源地址（服务端渲染看板时注入），没有时使用原始地址
+function assetUrl(path) {
+    return (window.ASSET_URLS && window.ASSET_URLS[path]) || `/static/${path}`;
+}
+
+/**
+ * 活动时间序列：定长类型化数组环形分桶，每个槽位记录所属的桶序号
+ */
+class ActivitySeries {
+    constructor(bucketMs, size) {
+        this.bucketMs = bucketMs;
+        this.size = size;
+        this.counts = new Uint32Array(size);
+        this.buckets = new Float64Array(size).fill(-1);
+    }
+
+    currentBucket(nowMs) {
+        return Math.floor(nowMs / this.bucketMs);
+    }
+
+    add(timeMs) {
+        const bucket = this.currentBucket(timeMs);
+        const slot = bucket % this.size;
+        if (this.buckets[slot] !== bucket) {
+            this.buckets[slot] = bucket;
+            this.counts[slot] = 0;
+        }
+        this.counts[slot]++;
+    }
+
+    // 载入服务端快照：counts 最旧在前，end 为最新一个桶的起始时间（秒）
+    load(data) {
+        this.counts.fill(0);
+        this.buckets.fill(-1);
+        const endBucket = Math.floor(data.end * 1000 / this.bucketMs);
+        const counts = data.counts || [];
+        counts.forEach((count, i) => {
+            const bucket = endBucket - counts.length + 1 + i;
+            const slot = bucket % this.size;
+            this.buckets[slot] = bucket;
+            this.counts[slot] = count;
+        });
+    }
+
+    // 按时间顺序（最旧在前）写入 out，返回窗口内的最大值
+    fill(nowMs, out) {
+        const current = this.currentBucket(nowMs);
+        let max = 0;
+        for (let i = 0; i < this.size; i++) {
+            const bucket = current - this.size + 1 + i;
+            const slot = bucket % this.size;
+            const value = this.buckets[slot] === bucket ? this.counts[slot] : 0;
+            out[i] = value;
+            if (value > max) max = value;
+        }
+        return max;
+    }
+}
+
+/**
+ * 定长环形缓冲：写满后覆盖最旧的记录，get(0) 为最新记录
+ */
+class EventRing {
+    constructor(capacity) {
+        this.capacity = capacity;
+        this.items = new Array(capacity);
+        this.head = capacity - 1;
+        this.length = 0;
+    }
+
+    push(item) {
+        this.head = (this.head + 1) % this.capacity;
+        this.items[this.head] = item;
+        if (this.length < this.capacity) this.length++;
+    }
+
+    get(index) {
+        return this.items[(this.head - index + this.capacity) % this.capacity];
+    }
+
+    clear() {
+        this.items = new Array(this.capacity);
+        this.head = this.capacity - 1;
+        this.length = 0;
+    }
+}
+
 class ClaudeMonitor {
     constructor() {
         this.ws = null;
-        this.events = [];
-        this.todos = [];
+        this.events = new EventRing(EVENT_RING_CAPACITY);
+        // 按帧批量处理：WebSocket 消息先进入缓冲，每个动画帧统一渲染一次
+        this.pendingEvents = [];
+        this.frameScheduled = false;
+        this.eventRows = [];
+        this.highlightTimer = null;
+        this.statsTimer = null;
+        this.lastStatsUpdate = 0;
+        this.todos = {};  // 会话 ID -> 任务列表（'' 为手动提交的全局列表）
         this.sessions = {};  // 存储会话信息
         this.stats = {
             total_events: 0,
             events_by_type: {},
-            tools_used: {}
+            tools_top: []  // 服务端排好序的工具排行 [{name, count, error}]，随 stats 消息更新
         };
         this.soundEnabled = true;
         this.isPaused = false;
         this.startTime = Date.now();
-        this.activityData = [];
+        // 断线续传：最后收到的事件序号及其所属的序号空间
+        this.lastSeq = null;
+        this.epoch = null;
+        this.pingTimer = null;
 
         this.init();
     }
 
     init() {
+        this.initEventList();
         this.initParticles();
         this.initWebSocket();
         this.initEventListeners();
@@ -46,7 +160,11 @@ class ClaudeMonitor {
     // WebSocket 连接
     initWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/ws`;
+        let wsUrl = `${protocol}//${window.location.host}/ws`;
+        if (this.lastSeq !== null && this.epoch) {
+            // 重连时带上最后的序号，服务端只补发缺失的事件
+            wsUrl += `?since=${this.lastSeq}&epoch=${encodeURIComponent(this.epoch)}`;
+        }
         this.ws = new WebSocket(wsUrl);
 
         this.ws.onopen = () => {
@@ -57,23 +175,29 @@ class ClaudeMonitor {
         this.ws.onclose = () => {
             this.updateConnectionStatus(false);
             this.showSubtitle('连接已断开，正在重连...', 'error');
-            setTimeout(() => this.initWebSocket(), 3000);
+            // 随机抖动，避免服务重启后所有看板同时重连
+            setTimeout(() => this.initWebSocket(), 2000 + Math.random() * 3000);
         };
 
         this.ws.onerror = (error) => {
             console.error('WebSocket error:', error);
         };
 
+        this.lastMessageAt = Date.now();
         this.ws.onmessage = (event) => {
+            this.lastMessageAt = Date.now();
             const message = JSON.parse(event.data);
             this.handleMessage(message);
         };
 
-        setInterval(() => {
-            if (this.ws.readyState === WebSocket.OPEN) {
-                this.ws.send(JSON.stringify({ type: 'ping' }));
-            }
-        }, 30000);
+        // 心跳由服务端发起；长时间收不到任何消息（包括心跳）说明连接已失效，主动断开重连
+        if (!this.pingTimer) {
+            this.pingTimer = setInterval(() => {
+                if (this.ws.readyState === WebSocket.OPEN && Date.now() - this.lastMessageAt > SERVER_SILENCE_MS) {
+                    this.ws.close();
+                }
+            }, 5000);
+        }
     }
 
     updateConnectionStatus(connected) {
@@ -94,22 +218,44 @@ class ClaudeMonitor {
 
     handleMessage(message) {
         switch (message.type) {
+            case 'ping':
+                // 回应服务端心跳，服务端据此计算延迟并清理失效连接
+                if (this.ws.readyState === WebSocket.OPEN) {
+                    this.ws.send(JSON.stringify({ type: 'pong', data: message.data }));
+                }
+                break;
             case 'init':
                 this.handleInit(message.data);
                 break;
+            case 'state':
+                this.handleState(message.data);
+                break;
+            case 'resume':
+                this.handleResume(message.data);
+                break;
             case 'event':
                 this.handleEvent(message.data);
                 break;
-            case 'todos':
-                this.handleTodos(message.data);
+            case 'todo_diff':
+                this.handleTodoDiff(message.data);
                 break;
             case 'sessions':
                 this.handleSessions(message.data);
                 break;
+            case 'usage':
+                this.handleUsage(message.data);
+                break;
+            case 'stats':
+                this.handleStats(message.data);
+                break;
         }
     }
 
     handleInit(data) {
+        // 完整快照会替换当前的事件列表
+        this.events.clear();
+        this.pendingEvents = [];
+        this.updateSeq(data);
         if (data.stats) {
             // 直接使用后端的统计数据，不需要前端重新统计
             this.stats = data.stats;
@@ -118,8 +264,9 @@ class ClaudeMonitor {
         if (data.history) {
             // 只显示历史事件，不重新统计（统计由后端完成）
             data.history.forEach(event => {
-                this.addEventToList(event, false);
+                this.events.push({ event, arrivedAt: 0 });
             });
+            this.scheduleFrame();
         }
         if (data.todos) {
             this.handleTodos(data.todos);
@@ -127,10 +274,50 @@ class ClaudeMonitor {
         if (data.sessions) {
             this.handleSessions(data.sessions);
         }
+        if (data.usage) {
+            this.handleUsage(data.usage);
+        }
+        // 用服务端的活动时间线覆盖本地数据（页面打开前的活动也能看到）
+        this.loadActivity(this.chartWindow);
+    }
+
+    handleState(data) {
+        // 断线续传：先收到最新状态，随后是缺失的事件
+        this.updateSeq(data);
+        if (data.stats) {
+            this.stats = data.stats;
+            this.updateStats();
+        }
+        if (data.todos) {
+            this.handleTodos(data.todos);
+        }
+        if (data.sessions) {
+            this.handleSessions(data.sessions);
+        }
+        if (data.usage) {
+            this.handleUsage(data.usage);
+        }
+    }
+
+    handleResume(data) {
+        (data.events || []).forEach(event => {
+            this.events.push({ event, arrivedAt: 0 });
+        });
+        this.updateSeq(data);
+        this.scheduleFrame();
+    }
+
+    updateSeq(data) {
+        if (data.epoch) this.epoch = data.epoch;
+        if (typeof data.seq === 'number') this.lastSeq = data.seq;
     }
 
     handleSessions(sessions) {
         this.sessions = sessions;
+        // 会话结束或过期后，它的任务列表也随之移除
+        Object.keys(this.todos).forEach(sessionId => {
+            if (sessionId !== '' && !this.sessions[sessionId]) delete this.todos[sessionId];
+        });
         this.updateSessionsDisplay();
     }
 
@@ -159,57 +346,156 @@ class ClaudeMonitor {
     }
 
     handleEvent(event) {
+        this.updateSeq(event);
         if (this.isPaused) return;
-        this.events.unshift(event);
-        this.addEventToList(event, true);
-        this.addActivityPoint();
 
-        // 获取会话标签
-        const sessionLabel = this.getSessionLabel(event);
-        const eventName = this.getEventDisplayName(event.event_type);
-        const summary = this.getEventSummary(event);
-
-        // 字幕显示包含会话信息
-        const subtitleText = sessionLabel
-            ? `${sessionLabel} ${eventName}: ${summary}`
-            : `${eventName}: ${summary}`;
-        this.showSubtitle(subtitleText, 'info');
+        // 只做计数，渲染推迟到下一个动画帧统一进行
+        this.pendingEvents.push(event);
+        if (this.pendingEvents.length > EVENT_RING_CAPACITY) {
+            // 标签页在后台时 requestAnimationFrame 不执行，缓冲只保留能显示的部分
+            this.pendingEvents.splice(0, this.pendingEvents.length - EVENT_RING_CAPACITY);
+        }
+        this.scheduleFrame();
+        this.addActivityPoint();
 
         // 音频播放由后端 claude_hooks.py 处理，前端不再播放
         // if (this.soundEnabled) {
         //     this.playEventSound(event.event_type);
         // }
+        // 异常告警由监控平台产生，没有对应的 hook，由看板按服务端的开关播放提醒音
+        if (event.event_type === 'AgentAlert' && event.sound && this.soundEnabled) {
+            this.playEventSound('AgentAlert');
+        }
 
+        // 事件计数先在本地累加，工具排行只使用服务端定期推送的 stats
         this.stats.total_events++;
         const type = event.event_type;
         this.stats.events_by_type[type] = (this.stats.events_by_type[type] || 0) + 1;
-
-        if (type === 'PreToolUse' || type === 'PostToolUse') {
-            // tool_name 在 event.data 中
-            const toolName = (event.data && event.data.tool_name) || 'unknown';
-            this.stats.tools_used[toolName] = (this.stats.tools_used[toolName] || 0) + 1;
-        }
-        this.updateStats();
+        this.scheduleStatsUpdate();
     }
 
     handleTodos(todos) {
-        this.todos = todos;
+        this.todos = Array.isArray(todos) ? { '': todos } : (todos || {});
         this.renderTodos();
+        this.renderSessions();
+    }
+
+    // 逐项应用任务变化：新增、修改、删除，必要时按服务端顺序重排
+    handleTodoDiff(diff) {
+        const sessionId = diff.session_id || '';
+        const byKey = new Map((this.todos[sessionId] || []).map(item => [item.key, item]));
+        (diff.removed || []).forEach(key => byKey.delete(key));
+        (diff.changed || []).forEach(item => byKey.set(item.key, item));
+        (diff.added || []).forEach(item => byKey.set(item.key, item));
+
+        const items = diff.order
+            ? diff.order.map(key => byKey.get(key)).filter(Boolean)
+            : Array.from(byKey.values());
+        if (items.length > 0) {
+            this.todos[sessionId] = items;
+        } else {
+            delete this.todos[sessionId];
+        }
+
+        if (sessionId === '') {
+            this.renderTodos();
+        } else {
+            this.renderSessions();
+        }
     }
 
     // 事件列表渲染
-    addEventToList(event, isNew) {
-        const list = document.getElementById('event-list');
-        const item = document.createElement('div');
-        item.className = `event-item ${isNew ? 'new' : ''}`;
-        item.dataset.type = event.event_type;
+    initEventList() {
+        this.eventList = document.getElementById('event-list');
+        // .panel-body 是事件列表的滚动容器
+        this.eventViewport = this.eventList.parentElement;
+        this.eventViewport.addEventListener('scroll', () => this.scheduleFrame(), { passive: true });
+        window.addEventListener('resize', () => this.scheduleFrame());
+    }
+
+    scheduleFrame() {
+        if (this.frameScheduled) return;
+        this.frameScheduled = true;
+        requestAnimationFrame(() => {
+            this.frameScheduled = false;
+            this.flushPendingEvents();
+            this.renderEventList();
+        });
+    }
 
+    flushPendingEvents() {
+        const batch = this.pendingEvents;
+        if (batch.length === 0) return;
+        this.pendingEvents = [];
+
+        const now = Date.now();
+        batch.forEach(event => this.events.push({ event, arrivedAt: now }));
+
+        // 用户向下滚动查看时，保持当前可见的内容不跳动
+        if (this.eventViewport.scrollTop > 0) {
+            this.eventViewport.scrollTop += batch.length * EVENT_ROW_HEIGHT;
+        }
+
+        // 字幕只显示本帧最新的事件
+        const latest = batch[batch.length - 1];
+        const sessionLabel = this.getSessionLabel(latest);
+        const eventName = this.getEventDisplayName(latest.event_type);
+        const summary = this.getEventSummary(latest);
+        // 字幕显示包含会话信息
+        const subtitleText = sessionLabel
+            ? `${sessionLabel} ${eventName}: ${summary}`
+            : `${eventName}: ${summary}`;
+        this.showSubtitle(this.escapeHtml(subtitleText), 'info');
+
+        // 高亮到期后再渲染一次，去掉 new 样式（只用一个定时器）
+        clearTimeout(this.highlightTimer);
+        this.highlightTimer = setTimeout(() => this.scheduleFrame(), EVENT_HIGHLIGHT_MS);
+    }
+
+    renderEventList() {
+        const total = this.events.length;
+        this.eventList.style.height = `${total * EVENT_ROW_HEIGHT}px`;
+
+        const scrollTop = this.eventViewport.scrollTop;
+        const viewportHeight = this.eventViewport.clientHeight;
+        const first = Math.max(0, Math.floor(scrollTop / EVENT_ROW_HEIGHT) - EVENT_LIST_OVERSCAN);
+        const last = Math.min(total, Math.ceil((scrollTop + viewportHeight) / EVENT_ROW_HEIGHT) + EVENT_LIST_OVERSCAN);
+
+        // 行元素复用：数量只取决于可视区域高度
+        while (this.eventRows.length < last - first) {
+            const row = document.createElement('div');
+            row.className = 'event-item';
+            this.eventList.appendChild(row);
+            this.eventRows.push(row);
+        }
+
+        const now = Date.now();
+        this.eventRows.forEach((row, i) => {
+            const index = first + i;
+            if (index >= last) {
+                row.style.display = 'none';
+                row.record = null;
+                return;
+            }
+            const record = this.events.get(index);
+            row.style.display = '';
+            row.style.top = `${index * EVENT_ROW_HEIGHT}px`;
+            if (row.record !== record) {
+                row.record = record;
+                row.dataset.type = record.event.event_type;
+                row.innerHTML = this.renderEventRow(record.event);
+            }
+            row.classList.toggle('new', now - record.arrivedAt < EVENT_HIGHLIGHT_MS);
+        });
+    }
+
+    renderEventRow(event) {
         const icon = this.getEventIcon(event.event_type);
         const time = this.formatTime(event.timestamp);
-        const details = this.getEventDetails(event);
-        const sessionLabel = this.getSessionLabel(event);
+        const details = this.escapeHtml(this.getEventDetails(event));
+        const sessionLabel = this.escapeHtml(this.getSessionLabel(event));
 
-        item.innerHTML = `
+        return `
             <div class="event-header">
                 <span class="event-type">
                     <span class="event-type-icon">${icon}</span>
@@ -220,17 +506,20 @@ class ClaudeMonitor {
             </div>
             <div class="event-details">${details}</div>
         `;
+    }
 
-        list.insertBefore(item, list.firstChild);
-        if (isNew) setTimeout(() => item.classList.remove('new'), 2000);
-        while (list.children.length > 100) list.removeChild(list.lastChild);
+    escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, c => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        }[c]));
     }
 
     getEventIcon(type) {
         const icons = {
             'PreToolUse': '🔧', 'PostToolUse': '✅', 'UserPromptSubmit': '💬',
             'Stop': '🏁', 'SubagentStop': '🤖', 'SessionStart': '🚀',
-            'SessionEnd': '👋', 'Notification': '🔔', 'PermissionRequest': '🔐', 'PreCompact': '📦'
+            'SessionEnd': '👋', 'Notification': '🔔', 'PermissionRequest': '🔐', 'PreCompact': '📦',
+            'AgentAlert': '🚨'
         };
         return icons[type] || '📌';
     }
@@ -239,16 +528,24 @@ class ClaudeMonitor {
         const names = {
             'PreToolUse': '工具调用', 'PostToolUse': '工具完成', 'UserPromptSubmit': '用户输入',
             'Stop': '响应完成', 'SubagentStop': '子代理完成', 'SessionStart': '会话开始',
-            'SessionEnd': '会话结束', 'Notification': '通知', 'PermissionRequest': '权限请求', 'PreCompact': '上下文压缩'
+            'SessionEnd': '会话结束', 'Notification': '通知', 'PermissionRequest': '权限请求', 'PreCompact': '上下文压缩',
+            'AgentAlert': '异常告警'
         };
         return names[type] || type;
     }
 
     getEventDetails(event) {
         const data = event.data || {};
+        const policy = event.policy && event.policy.decision ? ` [策略: ${event.policy.decision}]` : '';
         if (event.event_type === 'PreToolUse' || event.event_type === 'PostToolUse') {
             const toolName = data.tool_name || '未知';
-            return `工具: ${toolName}`;
+            return `工具: ${toolName}${policy}`;
+        }
+        if (event.event_type === 'PermissionRequest' && policy) {
+            return `工具: ${data.tool_name || '未知'}${policy}`;
+        }
+        if (event.event_type === 'AgentAlert') {
+            return data.message || data.kind || '';
         }
         if (event.event_type === 'UserPromptSubmit') {
             const prompt = data.prompt || '';
@@ -270,7 +567,17 @@ class ClaudeMonitor {
         return date.toLocaleTimeString('zh-CN', { hour: '2-digit', minute: '2-digit', second: '2-digit' });
     }
 
-    // 统计更新
+    // 统计更新（节流：高频事件下最多每 STATS_THROTTLE_MS 刷新一次）
+    scheduleStatsUpdate() {
+        if (this.statsTimer) return;
+        const wait = Math.max(0, this.lastStatsUpdate + STATS_THROTTLE_MS - Date.now());
+        this.statsTimer = setTimeout(() => {
+            this.statsTimer = null;
+            this.lastStatsUpdate = Date.now();
+            this.updateStats();
+        }, wait);
+    }
+
     updateStats() {
         document.getElementById('total-events').textContent = this.stats.total_events;
         ['PreToolUse', 'UserPromptSubmit', 'Stop', 'SubagentStop'].forEach(type => {
@@ -280,14 +587,21 @@ class ClaudeMonitor {
         this.updateToolsRanking();
     }
 
+    // 服务端定期推送的统计信息（已排好序的工具排行），替换本地计数
+    handleStats(stats) {
+        if (this.isPaused) return;
+        this.stats = stats;
+        this.scheduleStatsUpdate();
+    }
+
     updateToolsRanking() {
         const container = document.getElementById('tools-ranking');
-        const tools = Object.entries(this.stats.tools_used).sort((a, b) => b[1] - a[1]).slice(0, 5);
+        const tools = (this.stats.tools_top || []).slice(0, TOOLS_RANKING_SHOWN);
         if (tools.length === 0) {
             container.innerHTML = '<div class="ranking-empty">暂无数据</div>';
             return;
         }
-        container.innerHTML = tools.map(([name, count]) => `
+        container.innerHTML = tools.map(({ name, count }) => `
             <div class="ranking-item">
                 <span class="ranking-name">${name}</span>
                 <span class="ranking-count">${count}</span>
@@ -295,6 +609,39 @@ class ClaudeMonitor {
         `).join('');
     }
 
+    // Token 用量汇总（总量、缓存命中率、费用和模型分布）
+    handleUsage(usage) {
+        const container = document.getElementById('usage-summary');
+        if (!container) return;
+        const totals = usage.totals || {};
+        if (!totals.messages) {
+            container.innerHTML = '<div class="ranking-empty">暂无数据</div>';
+            return;
+        }
+        const rows = [
+            ['输入', this.formatTokens(totals.input_tokens + totals.cache_creation_tokens + totals.cache_read_tokens)],
+            ['输出', this.formatTokens(totals.output_tokens)],
+            ['缓存命中率', `${(totals.cache_hit_ratio * 100).toFixed(1)}%`],
+            ['费用', `$${totals.cost.toFixed(2)}`],
+        ];
+        Object.entries(usage.by_model || {})
+            .sort((a, b) => b[1].cost - a[1].cost)
+            .slice(0, 3)
+            .forEach(([model, t]) => rows.push([model, `$${t.cost.toFixed(2)}`]));
+        container.innerHTML = rows.map(([name, value]) => `
+            <div class="ranking-item">
+                <span class="ranking-name">${this.escapeHtml(name)}</span>
+                <span class="ranking-count">${value}</span>
+            </div>
+        `).join('');
+    }
+
+    formatTokens(count) {
+        if (count >= 1e6) return `${(count / 1e6).toFixed(1)}M`;
+        if (count >= 1e3) return `${(count / 1e3).toFixed(1)}K`;
+        return String(count || 0);
+    }
+
     // 会话列表渲染
     renderSessions() {
         const container = document.getElementById('session-list');
@@ -355,13 +702,39 @@ class ClaudeMonitor {
                             <span class="detail-label">🕐</span>
                             <span class="detail-value">${lastEventTime}</span>
                         </div>
+                        <div class="session-detail-item">
+                            <span class="detail-label">🧵</span>
+                            <span class="detail-value">
+                                <a class="trace-link" href="/api/sessions/${encodeURIComponent(sessionId)}/trace?format=chrome" title="Chrome trace / Perfetto">Chrome</a>
+                                <a class="trace-link" href="/api/sessions/${encodeURIComponent(sessionId)}/trace?format=otlp" title="OTLP JSON">OTLP</a>
+                            </span>
+                        </div>
                     </div>
+                    ${this.renderSessionTodos(sessionId)}
                 </div>
             `;
         }).join('');
     }
 
-    // 任务列表渲染 (保留以防后续需要)
+    // 会话的任务列表（来自 TodoWrite）
+    renderSessionTodos(sessionId) {
+        const todos = this.todos[sessionId];
+        if (!todos || todos.length === 0) return '';
+        const completed = todos.filter(t => t.status === 'completed').length;
+        return `
+            <div class="session-todos">
+                <div class="session-todos-progress">📋 ${completed}/${todos.length}</div>
+                ${todos.map(todo => `
+                    <div class="todo-item" data-status="${todo.status}">
+                        <span class="todo-icon">${this.getTodoIcon(todo.status)}</span>
+                        <span class="todo-text">${this.escapeHtml(todo.status === 'in_progress' && todo.activeForm ? todo.activeForm : todo.content)}</span>
+                    </div>
+                `).join('')}
+            </div>
+        `;
+    }
+
+    // 全局任务列表渲染（POST /api/todos 未指定会话时提交的列表，保留以防后续需要）
     renderTodos() {
         const container = document.getElementById('todo-list');
         const progressText = document.getElementById('todo-progress-text');
@@ -370,19 +743,20 @@ class ClaudeMonitor {
         // 如果元素不存在，直接返回
         if (!container) return;
 
-        if (!this.todos || this.todos.length === 0) {
+        const todos = this.todos[''] || [];
+        if (todos.length === 0) {
             container.innerHTML = '<div class="todo-empty"><div class="empty-icon">📋</div><p>暂无任务</p></div>';
             if (progressText) progressText.textContent = '0/0';
             if (progressBar) progressBar.style.width = '0%';
             return;
         }
 
-        const completed = this.todos.filter(t => t.status === 'completed').length;
-        const total = this.todos.length;
+        const completed = todos.filter(t => t.status === 'completed').length;
+        const total = todos.length;
         if (progressText) progressText.textContent = `${completed}/${total}`;
         if (progressBar) progressBar.style.width = `${total > 0 ? (completed / total * 100) : 0}%`;
 
-        container.innerHTML = this.todos.map(todo => `
+        container.innerHTML = todos.map(todo => `
             <div class="todo-item" data-status="${todo.status}">
                 <span class="todo-icon">${this.getTodoIcon(todo.status)}</span>
                 <span class="todo-text">${todo.status === 'in_progress' ? todo.activeForm : todo.content}</span>
@@ -422,13 +796,14 @@ class ClaudeMonitor {
             'SessionEnd': 'session_end.wav',
             'Notification': 'notification.wav',
             'PermissionRequest': 'permission_request.wav',
-            'PreCompact': 'pre_compact.wav'
+            'PreCompact': 'pre_compact.wav',
+            'AgentAlert': 'notification.wav'
         };
 
         const audioFile = audioFiles[eventType];
         if (audioFile) {
             // 尝试播放音频文件
-            const audio = new Audio(`/static/audio/${audioFile}`);
+            const audio = new Audio(assetUrl(`audio/${audioFile}`));
             audio.volume = 0.5;
             audio.play().catch(() => {
                 // 如果音频文件不存在，使用 Web Audio API 生成提示音
@@ -469,47 +844,124 @@ class ClaudeMonitor {
     initActivityChart() {
         this.canvas = document.getElementById('activity-canvas');
         this.ctx = this.canvas.getContext('2d');
-        this.activityData = new Array(60).fill(0);
-        this.drawActivityChart();
-        setInterval(() => this.drawActivityChart(), 1000);
+        this.chartWindow = '1m';
+        this.activitySeries = {};
+        let maxSize = 0;
+        Object.entries(CHART_WINDOWS).forEach(([name, config]) => {
+            this.activitySeries[name] = new ActivitySeries(config.bucketMs, config.size);
+            maxSize = Math.max(maxSize, config.size);
+        });
+        this.chartValues = new Float64Array(maxSize);
+        this.chartWidth = 0;
+        this.chartHeight = 0;
+        this.chartDirty = true;
+        this.chartDrawScheduled = false;
+        this.chartBucket = -1;
+        this.chartHasData = false;
+
+        // 只在容器尺寸变化时调整画布（设置 canvas.width 会重新分配缓冲区）
+        new ResizeObserver(entries => {
+            const rect = entries[0].contentRect;
+            this.resizeActivityChart(rect.width, rect.height);
+        }).observe(this.canvas.parentElement);
+
+        document.querySelectorAll('.chart-window').forEach(button => {
+            button.addEventListener('click', () => this.setChartWindow(button.dataset.window));
+        });
+
+        // 时间窗口滑动到新的桶且窗口内有数据时才需要重绘
+        setInterval(() => {
+            const series = this.activitySeries[this.chartWindow];
+            if (this.chartHasData && series.currentBucket(Date.now()) !== this.chartBucket) {
+                this.markChartDirty();
+            }
+        }, 1000);
+    }
+
+    resizeActivityChart(width, height) {
+        const ratio = window.devicePixelRatio || 1;
+        this.chartWidth = width;
+        this.chartHeight = height;
+        this.canvas.width = Math.round(width * ratio);
+        this.canvas.height = Math.round(height * ratio);
+        this.ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        this.markChartDirty();
+    }
+
+    setChartWindow(name) {
+        if (!CHART_WINDOWS[name]) return;
+        this.chartWindow = name;
+        document.querySelectorAll('.chart-window').forEach(button => {
+            button.classList.toggle('active', button.dataset.window === name);
+        });
+        this.markChartDirty();
+        this.loadActivity(name);
+    }
+
+    async loadActivity(name) {
+        try {
+            const response = await fetch(`/api/activity?window=${name}`);
+            if (!response.ok) return;
+            this.activitySeries[name].load(await response.json());
+            if (name === this.chartWindow) this.markChartDirty();
+        } catch (error) {
+            console.error('加载活动时间线失败:', error);
+        }
     }
 
     addActivityPoint() {
-        this.activityData[this.activityData.length - 1]++;
+        const now = Date.now();
+        Object.values(this.activitySeries).forEach(series => series.add(now));
+        this.markChartDirty();
+    }
+
+    markChartDirty() {
+        this.chartDirty = true;
+        if (this.chartDrawScheduled) return;
+        this.chartDrawScheduled = true;
+        requestAnimationFrame(() => {
+            this.chartDrawScheduled = false;
+            this.drawActivityChart();
+        });
     }
 
     drawActivityChart() {
-        const canvas = this.canvas;
+        if (!this.chartDirty || this.chartWidth === 0) return;
+        this.chartDirty = false;
+
         const ctx = this.ctx;
-        canvas.width = canvas.parentElement.clientWidth;
-        canvas.height = canvas.parentElement.clientHeight;
-        const width = canvas.width, height = canvas.height, padding = 10;
+        const width = this.chartWidth, height = this.chartHeight, padding = 10;
+        const series = this.activitySeries[this.chartWindow];
+        const now = Date.now();
+        const values = this.chartValues.subarray(0, series.size);
+        const peak = series.fill(now, values);
+        const maxVal = Math.max(peak, 1);
+        this.chartBucket = series.currentBucket(now);
+        this.chartHasData = peak > 0;
+
         ctx.clearRect(0, 0, width, height);
-        this.activityData.shift();
-        this.activityData.push(0);
-        const maxVal = Math.max(...this.activityData, 1);
 
         // 绘制网格
         ctx.strokeStyle = 'rgba(0, 212, 255, 0.1)';
         ctx.lineWidth = 1;
+        ctx.beginPath();
         for (let i = 0; i < 5; i++) {
             const y = padding + (height - 2 * padding) * i / 4;
-            ctx.beginPath();
             ctx.moveTo(padding, y);
             ctx.lineTo(width - padding, y);
-            ctx.stroke();
         }
+        ctx.stroke();
 
         // 绘制折线
         ctx.strokeStyle = 'rgba(0, 212, 255, 0.8)';
         ctx.lineWidth = 2;
         ctx.beginPath();
-        const stepX = (width - 2 * padding) / (this.activityData.length - 1);
-        this.activityData.forEach((val, i) => {
+        const stepX = (width - 2 * padding) / (values.length - 1);
+        for (let i = 0; i < values.length; i++) {
             const x = padding + i * stepX;
-            const y = height - padding - (val / maxVal) * (height - 2 * padding);
+            const y = height - padding - (values[i] / maxVal) * (height - 2 * padding);
             i === 0 ? ctx.moveTo(x, y) : ctx.lineTo(x, y);
-        });
+        }
         ctx.stroke();
 
         // 渐变填充
@@ -558,8 +1010,9 @@ class ClaudeMonitor {
         });
 
         document.getElementById('clear-events').addEventListener('click', () => {
-            document.getElementById('event-list').innerHTML = '';
-            this.events = [];
+            this.events.clear();
+            this.pendingEvents = [];
+            this.scheduleFrame();
             this.showSubtitle('事件列表已清空', 'info');
         });
 
@@ -627,6 +1080,9 @@ class ClaudeMonitor {
                 checkbox.checked = dingtalkEvents.includes(checkbox.value);
             });
 
+            // 填充权限策略
+            await this.loadPolicy();
+
             // 显示弹窗
             document.getElementById('settings-modal').classList.add('active');
         } catch (error) {
@@ -635,6 +1091,41 @@ class ClaudeMonitor {
         }
     }
 
+    async loadPolicy() {
+        const response = await fetch('/api/policy');
+        const data = await response.json();
+        const policy = data.policy || {};
+        document.getElementById('policy-enabled').checked = policy.enabled || false;
+        document.getElementById('policy-rules').value = JSON.stringify(policy.rules || [], null, 2);
+
+        const stats = data.stats || {};
+        document.getElementById('policy-stats').textContent =
+            `自动决策 ${stats.total || 0} 次（权限请求 ${stats.auto_permissions || 0} 次），` +
+            `平均判断耗时 ${stats.avg_eval_ms || 0}ms，` +
+            `估计节省等待 ${Math.round(stats.estimated_saved_seconds || 0)} 秒`;
+    }
+
+    async savePolicy() {
+        let rules;
+        try {
+            rules = JSON.parse(document.getElementById('policy-rules').value || '[]');
+        } catch (error) {
+            throw new Error('权限策略规则不是有效的 JSON');
+        }
+        const response = await fetch('/api/policy', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                enabled: document.getElementById('policy-enabled').checked,
+                rules
+            })
+        });
+        const result = await response.json();
+        if (!response.ok || result.status !== 'ok') {
+            throw new Error(result.detail || result.message || '权限策略保存失败');
+        }
+    }
+
     closeSettings() {
         document.getElementById('settings-modal').classList.remove('active');
     }
@@ -643,7 +1134,8 @@ class ClaudeMonitor {
         // 收集音频开关配置
         const soundEnabled = {};
         ['PreToolUse', 'PostToolUse', 'PermissionRequest', 'UserPromptSubmit',
-         'Notification', 'Stop', 'SubagentStop', 'PreCompact', 'SessionStart', 'SessionEnd'].forEach(eventType => {
+         'Notification', 'Stop', 'SubagentStop', 'PreCompact', 'SessionStart', 'SessionEnd',
+         'AgentAlert'].forEach(eventType => {
             const checkbox = document.getElementById(`sound-${eventType}`);
             if (checkbox) {
                 soundEnabled[eventType] = checkbox.checked;
@@ -666,7 +1158,13 @@ class ClaudeMonitor {
             }
         };
 
-        // 保存配置
+        // 保存配置（先保存权限策略，规则有误时不关闭弹窗）
+        try {
+            await this.savePolicy();
+        } catch (error) {
+            this.showSubtitle(this.escapeHtml(error.message), 'error');
+            return;
+        }
         try {
             const response = await fetch('/api/config', {
                 method: 'POST',
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# monitor/ 下的模块以同级模块方式相互导入（from policy import ...）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
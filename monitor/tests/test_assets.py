@@ -0,0 +1,81 @@
+import pytest
+
+from assets import Asset, fingerprinted_name, negotiate_encoding, parse_range
+
+
+@pytest.mark.parametrize("header, available, expected", [
+    ("gzip, deflate, br", ("gzip", "br"), "br"),
+    ("gzip, deflate, br", ("gzip",), "gzip"),
+    ("br;q=0, gzip;q=0.5", ("gzip", "br"), "gzip"),
+    ("gzip;q=0", ("gzip",), None),
+    ("*", ("gzip",), "gzip"),
+    ("*;q=0.1, gzip;q=0", ("gzip", "br"), "br"),
+    ("GZIP", ("gzip",), "gzip"),
+    ("gzip;q=abc", ("gzip",), None),
+    ("identity", ("gzip",), None),
+    ("", ("gzip",), None),
+    ("gzip", (), None),
+])
+def test_negotiate_encoding(header, available, expected):
+    assert negotiate_encoding(header, available) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-1000", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=0-0, 50-59", (0, 0)),
+    ("bytes=-0", None),
+    ("bytes=100-", None),
+    ("bytes=5-2", None),
+    ("bytes=a-b", None),
+    ("items=0-9", None),
+    ("bytes=", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+def test_fingerprinted_name():
+    assert fingerprinted_name("css/style.css", "abc") == "css/style.abc.css"
+    assert fingerprinted_name("LICENSE", "abc") == "LICENSE.abc"
+    assert fingerprinted_name("v1.2/file", "abc") == "v1.2/file.abc"
+
+
+@pytest.fixture
+def asset():
+    return Asset("js/app.js", b"console.log('monitor');\n" * 100, "/static")
+
+
+def test_compressed_response_and_if_none_match(asset):
+    status, headers, body = asset.respond({"accept-encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip" and body == asset.encoded["gzip"]
+    assert headers["Vary"] == "Accept-Encoding"
+    etag = headers["ETag"]
+    assert asset.respond({"accept-encoding": "gzip", "if-none-match": etag})[0] == 304
+    assert asset.respond({"accept-encoding": "gzip", "if-none-match": f'"other", W/{etag}'})[0] == 304
+    assert asset.respond({"accept-encoding": "gzip", "if-none-match": "*"})[0] == 304
+    # 压缩版本的 ETag 与未压缩版本不同
+    assert asset.respond({"if-none-match": etag})[0] == 200
+
+
+def test_range_and_if_range(asset):
+    size = len(asset.content)
+    status, headers, body = asset.respond({"range": "bytes=0-9", "accept-encoding": "gzip"})
+    assert status == 206 and body == asset.content[:10]
+    assert headers["Content-Range"] == f"bytes 0-9/{size}" and "Content-Encoding" not in headers
+
+    status, headers, _ = asset.respond({"range": f"bytes={size}-"})
+    assert status == 416 and headers["Content-Range"] == f"bytes */{size}"
+
+    assert asset.respond({"range": "bytes=0-9", "if-range": asset.etag()})[0] == 206
+    # 资源已变化：忽略 Range，返回完整内容
+    status, _, body = asset.respond({"range": "bytes=0-9", "if-range": '"stale"'})
+    assert status == 200 and body == asset.content
+
+
+def test_immutable_cache_header(asset):
+    assert "immutable" in asset.respond({}, immutable=True)[1]["Cache-Control"]
+    assert asset.respond({})[1]["Cache-Control"] == "no-cache"
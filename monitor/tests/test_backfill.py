@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import backfill
+from backfill import TranscriptParser, pending_files
+
+SESSION = {"sessionId": "s1", "cwd": "/repo/app"}
+
+
+def user(uuid, timestamp, content):
+    return {"type": "user", "uuid": uuid, "timestamp": timestamp, "message": {"content": content}, **SESSION}
+
+
+def assistant(uuid, timestamp, content, stop_reason=None):
+    return {"type": "assistant", "uuid": uuid, "timestamp": timestamp,
+            "message": {"content": content, "stop_reason": stop_reason}, **SESSION}
+
+
+def feed_all(parser, entries):
+    return [event for entry in entries for event in parser.feed(entry)]
+
+
+ENTRIES = [
+    user("u1", "2026-01-01T00:00:00Z", "fix the bug"),
+    assistant("a1", "2026-01-01T00:00:01Z", [{"type": "tool_use", "id": "t1", "name": "Bash", "input": {"command": "ls"}}]),
+    user("u2", "2026-01-01T00:00:02Z", [{"type": "tool_result", "tool_use_id": "t1", "content": "a.py"}]),
+    assistant("a2", "2026-01-01T00:00:03Z", [{"type": "text", "text": "done"}], stop_reason="end_turn"),
+]
+
+
+def test_parser_generates_hook_events():
+    events = feed_all(TranscriptParser("/t.jsonl"), ENTRIES)
+    assert [e["event_type"] for e in events] == ["SessionStart", "UserPromptSubmit", "PreToolUse", "PostToolUse", "Stop"]
+    assert events[3]["data"]["tool_name"] == "Bash"
+    assert events[1]["data"]["prompt"] == "fix the bug"
+    assert events[0]["session"]["project_name"] == "app"
+    assert events[0]["timestamp"] == "2026-01-01T00:00:00+00:00"
+    # event_id 由记录确定，重复回填时相同
+    assert [e["event_id"] for e in feed_all(TranscriptParser("/t.jsonl"), ENTRIES)] == [e["event_id"] for e in events]
+
+
+def test_parser_resumes_from_state_and_closes_interrupted_turn():
+    first = TranscriptParser("/t.jsonl")
+    feed_all(first, ENTRIES[:2])
+    resumed = TranscriptParser("/t.jsonl", json.loads(json.dumps(first.state())))
+    events = feed_all(resumed, [ENTRIES[2], user("u3", "2026-01-01T00:01:00Z", "next")])
+    assert [e["event_type"] for e in events] == ["PostToolUse", "Stop", "UserPromptSubmit"]
+    assert events[0]["data"]["tool_name"] == "Bash"
+    assert [e["event_type"] for e in resumed.finish(idle=True)] == ["Stop"]
+
+
+def test_parser_since_filter():
+    parser = TranscriptParser("/t.jsonl", since=1767225602.0)
+    assert [e["event_type"] for e in feed_all(parser, ENTRIES)] == ["PostToolUse", "Stop"]
+
+
+def test_pending_files(tmp_path):
+    done, grown, rewritten, new, old = (tmp_path / f"{name}.jsonl" for name in ("done", "grown", "rewritten", "new", "old"))
+    for path in (done, grown, rewritten, new, old):
+        path.write_text("x" * 100)
+    os.utime(old, (1000, 1000))
+
+    def state(path, **changes):
+        stat = path.stat()
+        return {"offset": 100, "size": stat.st_size, "mtime": stat.st_mtime, **changes}
+
+    checkpoint = {"files": {
+        str(done): state(done),
+        str(grown): state(grown, offset=50, size=-1),
+        str(rewritten): state(rewritten, offset=200, size=200),
+    }}
+    pending = dict(pending_files([done, grown, rewritten, new, old], checkpoint, since=2000))
+    assert set(pending) == {str(grown), str(rewritten), str(new)}
+    assert pending[str(grown)]["offset"] == 50
+    assert pending[str(rewritten)] is None and pending[str(new)] is None
+
+
+def test_non_json_response_is_recorded_as_file_error(tmp_path, monkeypatch):
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            raise ValueError("not json")
+
+    class Client:
+        def __init__(self, **kwargs):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def post(self, *args, **kwargs):
+            return Response()
+
+    path = tmp_path / "t.jsonl"
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in ENTRIES))
+    monkeypatch.setattr(backfill.httpx, "Client", Client)
+    result = backfill.backfill_file(str(path), None, "http://monitor", None)
+    assert result["error"] == "not json"
+    assert result["state"]["size"] == -1 and result["state"]["offset"] == 0
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("MONITOR_PERSIST", "0")
+    import server
+    monkeypatch.setattr(server, "event_store", None)
+    return server
+
+
+def test_backfill_endpoint_skips_live_spans(server, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setitem(server.manager.live_spans, "live", [1767225600.0, 1767229200.0])
+    events = [
+        {"event_id": f"backfill-test-{n}", "event_type": "Stop", "timestamp": timestamp,
+         "session": {"session_id": session}}
+        for n, (session, timestamp) in enumerate([
+            ("live", "2026-01-01T00:30:00+00:00"),   # 实时上报过
+            ("live", "2026-01-01T00:00:05+00:00"),   # 在范围边缘的余量内
+            ("live", "2026-01-01T02:00:00+00:00"),   # 监控平台停止之后
+            ("other", "2026-01-01T00:30:00+00:00"),
+            ("other", "not a time"),
+        ])
+    ]
+    body = gzip.compress(json.dumps({"events": events}).encode("utf-8"))
+    response = TestClient(server.app).post("/api/backfill", content=body, headers={"Content-Encoding": "gzip"})
+    assert response.json() == {"status": "ok", "accepted": 2, "skipped": 3}
@@ -0,0 +1,44 @@
+import asyncio
+
+from connections import ConnectionStats
+
+
+def drain(stats):
+    items = []
+    while not stats.queue.empty():
+        item = stats.queue.get_nowait()
+        stats.dequeued(item)
+        items.append(item)
+    return items
+
+
+def test_full_queue_drops_replaceable_messages_and_resyncs():
+    async def scenario():
+        stats = ConnectionStats(1, queue_size=3)
+        assert stats.enqueue("e1", 2, seq=1, replaceable=True) is False
+        assert stats.enqueue("config", 6) is False
+        assert stats.enqueue("e2", 2, seq=2, replaceable=True) is False
+        assert stats.enqueue("e3", 2, seq=3, replaceable=True) is True
+        # 补发前新的可替代消息不再入队，其他消息照常入队
+        assert stats.enqueue("e4", 2, seq=4, replaceable=True) is False
+        stats.enqueue("pong", 4)
+        items = drain(stats)
+        assert [item[0] for item in items] == [None, "config", "pong"]
+        assert stats.resyncs == 1 and stats.resync_pending is False
+        stats.enqueue("e5", 2, seq=5, replaceable=True)
+        assert [item[0] for item in drain(stats)] == ["e5"]
+
+    asyncio.run(scenario())
+
+
+def test_state_messages_are_coalesced_until_sent():
+    async def scenario():
+        stats = ConnectionStats(1, queue_size=10)
+        stats.enqueue("sessions-1", 10, replaceable=True, coalesce="sessions")
+        stats.enqueue("e1", 2, seq=1, replaceable=True)
+        stats.enqueue("sessions-2", 10, replaceable=True, coalesce="sessions")
+        assert [item[0] for item in drain(stats)] == ["sessions-2", "e1"]
+        stats.enqueue("sessions-3", 10, replaceable=True, coalesce="sessions")
+        assert [item[0] for item in drain(stats)] == ["sessions-3"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+import uuid
+
+from dedup import DedupWindow, uuid7
+
+
+def test_duplicate_within_ttl():
+    window = DedupWindow(ttl=10, max_size=100)
+    assert window.seen("a", now=0) is False
+    assert window.seen("a", now=5) is True
+    assert window.status()["duplicates"] == 1
+
+
+def test_expired_id_is_accepted_again():
+    window = DedupWindow(ttl=10, max_size=100)
+    window.seen("a", now=0)
+    window.seen("b", now=8)
+    assert window.seen("a", now=10) is False
+    assert window.seen("b", now=11) is True
+    assert window.status()["size"] == 2
+
+
+def test_capacity_evicts_oldest():
+    window = DedupWindow(ttl=600, max_size=3)
+    for index, event_id in enumerate("abcd"):
+        assert window.seen(event_id, now=index) is False
+    assert window.status()["size"] == 3
+    assert window.seen("a", now=5) is False
+    assert window.seen("d", now=5) is True
+
+
+def test_uuid7_version_and_order():
+    ids = [uuid7() for _ in range(100)]
+    assert all(uuid.UUID(value).version == 7 for value in ids)
+    assert len(set(ids)) == len(ids)
+    # 前 48 位是毫秒时间戳，按字符串排序即按生成时间排序
+    assert [value[:13] for value in ids] == sorted(value[:13] for value in ids)
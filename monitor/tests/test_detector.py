@@ -0,0 +1,91 @@
+from detector import (ALERT_COOLDOWN, FILE_LOOP_REPEAT, LOOP_REPEAT, RATE_WARMUP_SECONDS, STALL_SECONDS,
+                      TURN_MAX_SECONDS, AgentDetector)
+
+T0 = 1_000_000.0
+
+
+def event(event_type, seq=0, session="s1", **data):
+    return {"event_type": event_type, "seq": seq, "session": {"session_id": session}, "data": data}
+
+
+def kinds(alerts):
+    return [alert["kind"] for alert in alerts]
+
+
+def test_repeated_call_raises_loop_once_per_cooldown():
+    detector = AgentDetector()
+    call = event("PreToolUse", tool_name="Bash", tool_input={"command": "ls"})
+    results = [kinds(detector.observe(call, T0 + i, T0 + i)) for i in range(LOOP_REPEAT + 2)]
+    assert results[LOOP_REPEAT - 2] == []
+    assert results[LOOP_REPEAT - 1] == ["loop"]
+    assert results[LOOP_REPEAT:] == [[], []]
+    later = T0 + ALERT_COOLDOWN + LOOP_REPEAT
+    assert kinds(detector.observe(call, later, later)) == ["loop"]
+
+
+def test_new_prompt_resets_loop_window():
+    detector = AgentDetector()
+    call = event("PreToolUse", tool_name="Bash", tool_input={"command": "ls"})
+    for i in range(LOOP_REPEAT - 1):
+        detector.observe(call, T0 + i, T0 + i)
+    detector.observe(event("UserPromptSubmit"), T0 + 10, T0 + 10)
+    assert detector.observe(call, T0 + 11, T0 + 11) == []
+
+
+def test_same_file_with_different_edits_is_file_loop():
+    detector = AgentDetector()
+    alerts = []
+    for i in range(FILE_LOOP_REPEAT):
+        edit = event("PreToolUse", tool_name="Edit", tool_input={"file_path": "/a.py", "old_string": str(i)})
+        alerts += detector.observe(edit, T0 + i, T0 + i)
+    assert kinds(alerts) == ["file_loop"]
+    assert alerts[0]["file_path"] == "/a.py"
+
+
+def test_rate_spike_after_warmup():
+    detector = AgentDetector()
+    now = T0
+    # 平时每 30 秒一个事件
+    for _ in range(20):
+        assert detector.observe(event("Notification"), now, now) == []
+        now += 30
+    assert now - T0 >= RATE_WARMUP_SECONDS
+    alerts = []
+    for i in range(60):
+        alerts += detector.observe(event("PostToolUse", tool_name=f"t{i}"), now + i * 0.1, now + i * 0.1)
+    assert kinds(alerts) == ["rate_spike"]
+
+
+def test_stall_uses_receive_time():
+    detector = AgentDetector()
+    # 客户端时钟比服务端慢一小时，按事件时间计算会立即判为卡住
+    detector.observe(event("UserPromptSubmit", seq=1), T0 - 3600, T0)
+    detector.observe(event("PreToolUse", seq=2, tool_name="Bash"), T0 - 3500, T0 + 100)
+    assert detector.check(T0 + 100 + STALL_SECONDS - 1) == []
+    alerts = detector.check(T0 + 100 + STALL_SECONDS)
+    assert kinds(alerts) == ["stall"] and alerts[0]["alert_id"] == "s1:stall:2"
+    assert detector.check(T0 + 100 + STALL_SECONDS + 60) == []
+
+
+def test_waiting_for_user_and_finished_turns_do_not_stall():
+    detector = AgentDetector()
+    detector.observe(event("UserPromptSubmit"), T0, T0)
+    detector.observe(event("PermissionRequest"), T0 + 1, T0 + 1)
+    assert detector.check(T0 + STALL_SECONDS * 2) == []
+    detector.observe(event("Stop"), T0 + 2, T0 + 2)
+    assert detector.check(T0 + TURN_MAX_SECONDS * 2) == []
+
+
+def test_long_turn_and_cooldown():
+    detector = AgentDetector()
+    detector.observe(event("UserPromptSubmit", seq=5), T0, T0)
+    now = T0
+    alerts = []
+    # 每 5 分钟有一个事件，不算卡住，但整轮持续过久
+    while now < T0 + TURN_MAX_SECONDS + ALERT_COOLDOWN:
+        now += 300
+        detector.observe(event("PostToolUse", tool_name="Bash"), now, now)
+        alerts += detector.check(now)
+    assert kinds(alerts) == ["long_turn", "long_turn"]
+    assert alerts[0]["alert_id"] == "s1:long_turn:5"
+    assert alerts[0]["turn_seconds"] == TURN_MAX_SECONDS
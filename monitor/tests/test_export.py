@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+from export import EXPORT_COLUMNS, columnar_available, encode_csv, encode_ndjson, encode_parquet, iter_events
+from shared_state import EventStore
+
+
+def event(n, timestamp, session="s1", event_type="Stop"):
+    return {"event_type": event_type, "timestamp": timestamp, "n": n,
+            "session": {"session_id": session, "project_name": "app"},
+            "data": {"tool_name": "Bash", "tool_response": "x" * 10}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EventStore(tmp_path / "events.db")
+    store.append_many([
+        ("event", event(1, "2026-01-02T00:00:00+00:00")),
+        ("event", event(2, "2026-01-03T00:00:00+00:00", session="s2")),
+        ("todos", {"todos": []}),
+        # 补录的旧事件写入得晚，按事件本身的时间过滤
+        ("event", event(3, "2026-01-01T00:00:00+00:00", event_type="UserPromptSubmit")),
+    ])
+    return store
+
+
+def numbers(events):
+    return [e["n"] for e in events]
+
+
+def test_time_range_uses_event_timestamp(store):
+    jan2 = 1767312000.0
+    assert numbers(iter_events(store.path)) == [1, 2, 3]
+    assert numbers(iter_events(store.path, since=jan2)) == [1, 2]
+    assert numbers(iter_events(store.path, until=jan2)) == [3]
+    assert numbers(iter_events(store.path, since=jan2, until=jan2 + 86400)) == [1]
+
+
+def test_filters_and_omit(store):
+    assert numbers(iter_events(store.path, session="s2")) == [2]
+    assert numbers(iter_events(store.path, project="app", event_type="UserPromptSubmit")) == [3]
+    exported = list(iter_events(store.path, omit=("data.tool_response",), batch_size=1))
+    assert all("tool_response" not in e["data"] for e in exported)
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = tmp_path / "events.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE events (seq INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, "
+                 "created REAL NOT NULL, body TEXT NOT NULL)")
+    conn.execute("INSERT INTO events (kind, created, body) VALUES ('event', 2000000000, ?)",
+                 (json.dumps(event(1, "2026-01-01T00:00:00+00:00")),))
+    conn.commit()
+    conn.close()
+    EventStore(path)
+    assert numbers(iter_events(path, until=1767225601.0)) == [1]
+
+
+def test_csv_header_and_rows(store):
+    rows = list(csv.reader(io.StringIO(b"".join(encode_csv(iter_events(store.path), batch_size=2)).decode())))
+    assert tuple(rows[0]) == EXPORT_COLUMNS
+    assert [row[EXPORT_COLUMNS.index("session_id")] for row in rows[1:]] == ["s1", "s2", "s1"]
+    assert json.loads(rows[1][EXPORT_COLUMNS.index("data")])["tool_name"] == "Bash"
+
+
+def test_ndjson_lines(store):
+    lines = b"".join(encode_ndjson(iter_events(store.path))).decode().splitlines()
+    assert [json.loads(line)["n"] for line in lines] == [1, 2, 3]
+
+
+@pytest.mark.skipif(not columnar_available(), reason="需要 pyarrow")
+def test_parquet_round_trip(store):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(b"".join(encode_parquet(iter_events(store.path), batch_size=2))))
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert table.num_rows == 3
+    assert table.column("event_type").to_pylist() == ["Stop", "Stop", "UserPromptSubmit"]
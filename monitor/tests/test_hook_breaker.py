@@ -0,0 +1,97 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# claude_hooks.py 在仓库根目录
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import claude_hooks  # noqa: E402
+from claude_hooks import BREAKER_BACKOFF, BREAKER_THRESHOLD  # noqa: E402
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = Clock(1_000_000.0)
+    monkeypatch.setattr(claude_hooks, "time", clock)
+    monkeypatch.setattr(claude_hooks, "BREAKER_FILE", str(tmp_path / ".monitor_breaker"))
+    claude_hooks.BREAKER_FAILED_HERE.clear()
+    yield clock
+    claude_hooks.BREAKER_FAILED_HERE.clear()
+
+
+def fail_in_new_process():
+    """模拟一个新的 hook 进程访问失败"""
+    claude_hooks.BREAKER_FAILED_HERE.clear()
+    assert claude_hooks.breaker_allows()
+    claude_hooks.breaker_record(False)
+    claude_hooks.BREAKER_FAILED_HERE.clear()
+
+
+def test_opens_after_threshold(clock):
+    for _ in range(BREAKER_THRESHOLD - 1):
+        fail_in_new_process()
+        assert claude_hooks.breaker_allows()
+    fail_in_new_process()
+    assert claude_hooks.read_breaker()["failures"] == BREAKER_THRESHOLD
+    assert not claude_hooks.breaker_allows()
+    clock.now += BREAKER_BACKOFF[0] - 1
+    assert not claude_hooks.breaker_allows()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    for _ in range(BREAKER_THRESHOLD):
+        fail_in_new_process()
+    clock.now += BREAKER_BACKOFF[0]
+    assert claude_hooks.breaker_allows()
+    # 试探期间其他 hook 进程继续跳过
+    assert not claude_hooks.breaker_allows()
+
+    # 试探失败：退避间隔加长
+    claude_hooks.breaker_record(False)
+    claude_hooks.BREAKER_FAILED_HERE.clear()
+    clock.now += BREAKER_BACKOFF[1] - 1
+    assert not claude_hooks.breaker_allows()
+    clock.now += 1
+    assert claude_hooks.breaker_allows()
+
+    # 试探成功：关闭熔断器
+    claude_hooks.breaker_record(True)
+    assert claude_hooks.read_breaker() == {"failures": 0}
+    assert claude_hooks.breaker_allows() and claude_hooks.breaker_allows()
+
+
+def test_backoff_is_capped():
+    assert claude_hooks.breaker_backoff(BREAKER_THRESHOLD) == BREAKER_BACKOFF[0]
+    assert claude_hooks.breaker_backoff(BREAKER_THRESHOLD + 100) == BREAKER_BACKOFF[-1]
+
+
+def test_one_failure_per_process(clock):
+    claude_hooks.breaker_record(False)
+    assert not claude_hooks.breaker_allows()
+    claude_hooks.breaker_record(False)
+    assert claude_hooks.read_breaker()["failures"] == 1
+
+
+def test_concurrent_failures_in_one_process_count_once(clock):
+    barrier = threading.Barrier(8)
+
+    def record():
+        barrier.wait()
+        claude_hooks.breaker_record(False)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert claude_hooks.read_breaker()["failures"] == 1
+    assert list(Path(claude_hooks.BREAKER_FILE).parent.glob("*.tmp")) == []
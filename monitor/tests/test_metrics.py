@@ -0,0 +1,13 @@
+from metrics import MetricsRegistry
+
+
+def test_label_combinations_beyond_cap_fold_into_other():
+    registry = MetricsRegistry()
+    counter = registry.counter("tool_events_total", "tools", ["tool", "project", "host"], max_series=2)
+    counter.inc("Bash", "p", "h1")
+    counter.inc("Bash", "p", "h2")
+    counter.inc("Bash", "p", "h3")
+    counter.inc("Read", "p", "h4")
+    assert counter.value("Bash", "p", "h1") == 1
+    assert counter.value("other", "other", "other") == 2
+    assert 'tool_events_total{tool="other",project="other",host="other"} 2' in "\n".join(counter.render(False))
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from pipeline import ShedPolicy, Stage
+
+LOW = ("PreToolUse", "PostToolUse")
+HIGH = ("PermissionRequest", "Stop")
+
+
+@pytest.fixture
+def policy():
+    return ShedPolicy(LOW, HIGH, soft=0.5, hard=0.9)
+
+
+@pytest.mark.parametrize("fill, low, normal, high", [
+    (0.0, "keep", "keep", "keep"),
+    (0.5, "strip", "keep", "keep"),
+    (0.9, "drop", "strip", "keep"),
+    (1.0, "drop", "drop", "wait"),
+])
+def test_low_priority_is_shed_first(policy, fill, low, normal, high):
+    assert policy.decide("PreToolUse", fill) == low
+    assert policy.decide("UserPromptSubmit", fill) == normal
+    assert policy.decide("Stop", fill) == high
+
+
+def test_disabled_policy_only_waits():
+    policy = ShedPolicy(LOW, HIGH, enabled=False)
+    assert policy.decide("PreToolUse", 0.95) == "keep"
+    assert policy.decide("PreToolUse", 1.0) == "wait"
+
+
+def test_strip_keeps_identifiers_and_transcript_path():
+    event = {"event_type": "PostToolUse", "data": {
+        "tool_name": "Bash", "tool_use_id": "t1", "session_id": "s", "transcript_path": "/t.jsonl",
+        "tool_input": {"command": "ls"}, "tool_response": "x" * 10000,
+    }}
+    stripped = ShedPolicy.strip(event)
+    assert stripped["shed"] is True
+    assert stripped["data"] == {"tool_name": "Bash", "tool_use_id": "t1", "session_id": "s",
+                                "transcript_path": "/t.jsonl"}
+
+
+def test_strip_keeps_todo_write_input():
+    event = {"event_type": "PostToolUse", "data": {"tool_name": "TodoWrite", "tool_input": {"todos": []}}}
+    assert ShedPolicy.strip(event)["data"]["tool_input"] == {"todos": []}
+
+
+def test_stage_processes_in_order():
+    handled = []
+
+    async def handler(batch):
+        handled.extend(batch)
+
+    async def scenario():
+        stage = Stage("state", handler, maxsize=10, batch_size=4)
+        stage.start()
+        for i in range(10):
+            await stage.put(i)
+        await stage.join()
+        return stage.status()
+
+    status = asyncio.run(scenario())
+    assert handled == list(range(10))
+    assert status["processed"] == 10
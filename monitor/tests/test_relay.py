@@ -0,0 +1,39 @@
+import asyncio
+
+from relay import RelayForwarder, RelayOutbox
+
+
+def test_outbox_size_tracks_writes_and_acks(tmp_path):
+    outbox = RelayOutbox(tmp_path / "outbox.db", max_rows=5)
+    assert outbox.put_many([{"n": i} for i in range(7)]) == 2
+    assert outbox.size() == 5
+    events = outbox.peek(2)
+    outbox.ack(events[-1]["relay_seq"])
+    assert outbox.size() == 3
+    assert RelayOutbox(tmp_path / "outbox.db").size() == 3
+
+
+def test_pending_count_includes_outbox(tmp_path):
+    forwarder = RelayForwarder("http://127.0.0.1:9", "relay", tmp_path / "outbox.db")
+    for i in range(3):
+        forwarder.enqueue({"event_type": "Stop", "n": i})
+    asyncio.run(forwarder._spool_pending())
+    forwarder.enqueue({"event_type": "Stop", "n": 3})
+    assert forwarder.pending_count() == 4
+    assert forwarder.status()["outbox"] == 3
+
+
+def test_spools_while_backing_off(tmp_path):
+    forwarder = RelayForwarder("http://127.0.0.1:9", "relay", tmp_path / "outbox.db",
+                               flush_interval=0.05, max_backoff=30.0)
+
+    async def scenario():
+        task = asyncio.create_task(forwarder.run())
+        await asyncio.sleep(0.3)
+        forwarder.enqueue({"event_type": "Stop"})
+        await asyncio.sleep(0.3)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert forwarder._pending == []
+    assert forwarder.outbox.size() >= 1
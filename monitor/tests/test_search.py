@@ -0,0 +1,73 @@
+import pytest
+
+from search import SearchIndex, parse_since, tokenize
+
+
+def bash(command, session="s1", event_type="PreToolUse"):
+    return {"event_type": event_type, "session": {"session_id": session, "project_name": "app"},
+            "data": {"tool_name": "Bash", "tool_input": {"command": command}}}
+
+
+def prompt(text):
+    return {"event_type": "UserPromptSubmit", "session": {"session_id": "s1"}, "data": {"prompt": text}}
+
+
+def seqs(result):
+    return [item["seq"] for item in result["results"]]
+
+
+def test_cjk_bigrams():
+    assert tokenize("修复登录") == ["修", "复", "登", "录", "修复", "复登", "登录"]
+    assert tokenize("修复登录", query=True) == ["修复", "复登", "登录"]
+    assert tokenize("改 bug 中", query=True) == ["改", "bug", "中"]
+    assert tokenize("修复Login问题") == ["修", "复", "修复", "login", "问", "题", "问题"]
+
+
+def test_cjk_query_matches_phrase_parts():
+    index = SearchIndex()
+    index.add(1, prompt("请修复登录页面的问题"), 0)
+    index.add(2, prompt("登记一下修改"), 0)
+    assert seqs(index.search("登录")) == [1]
+    assert seqs(index.search("登")) == [2, 1]
+    assert seqs(index.search("修复 页面")) == [1]
+
+
+def test_and_semantics_and_filters():
+    index = SearchIndex()
+    index.add(1, bash("git status"), 100)
+    index.add(2, bash("git push origin", session="s2"), 200)
+    index.add(3, bash("npm test"), 300)
+    assert seqs(index.search("git")) == [2, 1]
+    assert seqs(index.search("git push")) == [2]
+    assert seqs(index.search("git", session="s1")) == [1]
+    assert seqs(index.search("git", since=150)) == [2]
+    assert index.search("git missing") == {"total": 0, "results": []}
+    assert index.search("git", limit=1, offset=1)["total"] == 2
+
+
+def test_bounded_by_docs_evicts_oldest():
+    index = SearchIndex(max_docs=3)
+    for seq in range(1, 6):
+        index.add(seq, bash(f"echo shared unique{seq}"), seq)
+    assert list(index.docs) == [3, 4, 5]
+    assert seqs(index.search("shared")) == [5, 4, 3]
+    assert "unique1" not in index.postings
+    assert index.stats()["postings"] == sum(len(p) for p in index.postings.values())
+
+
+def test_bounded_by_postings():
+    index = SearchIndex(max_postings=10)
+    for seq in range(1, 5):
+        index.add(seq, bash(f"a{seq} b{seq} c{seq}"), seq)
+    # 每个文档 5 个词（3 个参数词、工具名 bash 和项目名 app），只能容纳两个文档
+    assert index.total_postings <= 10
+    assert list(index.docs) == [3, 4]
+    assert seqs(index.search("a1")) == []
+
+
+def test_parse_since():
+    assert parse_since("") is None
+    assert parse_since("1767225600") == 1767225600.0
+    assert parse_since("2026-01-01T00:00:00+00:00") == 1767225600.0
+    with pytest.raises(ValueError):
+        parse_since("yesterday")
@@ -0,0 +1,33 @@
+import shared_state
+from shared_state import EventStore
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def test_claim_expires_and_prunes(tmp_path, monkeypatch):
+    clock = Clock(1000.0)
+    monkeypatch.setattr(shared_state, "time", clock)
+    first = EventStore(tmp_path / "events.db")
+    second = EventStore(tmp_path / "events.db")
+
+    assert first.claim("alert:s:stall:1", 600) is True
+    assert second.claim("alert:s:stall:1", 600) is False
+    clock.now += 599
+    assert second.claim("alert:s:stall:1", 600) is False
+    assert second.prune_claims("alert:") == 0
+
+    clock.now += 1
+    assert second.claim("alert:s:stall:1", 600) is True
+    assert first.claim("alert:s:stall:1", 600) is False
+
+    first.set_meta("run_id", "r1")
+    clock.now += 600
+    assert first.prune_claims("alert:") == 1
+    assert first.get_meta("alert:s:stall:1") is None
+    assert first.get_meta("run_id") == "r1"
@@ -0,0 +1,45 @@
+from todos import TodoBoard, diff_todos, normalize_todos
+
+
+def todos(*items):
+    return normalize_todos([{"content": content, "status": status} for content, status in items])
+
+
+def test_diff_added_changed_removed():
+    old = todos(("a", "pending"), ("b", "pending"), ("c", "pending"))
+    new = todos(("a", "completed"), ("b", "pending"), ("d", "pending"))
+    diff = diff_todos(old, new)
+    assert [item["key"] for item in diff["added"]] == ["d"]
+    assert diff["changed"] == [new[0]]
+    assert diff["removed"] == ["c"]
+    assert "order" not in diff
+
+
+def test_diff_reorder_and_no_change():
+    old = todos(("a", "pending"), ("b", "pending"))
+    assert diff_todos(old, todos(("a", "pending"), ("b", "pending"))) is None
+    diff = diff_todos(old, todos(("b", "pending"), ("a", "pending")))
+    assert diff == {"added": [], "changed": [], "removed": [], "order": ["b", "a"]}
+    # 新增项插在中间时也需要完整顺序
+    diff = diff_todos(old, todos(("a", "pending"), ("x", "pending"), ("b", "pending")))
+    assert diff["order"] == ["a", "x", "b"]
+
+
+def test_normalize_skips_invalid_and_duplicate_items():
+    items = normalize_todos([{"id": "1", "content": "a"}, {"id": "1", "content": "b"}, {"content": ""}, "x"])
+    assert items == [{"key": "1", "content": "a", "activeForm": "", "status": "pending"}]
+
+
+def test_board_keeps_sessions_separate():
+    board = TodoBoard()
+    assert board.update("s1", [{"content": "a"}])["session_id"] == "s1"
+    board.update("s2", [{"content": "b"}])
+    assert board.update("s1", [{"content": "a"}]) is None
+
+    diff = board.update("s1", [{"content": "a", "status": "completed"}])
+    assert diff["session_id"] == "s1" and diff["changed"][0]["status"] == "completed"
+    assert [item["content"] for item in board.snapshot()["s2"]] == ["b"]
+
+    assert board.update("s2", [])["removed"] == ["b"]
+    assert "s2" not in board.snapshot()
+    assert board.remove("s1") is True and board.snapshot() == {}
@@ -0,0 +1,51 @@
+import random
+from collections import Counter
+
+from topk import SpaceSaving, TopKStore, session_scope
+
+
+def test_exact_below_capacity():
+    counts = SpaceSaving(10)
+    for key in "abacabad":
+        counts.add(key)
+    assert counts.as_dict() == {"a": 4, "b": 2, "c": 1, "d": 1}
+    assert [item["name"] for item in counts.top(2)] == ["a", "b"]
+    assert all(item["error"] == 0 for item in counts.top(10))
+
+
+def test_evicts_minimum_and_inherits_count():
+    counts = SpaceSaving(2)
+    counts.add("a", 5)
+    counts.add("b", 2)
+    counts.add("c")
+    assert counts.get("b") == 0
+    assert counts.top(2) == [{"name": "a", "count": 5, "error": 0}, {"name": "c", "count": 3, "error": 2}]
+
+
+def test_bounds_hold_on_random_stream():
+    rng = random.Random(7)
+    counts = SpaceSaving(16)
+    truth = Counter()
+    for _ in range(5000):
+        key = f"k{min(int(rng.expovariate(0.15)), 60)}"
+        amount = rng.choice((1, 1, 1, 3))
+        counts.add(key, amount)
+        truth[key] += amount
+
+    assert sum(counts.as_dict().values()) == counts.total == sum(truth.values())
+    top = counts.top(16)
+    assert [item["count"] for item in top] == sorted((item["count"] for item in top), reverse=True)
+    for item in top:
+        assert item["count"] - item["error"] <= truth[item["name"]] <= item["count"]
+    # 出现次数超过 总数 / capacity 的键一定被保留
+    for key, count in truth.items():
+        if count > counts.total / 16:
+            assert counts.get(key) >= count
+
+
+def test_store_scopes_are_bounded():
+    store = TopKStore(capacity=4, scope_capacity=2, max_scopes=2)
+    for session in ("s1", "s2", "s3"):
+        store.add("Bash", [session_scope(session)])
+    assert store.get(session_scope("s1")) is None
+    assert store.get().get("Bash") == 3
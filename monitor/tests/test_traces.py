@@ -0,0 +1,52 @@
+from traces import SessionTrace
+
+
+def task(trace, tool_use_id, timestamp):
+    trace.add("PreToolUse", {"tool_name": "Task", "tool_use_id": tool_use_id}, timestamp)
+
+
+def subagents(trace):
+    return [span for span in trace.snapshot() if span["kind"] == "subagent"]
+
+
+def parent_start(trace, span):
+    return next(s["start"] for s in trace.snapshot() if s["span_id"] == span["parent_id"])
+
+
+def test_subagent_matches_tool_use_id():
+    trace = SessionTrace("s")
+    trace.add("UserPromptSubmit", {"prompt": "go"}, 0.0)
+    task(trace, "t1", 1.0)
+    task(trace, "t2", 2.0)
+    trace.add("SubagentStop", {"tool_use_id": "t2"}, 5.0)
+    [span] = subagents(trace)
+    assert span["start"] == 2.0 and span["end"] == 5.0
+
+
+def test_parallel_subagents_match_by_transcript_path():
+    trace = SessionTrace("s")
+    trace.add("UserPromptSubmit", {"prompt": "go"}, 0.0)
+    task(trace, "t1", 1.0)
+    task(trace, "t2", 2.0)
+    trace.add("SubagentStop", {"agent_transcript_path": "/a.jsonl"}, 5.0)
+    trace.add("SubagentStop", {"agent_transcript_path": "/b.jsonl"}, 6.0)
+    trace.add("SubagentStop", {"agent_transcript_path": "/a.jsonl"}, 7.0)
+    assert [(span["start"], span["end"]) for span in subagents(trace)] == [(1.0, 5.0), (2.0, 6.0), (1.0, 7.0)]
+
+
+def test_subagent_without_ids_falls_back_to_fifo():
+    trace = SessionTrace("s")
+    trace.add("UserPromptSubmit", {"prompt": "go"}, 0.0)
+    task(trace, "t1", 1.0)
+    task(trace, "t2", 2.0)
+    trace.add("SubagentStop", {}, 5.0)
+    trace.add("SubagentStop", {}, 6.0)
+    assert [span["start"] for span in subagents(trace)] == [1.0, 2.0]
+
+
+def test_subagent_without_task_starts_at_turn():
+    trace = SessionTrace("s")
+    trace.add("UserPromptSubmit", {"prompt": "go"}, 0.0)
+    trace.add("SubagentStop", {}, 3.0)
+    [span] = subagents(trace)
+    assert span["start"] == 0.0 and parent_start(trace, span) == 0.0
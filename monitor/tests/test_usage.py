@@ -0,0 +1,78 @@
+import json
+
+import usage
+from usage import TranscriptTailer, UsageTracker, model_price
+
+
+def assistant(message_id, output_tokens, model="claude-sonnet-4-5"):
+    return json.dumps({"type": "assistant", "message": {
+        "id": message_id, "model": model, "usage": {"input_tokens": 10, "output_tokens": output_tokens},
+    }}) + "\n"
+
+
+def output_tokens(by_model):
+    return sum(totals.output_tokens for totals in by_model.values())
+
+
+def test_reads_only_complete_new_lines(tmp_path):
+    path = tmp_path / "t.jsonl"
+    path.write_text(assistant("m1", 5))
+    tailer = TranscriptTailer()
+    assert output_tokens(tailer.read_new(str(path))[0]) == 5
+    with path.open("a") as f:
+        f.write(assistant("m2", 7) + assistant("m3", 9)[:-10])
+    by_model, first = tailer.read_new(str(path))
+    assert output_tokens(by_model) == 7 and first is False
+    with path.open("a") as f:
+        f.write(assistant("m3", 9)[-10:])
+    assert output_tokens(tailer.read_new(str(path))[0]) == 9
+
+
+def test_skips_line_longer_than_read_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage, "MAX_READ_BYTES", 256)
+    path = tmp_path / "t.jsonl"
+    long_line = json.dumps({"type": "user", "content": "x" * 600}) + "\n"
+    path.write_text(assistant("m1", 1) + long_line + assistant("m2", 2))
+    tailer = TranscriptTailer()
+    totals = [output_tokens(tailer.read_new(str(path))[0]) for _ in range(5)]
+    assert sum(totals) == 3
+    assert tailer._files[str(path)][0] == path.stat().st_size
+
+
+def test_evicted_file_resumes_from_its_offset(tmp_path):
+    paths = [tmp_path / f"t{i}.jsonl" for i in range(3)]
+    for path in paths:
+        path.write_text(assistant(f"{path.name}-1", 100))
+    tailer = TranscriptTailer(max_files=2)
+    assert all(tailer.read_new(str(path))[1] for path in paths)
+    assert str(paths[0]) not in tailer._files and tailer.known(str(paths[0]))
+
+    with paths[0].open("a") as f:
+        f.write(assistant("t0-2", 3))
+    by_model, first = tailer.read_new(str(paths[0]))
+    assert first is False and output_tokens(by_model) == 3
+
+
+def test_first_read_is_recorded_as_baseline(tmp_path):
+    path = tmp_path / "t.jsonl"
+    path.write_text(assistant("m1", 100))
+    tracker = UsageTracker()
+    by_model, first = tracker.read_transcript(str(path))
+    assert first
+    tracker.apply("s", "p", "UserPromptSubmit", {}, baseline=by_model)
+    with path.open("a") as f:
+        f.write(assistant("m2", 3))
+    by_model, first = tracker.read_transcript(str(path))
+    tracker.apply("s", "p", "Stop", by_model, "2026-01-01T00:00:00+00:00")
+
+    session = tracker.session("s")
+    assert session["baseline"]["output_tokens"] == 100
+    assert [turn["output_tokens"] for turn in session["turns"]] == [3]
+    assert session["totals"]["output_tokens"] == 103
+
+
+def test_model_prices():
+    assert model_price("claude-3-haiku-20240307") == (0.25, 1.25)
+    assert model_price("claude-3-5-haiku-20241022") == (0.8, 4.0)
+    assert model_price("claude-haiku-4-5") == (1.0, 5.0)
+    assert model_price("unknown-model") is None
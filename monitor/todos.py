@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 会话任务列表
+从 PostToolUse 的 TodoWrite 事件中提取每个会话的任务列表，
+与上一次的状态逐项比较，只广播变化的部分（新增、状态变化、删除）。
+"""
+
+from typing import Dict, List, Optional
+
+# 手动通过 POST /api/todos 提交、未指定会话的任务列表
+GLOBAL_TODOS = ""
+
+
+def todo_key(item: Dict) -> str:
+    """任务的标识：优先使用 id，否则使用任务内容"""
+    return str(item.get("id") or item.get("content") or "")
+
+
+def normalize_todos(todos) -> List[Dict]:
+    """过滤无效条目，同一标识只保留第一条"""
+    result = []
+    seen = set()
+    for item in todos if isinstance(todos, list) else []:
+        if not isinstance(item, dict):
+            continue
+        key = todo_key(item)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        result.append({
+            "key": key,
+            "content": item.get("content", ""),
+            "activeForm": item.get("activeForm", ""),
+            "status": item.get("status", "pending"),
+        })
+    return result
+
+
+def diff_todos(old: List[Dict], new: List[Dict]) -> Optional[Dict]:
+    """逐项比较两个任务列表，没有变化时返回 None"""
+    old_by_key = {item["key"]: item for item in old}
+    new_keys = {item["key"] for item in new}
+
+    added = [item for item in new if item["key"] not in old_by_key]
+    changed = [
+        item for item in new
+        if item["key"] in old_by_key and item != old_by_key[item["key"]]
+    ]
+    removed = [item["key"] for item in old if item["key"] not in new_keys]
+
+    # 只有顺序与“删除后追加新增项”的结果不同时才附带完整顺序
+    order = [item["key"] for item in new]
+    expected = [item["key"] for item in old if item["key"] in new_keys] + [item["key"] for item in added]
+    reordered = order != expected
+
+    if not added and not changed and not removed and not reordered:
+        return None
+    diff = {"added": added, "changed": changed, "removed": removed}
+    if reordered:
+        diff["order"] = order
+    return diff
+
+
+class TodoBoard:
+    """每个会话的当前任务列表"""
+
+    def __init__(self):
+        self.sessions: Dict[str, List[Dict]] = {}
+
+    def update(self, session_id: str, todos) -> Optional[Dict]:
+        """替换会话的任务列表，返回变化（带 session_id），没有变化时返回 None"""
+        new = normalize_todos(todos)
+        diff = diff_todos(self.sessions.get(session_id, []), new)
+        if diff is None:
+            return None
+        if new:
+            self.sessions[session_id] = new
+        else:
+            self.sessions.pop(session_id, None)
+        return {"session_id": session_id, **diff}
+
+    def remove(self, session_id: str) -> bool:
+        return self.sessions.pop(session_id, None) is not None
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        return self.sessions
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 有界 Top-K 计数
+工具名、事件类型等键由客户端决定，数量没有上限（如大量 MCP 工具）。
+这里用 Space-Saving 算法在固定数量的计数器内统计高频键：
+出现次数超过 总数 / capacity 的键一定会被保留，计数是不低于真实值的估计，
+error 是估计值可能多算的上限（键从未被淘汰时为 0，即计数精确）。
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+# 全局范围
+GLOBAL_SCOPE = ""
+
+
+def project_scope(project: str) -> str:
+    return f"project:{project}"
+
+
+def session_scope(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+class _Bucket:
+    """Stream-Summary 中计数相同的一组键，桶按计数从小到大组成双向链表"""
+
+    __slots__ = ("count", "keys", "prev", "next")
+
+    def __init__(self, count: int):
+        self.count = count
+        self.keys: Dict[str, None] = {}
+        self.prev: Optional["_Bucket"] = None
+        self.next: Optional["_Bucket"] = None
+
+
+class SpaceSaving:
+    """Space-Saving Top-K：最多 capacity 个计数器，新键在计数器用满时替换当前最小的键
+
+    计数器按 Stream-Summary 结构组织：计数相同的键放在同一个桶中，桶按计数排成双向链表，
+    最小的键总在链表头部。每次加 1 只需把键移到相邻的桶，更新为 O(1)。
+    """
+
+    __slots__ = ("capacity", "errors", "total", "_buckets", "_head", "_tail")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        self._buckets: Dict[str, _Bucket] = {}
+        self._head: Optional[_Bucket] = None
+        self._tail: Optional[_Bucket] = None
+
+    def _link_after(self, bucket: _Bucket, prev: Optional[_Bucket]):
+        bucket.prev = prev
+        bucket.next = prev.next if prev is not None else self._head
+        if bucket.next is not None:
+            bucket.next.prev = bucket
+        else:
+            self._tail = bucket
+        if prev is not None:
+            prev.next = bucket
+        else:
+            self._head = bucket
+
+    def _unlink(self, bucket: _Bucket):
+        if bucket.prev is not None:
+            bucket.prev.next = bucket.next
+        else:
+            self._head = bucket.next
+        if bucket.next is not None:
+            bucket.next.prev = bucket.prev
+        else:
+            self._tail = bucket.prev
+
+    def _place(self, key: str, count: int, after: Optional[_Bucket]):
+        """把键放入计数为 count 的桶，从 after 之后开始查找位置（加 1 时就是相邻的桶）"""
+        target = after.next if after is not None else self._head
+        while target is not None and target.count < count:
+            after, target = target, target.next
+        if target is None or target.count != count:
+            target = _Bucket(count)
+            self._link_after(target, after)
+        target.keys[key] = None
+        self._buckets[key] = target
+
+    def _remove(self, key: str) -> _Bucket:
+        """从所在的桶中移出键，桶为空时从链表中删除；返回新键应插入位置之前的桶"""
+        bucket = self._buckets.pop(key)
+        del bucket.keys[key]
+        if bucket.keys:
+            return bucket
+        self._unlink(bucket)
+        return bucket.prev
+
+    def add(self, key: str, amount: int = 1):
+        self.total += amount
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            count = bucket.count + amount
+            self._place(key, count, self._remove(key))
+            return
+        if len(self._buckets) < self.capacity:
+            self._place(key, amount, None)
+            return
+        # 淘汰最小的键（链表头部的桶），新键继承其计数（可能多算的部分记入 error）
+        floor = self._head.count
+        victim = next(iter(self._head.keys))
+        self.errors.pop(victim, None)
+        self.errors[key] = floor
+        self._place(key, floor + amount, self._remove(victim))
+
+    def get(self, key: str) -> int:
+        bucket = self._buckets.get(key)
+        return bucket.count if bucket is not None else 0
+
+    def top(self, limit: int) -> List[Dict]:
+        """按计数从高到低返回前 limit 个键（从链表尾部向前遍历，无需排序）"""
+        items = []
+        bucket = self._tail
+        while bucket is not None and len(items) < limit:
+            for key in bucket.keys:
+                items.append({"name": key, "count": bucket.count, "error": self.errors.get(key, 0)})
+                if len(items) >= limit:
+                    break
+            bucket = bucket.prev
+        return items
+
+    def as_dict(self) -> Dict[str, int]:
+        return {key: bucket.count for key, bucket in self._buckets.items()}
+
+    def status(self) -> Dict:
+        return {"capacity": self.capacity, "size": len(self._buckets), "total": self.total}
+
+
+class TopKStore:
+    """按范围（全局 / 项目 / 会话）维护的 Top-K 计数
+
+    全局范围使用 capacity 个计数器，其余每个范围使用 scope_capacity 个，
+    范围数量超过 max_scopes 时淘汰最久未更新的范围，总内存有固定上限。
+    """
+
+    def __init__(self, capacity: int = 200, scope_capacity: int = 32, max_scopes: int = 1000):
+        self.scope_capacity = scope_capacity
+        self.max_scopes = max_scopes
+        self.global_counts = SpaceSaving(capacity)
+        self.scopes: "OrderedDict[str, SpaceSaving]" = OrderedDict()
+
+    def add(self, key: str, scopes: Iterable[str] = (), amount: int = 1):
+        self.global_counts.add(key, amount)
+        for scope in scopes:
+            counts = self.scopes.get(scope)
+            if counts is None:
+                counts = self.scopes[scope] = SpaceSaving(self.scope_capacity)
+                while len(self.scopes) > self.max_scopes:
+                    self.scopes.popitem(last=False)
+            else:
+                self.scopes.move_to_end(scope)
+            counts.add(key, amount)
+
+    def get(self, scope: str = GLOBAL_SCOPE) -> Optional[SpaceSaving]:
+        if scope == GLOBAL_SCOPE:
+            return self.global_counts
+        return self.scopes.get(scope)
+
+    def remove(self, scope: str) -> bool:
+        return self.scopes.pop(scope, None) is not None
+
+    def status(self) -> Dict:
+        return {
+            "global": self.global_counts.status(),
+            "scopes": len(self.scopes),
+            "max_scopes": self.max_scopes,
+            "scope_capacity": self.scope_capacity,
+        }
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - 会话链路追踪
+把扁平的 hook 事件增量组装成每个会话的 span 树：
+UserPromptSubmit 开启一轮对话（turn），Stop 结束；PreToolUse / PostToolUse 配对成工具 span；
+SubagentStop 结束子代理 span（按 tool_use_id 或子代理会话记录路径对应到启动它的 Task 调用）；PreCompact 开启压缩 span，直到该会话的下一个事件。
+可导出为 Chrome trace-event JSON（chrome://tracing、Perfetto）或 OTLP JSON。
+"""
+
+import hashlib
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+# span 类型 -> Chrome trace 中的线程号，每种类型一条泳道
+SPAN_LANES = {"turn": 1, "tool": 2, "subagent": 3, "compaction": 4}
+
+# 启动子代理的工具
+SUBAGENT_TOOLS = ("Task", "Agent")
+
+
+def _span_id(session_id: str, index: int) -> str:
+    return hashlib.md5(f"{session_id}:{index}".encode("utf-8")).hexdigest()[:16]
+
+
+def trace_id(session_id: str) -> str:
+    """同一会话的所有 span 共用一个 trace id"""
+    return hashlib.md5(session_id.encode("utf-8")).hexdigest()
+
+
+class SessionTrace:
+    """单个会话的 span 构建器，已完成和未完成的 span 总数有上限"""
+
+    def __init__(self, session_id: str, project: str = "", max_spans: int = 5000):
+        self.session_id = session_id
+        self.project = project
+        self.spans: Deque[Dict] = deque(maxlen=max_spans)
+        self.span_count = 0
+        self.turn: Optional[Dict] = None
+        self.compaction: Optional[Dict] = None
+        # tool_use_id -> span；没有 tool_use_id 时按工具名先进先出配对
+        self.open_tools: Dict[str, Dict] = {}
+        self.open_by_name: Dict[str, Deque[Dict]] = {}
+        # 子代理（会话记录路径或 agent_id）-> 启动它的 Task span，同一子代理多次停止时对应同一个调用
+        self.subagent_parents: Dict[str, Dict] = {}
+        self.last_time = 0.0
+
+    def _open(self, kind: str, name: str, start: float, parent: Optional[Dict] = None,
+              attributes: Optional[Dict] = None) -> Dict:
+        self.span_count += 1
+        span = {
+            "span_id": _span_id(self.session_id, self.span_count),
+            "parent_id": parent["span_id"] if parent else None,
+            "kind": kind,
+            "name": name,
+            "start": start,
+            "end": None,
+            "attributes": attributes or {},
+        }
+        self.spans.append(span)
+        return span
+
+    def _close_tools(self, end: float):
+        for span in self.open_tools.values():
+            span["end"] = end
+            span["attributes"]["incomplete"] = True
+        for spans in self.open_by_name.values():
+            for span in spans:
+                span["end"] = end
+                span["attributes"]["incomplete"] = True
+        self.open_tools.clear()
+        self.open_by_name.clear()
+        self.subagent_parents.clear()
+
+    def _subagent_parent(self, data: Dict) -> Optional[Dict]:
+        """子代理对应的 Task span：优先按 tool_use_id，其次按子代理已对应过的调用，
+        否则取最早的尚未对应子代理的 Task 调用（先进先出）"""
+        span = self.open_tools.get(data.get("tool_use_id") or "")
+        if span is not None and span["name"] in SUBAGENT_TOOLS:
+            return span
+        agent = data.get("agent_transcript_path") or data.get("agent_id") or ""
+        if agent and agent in self.subagent_parents:
+            return self.subagent_parents[agent]
+
+        tasks = [s for s in self.open_tools.values() if s["name"] in SUBAGENT_TOOLS]
+        tasks += [s for name, q in self.open_by_name.items() if name in SUBAGENT_TOOLS for s in q]
+        claimed = [s for s in tasks if s["attributes"].get("subagent")]
+        unclaimed = [s for s in tasks if not s["attributes"].get("subagent")]
+        span = min(unclaimed or claimed, key=lambda s: s["start"], default=None)
+        if span is not None:
+            span["attributes"].setdefault("subagent", agent or True)
+            if agent:
+                self.subagent_parents[agent] = span
+        return span
+
+    def add(self, event_type: str, data: Dict, timestamp: float):
+        self.last_time = max(self.last_time, timestamp)
+
+        # 压缩在该会话的下一个事件到来时视为结束
+        if self.compaction is not None:
+            self.compaction["end"] = timestamp
+            self.compaction = None
+
+        if event_type == "UserPromptSubmit":
+            if self.turn is not None:
+                self._close_tools(timestamp)
+                self.turn["end"] = timestamp
+                self.turn["attributes"]["incomplete"] = True
+            prompt = data.get("prompt") or ""
+            self.turn = self._open("turn", "turn", timestamp, attributes={
+                "prompt": prompt[:200],
+            })
+
+        elif event_type == "PreToolUse":
+            tool_name = data.get("tool_name") or "unknown"
+            attributes = {"tool_name": tool_name}
+            tool_input = data.get("tool_input") or {}
+            if isinstance(tool_input, dict):
+                for key in ("command", "file_path", "pattern", "description"):
+                    if isinstance(tool_input.get(key), str):
+                        attributes[key] = tool_input[key][:200]
+            span = self._open("tool", tool_name, timestamp, self.turn, attributes)
+            tool_use_id = data.get("tool_use_id")
+            if tool_use_id:
+                self.open_tools[tool_use_id] = span
+            else:
+                self.open_by_name.setdefault(tool_name, deque()).append(span)
+
+        elif event_type == "PostToolUse":
+            tool_name = data.get("tool_name") or "unknown"
+            span = self.open_tools.pop(data.get("tool_use_id") or "", None)
+            if span is None:
+                pending = self.open_by_name.get(tool_name)
+                if pending:
+                    span = pending.popleft()
+                    if not pending:
+                        del self.open_by_name[tool_name]
+            if span is None:
+                # 没有对应的 PreToolUse（如监控平台启动前开始的调用）：记为零时长
+                span = self._open("tool", tool_name, timestamp, self.turn, {"tool_name": tool_name})
+            span["end"] = timestamp
+
+        elif event_type == "SubagentStop":
+            # 子代理从启动它的 Task 工具调用开始，没有则从本轮开始
+            parent = self._subagent_parent(data)
+            if parent is not None:
+                start = parent["start"]
+            elif self.turn is not None:
+                parent, start = self.turn, self.turn["start"]
+            else:
+                start = timestamp
+            span = self._open("subagent", "subagent", start, parent)
+            span["end"] = timestamp
+
+        elif event_type == "PreCompact":
+            self.compaction = self._open("compaction", "compaction", timestamp, self.turn, {
+                "trigger": data.get("trigger", ""),
+            })
+
+        elif event_type == "Stop":
+            if self.turn is not None:
+                self._close_tools(timestamp)
+                self.turn["end"] = timestamp
+                self.turn = None
+            else:
+                self._close_tools(timestamp)
+
+    def snapshot(self) -> List[Dict]:
+        """返回所有 span，未结束的 span 以最后一个事件时间作为结束时间并标记 open"""
+        result = []
+        for span in self.spans:
+            item = dict(span)
+            if item["end"] is None:
+                item["end"] = max(self.last_time, item["start"])
+                item["open"] = True
+            result.append(item)
+        return result
+
+    def to_chrome(self) -> Dict:
+        """Chrome trace-event JSON（时间单位：微秒）"""
+        events = [{
+            "name": "process_name", "ph": "M", "pid": 1, "tid": 0,
+            "args": {"name": f"{self.project or 'claude'} {self.session_id[:8]}"},
+        }]
+        for kind, lane in SPAN_LANES.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane, "args": {"name": kind}})
+        for span in self.snapshot():
+            args = dict(span["attributes"])
+            if span.get("open"):
+                args["open"] = True
+            events.append({
+                "name": span["name"],
+                "cat": span["kind"],
+                "ph": "X",
+                "ts": round(span["start"] * 1_000_000),
+                "dur": round((span["end"] - span["start"]) * 1_000_000),
+                "pid": 1,
+                "tid": SPAN_LANES[span["kind"]],
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self) -> Dict:
+        """OTLP/JSON（ExportTraceServiceRequest）"""
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, (int, float)):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        tid = trace_id(self.session_id)
+        spans = []
+        for span in self.snapshot():
+            attributes = [attribute("claude.span.kind", span["kind"])]
+            attributes += [attribute(k, v) for k, v in span["attributes"].items()]
+            if span.get("open"):
+                attributes.append(attribute("open", True))
+            otlp_span = {
+                "traceId": tid,
+                "spanId": span["span_id"],
+                "name": span["name"],
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(int(span["start"] * 1e9)),
+                "endTimeUnixNano": str(int(span["end"] * 1e9)),
+                "attributes": attributes,
+            }
+            if span["parent_id"]:
+                otlp_span["parentSpanId"] = span["parent_id"]
+            spans.append(otlp_span)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                attribute("service.name", "claude-code"),
+                attribute("session.id", self.session_id),
+                attribute("project.name", self.project),
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "claude-code-monitor"},
+                "spans": spans,
+            }],
+        }]}
+
+
+class TraceStore:
+    """所有会话的追踪数据，超过会话数上限时淘汰最久未更新的会话"""
+
+    def __init__(self, max_sessions: int = 200, max_spans: int = 5000):
+        self.max_sessions = max_sessions
+        self.max_spans = max_spans
+        self.sessions: "OrderedDict[str, SessionTrace]" = OrderedDict()
+
+    def add(self, event: Dict, timestamp: Optional[float] = None):
+        session = event.get("session", {})
+        session_id = session.get("session_id")
+        if not session_id:
+            return
+        trace = self.sessions.get(session_id)
+        if trace is None:
+            trace = self.sessions[session_id] = SessionTrace(
+                session_id, session.get("project_name", ""), self.max_spans
+            )
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        trace.add(event.get("event_type", ""), event.get("data", {}),
+                  timestamp if timestamp is not None else time.time())
+
+    def get(self, session_id: str) -> Optional[SessionTrace]:
+        return self.sessions.get(session_id)
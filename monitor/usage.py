@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Claude Code 监控平台 - Token 用量与费用统计
+Stop / SubagentStop / PreCompact 事件到来时，按字节偏移增量读取会话记录（transcript JSONL）
+中新追加的部分，提取 assistant 消息的 usage，按轮次、会话、项目和模型汇总。
+每次读取的成本只与新增数据量有关，与会话记录的总大小无关。
+首次读取某个会话记录时已有的内容属于之前的轮次（如监控平台启动前），记为会话的基线用量，不计入当前轮次。
+
+只有监控平台与 Claude Code 运行在同一台机器上时才能读取 transcript_path，
+读取不到的路径会被忽略。
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Set, Tuple
+
+# 触发读取会话记录的事件
+TRANSCRIPT_EVENTS = ("Stop", "SubagentStop", "PreCompact")
+# 一轮对话开始的事件：会话记录还没读过时在此读取，已有内容记为基线，随后的 Stop 只统计本轮
+BASELINE_EVENTS = ("SessionStart", "UserPromptSubmit")
+
+# 模型价格（美元 / 百万 token）：(模型名包含的关键字, 输入, 输出)，按顺序匹配第一个
+MODEL_PRICES = (
+    ("opus-4-5", 5.0, 25.0),
+    ("opus", 15.0, 75.0),
+    ("sonnet", 3.0, 15.0),
+    ("haiku-4-5", 1.0, 5.0),
+    ("3-haiku", 0.25, 1.25),
+    ("haiku", 0.8, 4.0),
+)
+# 缓存写入与读取相对输入价格的倍率
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# 单次读取的最大字节数，超出部分留到下次事件再读；单行超过该长度时跳过这一行
+MAX_READ_BYTES = 16 * 1024 * 1024
+# 每个会话记录保留的最近消息 id 数（同一条消息的多个内容块会重复记录 usage）
+RECENT_MESSAGE_IDS = 256
+
+
+def model_price(model: str):
+    """返回 (输入价格, 输出价格)，未知模型返回 None"""
+    model = (model or "").lower()
+    for keyword, input_price, output_price in MODEL_PRICES:
+        if keyword in model:
+            return input_price, output_price
+    return None
+
+
+class UsageTotals:
+    """token 用量累计"""
+
+    __slots__ = ("input_tokens", "output_tokens", "cache_creation_tokens",
+                 "cache_read_tokens", "cost", "messages")
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_tokens = 0
+        self.cache_read_tokens = 0
+        self.cost = 0.0
+        self.messages = 0
+
+    def add(self, other: "UsageTotals"):
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_creation_tokens += other.cache_creation_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cost += other.cost
+        self.messages += other.messages
+
+    def add_usage(self, model: str, usage: Dict):
+        input_tokens = int(usage.get("input_tokens") or 0)
+        output_tokens = int(usage.get("output_tokens") or 0)
+        cache_creation = int(usage.get("cache_creation_input_tokens") or 0)
+        cache_read = int(usage.get("cache_read_input_tokens") or 0)
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cache_creation_tokens += cache_creation
+        self.cache_read_tokens += cache_read
+        self.messages += 1
+        price = model_price(model)
+        if price is not None:
+            input_price, output_price = price
+            self.cost += (
+                input_tokens * input_price
+                + cache_creation * input_price * CACHE_WRITE_MULTIPLIER
+                + cache_read * input_price * CACHE_READ_MULTIPLIER
+                + output_tokens * output_price
+            ) / 1_000_000
+
+    def to_dict(self) -> Dict:
+        prompt_tokens = self.input_tokens + self.cache_creation_tokens + self.cache_read_tokens
+        return {
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_hit_ratio": round(self.cache_read_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+            "cost": round(self.cost, 6),
+            "messages": self.messages,
+        }
+
+
+class TranscriptTailer:
+    """按字节偏移增量读取会话记录，只消费完整的行"""
+
+    def __init__(self, max_files: int = 1000, max_evicted: int = 100000):
+        self.max_files = max_files
+        self.max_evicted = max_evicted
+        # 路径 -> [偏移, inode, 最近消息 id 队列, 最近消息 id 集合, 是否正在跳过超长的行]
+        self._files: "OrderedDict[str, list]" = OrderedDict()
+        # 被挤出的会话记录只保留 路径 -> (偏移, inode, 是否正在跳过超长的行)，
+        # 再次读取时从原偏移继续，不会把整个文件当作首次读取重新计入
+        self._evicted: "OrderedDict[str, Tuple[int, int, bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def known(self, path: str) -> bool:
+        """是否已经读过该会话记录"""
+        with self._lock:
+            return path in self._files or path in self._evicted
+
+    def read_new(self, path: str) -> Tuple[Dict[str, UsageTotals], bool]:
+        """读取上次偏移之后新增的记录，返回 (按模型分组的用量, 是否为首次读取)"""
+        by_model: Dict[str, UsageTotals] = {}
+        with self._lock:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return by_model, False
+
+            state = self._files.get(path)
+            first = state is None
+            if first:
+                evicted = self._evicted.pop(path, None)
+                if evicted is not None:
+                    first = False
+                    state = [evicted[0], evicted[1], deque(), set(), evicted[2]]
+            # 文件被替换或截断时从头读
+            if state is None or state[1] != stat.st_ino or stat.st_size < state[0]:
+                state = [0, stat.st_ino, deque(), set(), False]
+            self._files[path] = state
+            self._files.move_to_end(path)
+            if len(self._files) > self.max_files:
+                old_path, old_state = self._files.popitem(last=False)
+                self._evicted[old_path] = (old_state[0], old_state[1], old_state[4])
+                if len(self._evicted) > self.max_evicted:
+                    self._evicted.popitem(last=False)
+
+            if stat.st_size == state[0]:
+                return by_model, first
+
+            recent: Deque[str] = state[2]
+            seen: Set[str] = state[3]
+            skipping = state[4]
+            start = offset = state[0]
+            limit = offset + MAX_READ_BYTES
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while offset < limit:
+                    line = f.readline(limit - offset)
+                    if not line.endswith(b"\n"):
+                        # 最后一行可能还没写完，留到下次；单行超过读取上限时丢弃已读部分，继续跳到行尾
+                        if skipping or (offset == start and len(line) == limit - offset):
+                            offset += len(line)
+                            skipping = True
+                        break
+                    offset += len(line)
+                    if skipping:
+                        skipping = False
+                        continue
+                    self._parse_line(line, by_model, recent, seen)
+            state[0] = offset
+            state[4] = skipping
+        return by_model, first
+
+    @staticmethod
+    def _parse_line(line: bytes, by_model: Dict[str, UsageTotals], recent: Deque[str], seen: Set[str]):
+        # 快速跳过不含用量的记录（用户消息、工具结果等）
+        if b'"usage"' not in line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(record, dict) or record.get("type") != "assistant":
+            return
+        message = record.get("message")
+        if not isinstance(message, dict) or not isinstance(message.get("usage"), dict):
+            return
+
+        message_id = message.get("id") or record.get("requestId")
+        if message_id:
+            if message_id in seen:
+                return
+            seen.add(message_id)
+            recent.append(message_id)
+            if len(recent) > RECENT_MESSAGE_IDS:
+                seen.discard(recent.popleft())
+
+        model = message.get("model") or "unknown"
+        totals = by_model.get(model)
+        if totals is None:
+            totals = by_model[model] = UsageTotals()
+        totals.add_usage(model, message["usage"])
+
+
+class SessionUsage:
+    """单个会话的用量：累计、当前轮次和最近若干轮"""
+
+    def __init__(self, project: str, max_turns: int = 50):
+        self.project = project
+        self.totals = UsageTotals()
+        self.current_turn = UsageTotals()
+        self.turns: Deque[Dict] = deque(maxlen=max_turns)
+        self.by_model: Dict[str, UsageTotals] = {}
+        # 首次读取会话记录时已有的用量（之前的轮次），计入累计但不计入任何轮次
+        self.baseline = UsageTotals()
+
+    def to_dict(self) -> Dict:
+        return {
+            "project": self.project,
+            "totals": self.totals.to_dict(),
+            "current_turn": self.current_turn.to_dict(),
+            "turns": list(self.turns),
+            "baseline": self.baseline.to_dict(),
+            "by_model": {model: t.to_dict() for model, t in self.by_model.items()},
+        }
+
+
+class UsageTracker:
+    """按轮次、会话、项目和模型汇总 token 用量"""
+
+    def __init__(self, max_sessions: int = 500):
+        self.max_sessions = max_sessions
+        self.tailer = TranscriptTailer()
+        self.totals = UsageTotals()
+        self.sessions: "OrderedDict[str, SessionUsage]" = OrderedDict()
+        self.by_project: Dict[str, UsageTotals] = {}
+        self.by_model: Dict[str, UsageTotals] = {}
+
+    def read_transcript(self, path: str) -> Tuple[Dict[str, UsageTotals], bool]:
+        """读取会话记录的新增部分（阻塞 IO，在线程中调用），返回 (用量, 是否为首次读取)"""
+        return self.tailer.read_new(path)
+
+    def apply(self, session_id: str, project: str, event_type: str, by_model: Dict[str, UsageTotals],
+              timestamp: Optional[str] = None, baseline: Optional[Dict[str, UsageTotals]] = None) -> bool:
+        """把新读到的用量计入各维度，Stop 时结束当前轮次；有变化时返回 True
+
+        baseline 为首次读取会话记录时已有的用量，只计入累计，不计入当前轮次
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = SessionUsage(project)
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+
+        for turn, usages in ((session.baseline, baseline or {}), (session.current_turn, by_model)):
+            for model, usage in usages.items():
+                self.totals.add(usage)
+                session.totals.add(usage)
+                turn.add(usage)
+                session.by_model.setdefault(model, UsageTotals()).add(usage)
+                self.by_project.setdefault(project, UsageTotals()).add(usage)
+                self.by_model.setdefault(model, UsageTotals()).add(usage)
+
+        if event_type == "Stop" and session.current_turn.messages:
+            session.turns.append({"ended": timestamp, **session.current_turn.to_dict()})
+            session.current_turn = UsageTotals()
+            return True
+        return bool(by_model or baseline)
+
+    def summary(self) -> Dict:
+        return {
+            "totals": self.totals.to_dict(),
+            "by_project": {name: t.to_dict() for name, t in self.by_project.items()},
+            "by_model": {name: t.to_dict() for name, t in self.by_model.items()},
+            "sessions": len(self.sessions),
+        }
+
+    def session(self, session_id: str) -> Optional[Dict]:
+        session = self.sessions.get(session_id)
+        return session.to_dict() if session is not None else None